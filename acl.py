@@ -0,0 +1,162 @@
+from sqlalchemy import and_, or_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Note, Folder, GroupMembership, SharedNote, SharedFolder, NoteAccess, FolderAccess
+import sync
+
+# (access table, share table, resource column name) per resource kind
+_KINDS = {
+    'note': (NoteAccess, SharedNote, 'note_id'),
+    'folder': (FolderAccess, SharedFolder, 'folder_id'),
+}
+_RESOURCES = {'note': Note, 'folder': Folder}
+
+# INSERT ... ON CONFLICT support per dialect
+_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+# Pairs handled per round trip, keeping IN lists and OR chains a sane size
+_CHUNK = 500
+
+
+def _adjust(kind, pairs, delta):
+    """Add delta to grant_count for each (user_id, resource_id), creating or removing rows"""
+    counts = {}
+    for pair in pairs:
+        counts[pair] = counts.get(pair, 0) + delta
+    items = list(counts.items())
+    for i in range(0, len(items), _CHUNK):
+        _adjust_chunk(kind, dict(items[i:i + _CHUNK]), delta)
+    db.session.flush()
+
+
+def _without_owners(kind, counts):
+    """Drop pairs for a resource's own owner, e.g. when sharing with a group you own"""
+    model = _RESOURCES[kind]
+    resource_ids = {resource_id for _, resource_id in counts}
+    owners = dict(db.session.query(model.id, model.user_id).filter(model.id.in_(resource_ids)))
+    return {pair: change for pair, change in counts.items() if owners.get(pair[1]) != pair[0]}
+
+
+def _grant(access, column, counts):
+    # An upsert, so a concurrent grant of the same pair adds to the row instead of failing
+    insert = _INSERTS[db.session.get_bind().dialect.name]
+    stmt = insert(access).values([
+        {'user_id': user_id, column: resource_id, 'grant_count': change}
+        for (user_id, resource_id), change in counts.items()
+    ])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id', column],
+        set_={'grant_count': access.grant_count + stmt.excluded.grant_count}))
+
+
+def _adjust_chunk(kind, counts, delta):
+    access, _, column = _KINDS[kind]
+    resource_col = getattr(access, column)
+    counts = _without_owners(kind, counts)
+    if not counts:
+        return
+
+    match = or_(*[and_(access.user_id == user_id, resource_col == resource_id)
+                  for user_id, resource_id in counts])
+    # Only used to tell the change feed which pairs appear or disappear
+    existing = {tuple(row) for row in db.session.query(access.user_id, resource_col).filter(match)}
+
+    granted, revoked = [], []
+    if delta > 0:
+        _grant(access, column, counts)
+        granted = [pair for pair in counts if pair not in existing]
+    elif existing:
+        # One UPDATE per (resource, change) with the affected users in an IN list
+        updates = {}
+        for (user_id, resource_id), change in counts.items():
+            if (user_id, resource_id) in existing:
+                updates.setdefault((resource_id, change), []).append(user_id)
+        for (resource_id, change), user_ids in updates.items():
+            access.query.filter(resource_col == resource_id, access.user_id.in_(user_ids)).update(
+                {access.grant_count: access.grant_count + change}, synchronize_session=False)
+
+        gone = and_(match, access.grant_count <= 0)
+        revoked = [tuple(row) for row in db.session.query(access.user_id, resource_col).filter(gone)]
+        access.query.filter(gone).delete(synchronize_session=False)
+
+    sync.access_changed(kind, granted, revoked)
+
+
+def _group_member_ids(group_id):
+    return [user_id for (user_id,) in
+            db.session.query(GroupMembership.user_id).filter_by(group_id=group_id)]
+
+
+def _share_user_ids(share):
+    if share.shared_with_user_id is not None:
+        return [share.shared_with_user_id]
+    return _group_member_ids(share.shared_with_group_id)
+
+
+def _share_kind(share):
+    return 'note' if isinstance(share, SharedNote) else 'folder'
+
+
+def share_added(share):
+    """Grant access to everyone a new SharedNote/SharedFolder row covers"""
+    kind = _share_kind(share)
+    resource_id = getattr(share, _KINDS[kind][2])
+    _adjust(kind, [(user_id, resource_id) for user_id in _share_user_ids(share)], 1)
+
+
+def share_removed(share):
+    """Revoke the access a SharedNote/SharedFolder row provided (call before deleting it)"""
+    kind = _share_kind(share)
+    resource_id = getattr(share, _KINDS[kind][2])
+    _adjust(kind, [(user_id, resource_id) for user_id in _share_user_ids(share)], -1)
+
+
+def _group_shares(kind, group_id):
+    _, share, column = _KINDS[kind]
+    return [resource_id for (resource_id,) in
+            db.session.query(getattr(share, column)).filter(share.shared_with_group_id == group_id)]
+
+
+def member_added(group_id, user_id):
+    """Give a new group member access to everything shared with the group"""
+    for kind in _KINDS:
+        _adjust(kind, [(user_id, resource_id) for resource_id in _group_shares(kind, group_id)], 1)
+
+
+def member_removed(group_id, user_id):
+    """Take away what a departing member could only see through the group"""
+    for kind in _KINDS:
+        _adjust(kind, [(user_id, resource_id) for resource_id in _group_shares(kind, group_id)], -1)
+
+
+def has_note_access(user_id, note_id):
+    """Single primary-key lookup: is the note shared with the user directly or via a group?"""
+    return db.session.get(NoteAccess, (user_id, note_id)) is not None
+
+
+def has_folder_access(user_id, folder_id):
+    """Single primary-key lookup: is the folder shared with the user directly or via a group?"""
+    return db.session.get(FolderAccess, (user_id, folder_id)) is not None
+
+
+def remove_group(group):
+    """Revoke everything shared with a group; call before deleting it (shares and memberships cascade)"""
+    member_ids = _group_member_ids(group.id)
+    for kind in _KINDS:
+        resource_ids = _group_shares(kind, group.id)
+        _adjust(kind, [(user_id, resource_id) for user_id in member_ids for resource_id in resource_ids], -1)
+
+
+def rebuild_access():
+    """Recompute both access tables from the share and membership tables"""
+    for kind, (access, share, column) in _KINDS.items():
+        access.query.delete(synchronize_session=False)
+        resource_col = getattr(share, column)
+        direct = db.session.query(share.shared_with_user_id, resource_col).filter(
+            share.shared_with_user_id.isnot(None))
+        via_group = db.session.query(GroupMembership.user_id, resource_col).join(
+            GroupMembership, GroupMembership.group_id == share.shared_with_group_id)
+        pairs = [tuple(row) for row in direct.union_all(via_group)]
+        _adjust(kind, pairs, 1)
+    db.session.commit()
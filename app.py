@@ -1,4 +1,5 @@
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_login import LoginManager
 from flask_migrate import Migrate
 import os
@@ -77,15 +78,56 @@ def configure_database():
 # Configure the database
 configure_database()
 
+# Optional read replicas for safe GET pages (comma-separated database URLs)
+app.config['SQLALCHEMY_REPLICA_URLS'] = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+app.config['REPLICA_STICKY_SECONDS'] = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
 
+# Autosaves within this many seconds of the first unsaved one are buffered and
+# written to the note together (0 writes every autosave straight away)
+app.config['AUTOSAVE_COALESCE_SECONDS'] = int(os.getenv('AUTOSAVE_COALESCE_SECONDS', 30))
+
+# Serve the fingerprinted copies written by `flask build-static` (set in the Docker image).
+# Off by default so a stale local build never shadows edited static files.
+app.config['ASSETS_FINGERPRINT'] = os.getenv('ASSETS_FINGERPRINT', '').lower() in ('1', 'true', 'yes')
+
+# Storage quotas (0 = unlimited). User quotas cover every folder the user owns,
+# including files dropped anonymously into their public folders.
+app.config['USER_QUOTA_BYTES'] = int(os.getenv('USER_QUOTA_BYTES', 0))
+app.config['USER_QUOTA_FILES'] = int(os.getenv('USER_QUOTA_FILES', 0))
+app.config['FOLDER_QUOTA_BYTES'] = int(os.getenv('FOLDER_QUOTA_BYTES', 0))
+app.config['FOLDER_QUOTA_FILES'] = int(os.getenv('FOLDER_QUOTA_FILES', 0))
+
+# Admission control for anonymous uploads (per minute, 0 = unlimited).
+# Set RATELIMIT_STORAGE_URL to a redis:// URL to share limits across workers.
+app.config['RATELIMIT_STORAGE_URL'] = os.getenv('RATELIMIT_STORAGE_URL', '')
+app.config['UPLOAD_RATE_IP_REQUESTS'] = int(os.getenv('UPLOAD_RATE_IP_REQUESTS', 30))
+app.config['UPLOAD_RATE_IP_BYTES'] = int(os.getenv('UPLOAD_RATE_IP_BYTES', 100 * 1024 * 1024))
+app.config['UPLOAD_RATE_FOLDER_REQUESTS'] = int(os.getenv('UPLOAD_RATE_FOLDER_REQUESTS', 120))
+app.config['UPLOAD_RATE_FOLDER_BYTES'] = int(os.getenv('UPLOAD_RATE_FOLDER_BYTES', 500 * 1024 * 1024))
+app.config['UPLOAD_MAX_CONCURRENT'] = int(os.getenv('UPLOAD_MAX_CONCURRENT', 4))
+
+# Number of reverse proxies (e.g. nginx) in front of the app whose X-Forwarded-*
+# headers are trusted. Without it every client behind the proxy shares one
+# remote_addr, and so one per-IP upload bucket. Leave at 0 when clients
+# connect directly, or they could spoof their address.
+app.config['TRUSTED_PROXY_HOPS'] = int(os.getenv('TRUSTED_PROXY_HOPS', 0))
+if app.config['TRUSTED_PROXY_HOPS']:
+    hops = app.config['TRUSTED_PROXY_HOPS']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
 # Initialize models first
 from models import db, User
+from ratelimit import limiter
+from replica import replicas
 
-# Initialize extensions
+# Initialize extensions (replica binds must be registered before the database)
+replicas.init_app(app)
 db.init_app(app)
+limiter.init_app(app)
 migrate = Migrate(app, db)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
@@ -102,7 +144,16 @@ def load_user(user_id):
 from routes import register_routes
 register_routes(app)
 
+from commands import register_commands
+register_commands(app)
+
+# Fingerprinted static assets and on-the-fly response compression
+from assets import init_assets
+from compression import init_compression
+init_assets(app)
+init_compression(app)
+
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        db.create_all(bind_key=None)
     app.run(debug=True)
\ No newline at end of file
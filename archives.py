@@ -0,0 +1,207 @@
+import tarfile
+import zipfile
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, ArchiveEntry
+from importer import ArchiveError, MEMBER_ERRORS, TAR_EXTENSIONS
+from listing import encode_cursor, decode_cursor, DEFAULT_PAGE_SIZE
+
+# Entry listings are stored as ArchiveEntry rows; an archive with more
+# entries than this is almost certainly not meant to be browsed
+MAX_ARCHIVE_ENTRIES = 100000
+CHUNK_SIZE = 64 * 1024
+# ArchiveEntry rows sent per INSERT while listing an archive
+_INSERT_BATCH = 1000
+
+
+def archive_type(filename):
+    """'zip', 'tar' or None depending on the stored file's original name"""
+    lower = filename.lower()
+    if lower.endswith('.zip'):
+        return 'zip'
+    if lower.endswith(TAR_EXTENSIONS):
+        return 'tar'
+    return None
+
+
+def _zip_modified(info):
+    try:
+        return datetime(*info.date_time)
+    except ValueError:  # some tools write zeroed DOS dates
+        return None
+
+
+def _tar_modified(member):
+    try:
+        return datetime.utcfromtimestamp(member.mtime)
+    except (OverflowError, ValueError, OSError):  # out of range or negative timestamps
+        return None
+
+
+def _zip_entries(path):
+    # ZipFile only reads the central directory at the end of the file
+    try:
+        with zipfile.ZipFile(path) as archive:
+            infos = archive.infolist()
+    except zipfile.BadZipFile as e:
+        raise ArchiveError(f'Not a valid ZIP archive: {e}')
+    for member, info in enumerate(infos):
+        if info.is_dir():
+            continue
+        yield {
+            'member': member,
+            'name': info.filename,
+            'size': info.file_size,
+            'compressed_size': info.compress_size,
+            'modified': _zip_modified(info),
+        }
+
+
+def _tar_entries(path):
+    # Uncompressed tars are read header by header, seeking over member data, and
+    # the data offsets are kept for direct reads; compressed ones have to be
+    # decompressed once to find the headers
+    try:
+        try:
+            archive = tarfile.open(path, mode='r:')
+            seekable = True
+        except tarfile.ReadError:
+            archive = tarfile.open(path, mode='r:*')
+            seekable = False
+    except MEMBER_ERRORS as e:
+        raise ArchiveError(f'Not a valid tar archive: {e}')
+    with archive:
+        for member_index, member in enumerate(_iter_tar(archive)):
+            if not member.isfile():
+                continue
+            yield {
+                'member': member_index,
+                'name': member.name,
+                'size': member.size,
+                'modified': _tar_modified(member),
+                'data_offset': member.offset_data if seekable else None,
+            }
+
+
+def _iter_tar(archive):
+    """Iterate tar members without TarFile keeping every TarInfo in memory"""
+    while True:
+        try:
+            member = archive.next()
+        except MEMBER_ERRORS as e:
+            # Truncated or corrupt data; list_archive drops the rows inserted so far
+            raise ArchiveError(f'The archive is damaged or truncated: {e}')
+        if member is None:
+            return
+        archive.members = []
+        yield member
+
+
+def list_archive(file):
+    """
+    Return the number of entries in a stored ZIP or tar file, listing them
+    into ArchiveEntry rows on first use. Stored files never change, so the
+    listing is never rebuilt. Raises ArchiveError if the file can't be read.
+    """
+    if file.archive_entry_count is not None:
+        return file.archive_entry_count
+
+    kind = archive_type(file.original_filename)
+    if kind == 'zip':
+        entries = _zip_entries(file.filepath)
+    elif kind == 'tar':
+        entries = _tar_entries(file.filepath)
+    else:
+        raise ArchiveError('Not a ZIP or tar archive.')
+
+    count = 0
+    batch = []
+    try:
+        for entry in entries:
+            if count == MAX_ARCHIVE_ENTRIES:
+                raise ArchiveError(f'Archive has more than {MAX_ARCHIVE_ENTRIES} entries.')
+            batch.append(dict(entry, file_id=file.id, position=count))
+            count += 1
+            if len(batch) == _INSERT_BATCH:
+                db.session.execute(db.insert(ArchiveEntry), batch)
+                batch = []
+        if batch:
+            db.session.execute(db.insert(ArchiveEntry), batch)
+        file.archive_entry_count = count
+        db.session.commit()
+    except IntegrityError:
+        # Another request listed the same archive first
+        db.session.rollback()
+        db.session.refresh(file)
+        if file.archive_entry_count is None:
+            raise ArchiveError('The archive is being listed, try again shortly.')
+    except ArchiveError:
+        db.session.rollback()
+        raise
+    return file.archive_entry_count
+
+
+def page_entries(file, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Return ([ArchiveEntry, ...], next_cursor) for one page of a listed archive"""
+    position = decode_cursor(cursor) or {}
+    start = position.get('i')
+    if not isinstance(start, int) or isinstance(start, bool) or start < 0:
+        start = 0
+    page = (ArchiveEntry.query.filter(ArchiveEntry.file_id == file.id, ArchiveEntry.position >= start)
+            .order_by(ArchiveEntry.position).limit(limit).all())
+    next_cursor = encode_cursor({'i': start + limit}) if start + limit < file.archive_entry_count else None
+    return page, next_cursor
+
+
+def get_entry(file, index):
+    """The ArchiveEntry at a position in a listed archive, or None"""
+    return db.session.get(ArchiveEntry, (file.id, index))
+
+
+def _read_range(path, offset, size):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        remaining = size
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _copy_stream(stream):
+    with stream:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _zip_member(path, member):
+    archive = zipfile.ZipFile(path)
+    try:
+        yield from _copy_stream(archive.open(archive.infolist()[member]))
+    finally:
+        archive.close()
+
+
+def _tar_member(path, member_index):
+    # Compressed tars have no index into the stream, so skip ahead to the member
+    with tarfile.open(path, mode='r|*') as archive:
+        for index, member in enumerate(_iter_tar(archive)):
+            if index == member_index:
+                yield from _copy_stream(archive.extractfile(member))
+                return
+
+
+def stream_member(file, entry):
+    """Yield the bytes of one ArchiveEntry without extracting anything else"""
+    if entry.data_offset is not None:
+        return _read_range(file.filepath, entry.data_offset, entry.size)
+    if archive_type(file.original_filename) == 'zip':
+        return _zip_member(file.filepath, entry.member)
+    return _tar_member(file.filepath, entry.member)
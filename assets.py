@@ -0,0 +1,148 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always produced
+    brotli = None
+
+try:
+    from whitenoise import WhiteNoise
+except ImportError:  # whitenoise is only installed in production images
+    WhiteNoise = None
+
+# Fingerprinted copies are written under <static>/build/ and never committed
+BUILD_DIR = 'build'
+MANIFEST_NAME = 'manifest.json'
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+_FINGERPRINT_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+
+def is_fingerprinted(path):
+    """Check whether a static path carries a content hash and may be cached forever"""
+    return bool(_FINGERPRINT_RE.search(path))
+
+
+def _fingerprinted_name(relpath, digest):
+    base, ext = os.path.splitext(relpath)
+    return f'{base}.{digest[:12]}{ext}'
+
+
+def _digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _precompress(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    with gzip.open(path + '.gz', 'wb', compresslevel=9) as f:
+        f.write(data)
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build_static(static_folder):
+    """
+    Copy every static asset to a content-hashed filename under build/,
+    write gzip (and brotli when available) siblings for text assets and
+    return the manifest mapping original paths to fingerprinted ones.
+    """
+    build_root = os.path.join(static_folder, BUILD_DIR)
+    if os.path.isdir(build_root):
+        shutil.rmtree(build_root)
+
+    manifest = {}
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        if os.path.abspath(dirpath).startswith(os.path.abspath(build_root)):
+            continue
+        for filename in sorted(filenames):
+            source = os.path.join(dirpath, filename)
+            relpath = os.path.relpath(source, static_folder).replace(os.sep, '/')
+
+            digest = _digest(source)
+            target_rel = f'{BUILD_DIR}/{_fingerprinted_name(relpath, digest)}'
+            target = os.path.join(static_folder, target_rel)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target)
+
+            if filename.endswith(COMPRESSIBLE_EXTENSIONS):
+                _precompress(target)
+
+            manifest[relpath] = target_rel
+
+    with open(os.path.join(build_root, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return manifest
+
+
+def load_manifest(static_folder):
+    """
+    Load the asset manifest written by build_static, or an empty one.
+    Returns (manifest, stale) where stale lists the sources that changed
+    since the build; they are left out so their current file is served.
+    """
+    path = os.path.join(static_folder, BUILD_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}, []
+    with open(path) as f:
+        built = json.load(f)
+
+    manifest, stale = {}, []
+    for relpath, target_rel in built.items():
+        source = os.path.join(static_folder, relpath)
+        if (os.path.exists(source) and os.path.exists(os.path.join(static_folder, target_rel))
+                and target_rel == f'{BUILD_DIR}/{_fingerprinted_name(relpath, _digest(source))}'):
+            manifest[relpath] = target_rel
+        else:
+            stale.append(relpath)
+    return manifest, stale
+
+
+def init_assets(app):
+    """
+    Make url_for('static', ...) emit fingerprinted URLs when ASSETS_FINGERPRINT
+    is set and a build exists, and serve those files with one-year immutable
+    caching.
+    """
+    app.config.setdefault('ASSETS_FINGERPRINT', False)
+    manifest = {}
+    if app.config['ASSETS_FINGERPRINT']:
+        manifest, stale = load_manifest(app.static_folder)
+        if stale:
+            app.logger.warning('Static build is out of date for %s; run flask build-static',
+                               ', '.join(sorted(stale)))
+    app.extensions['asset_manifest'] = manifest
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = manifest.get(values['filename'], values['filename'])
+
+    if WhiteNoise is not None:
+        # WhiteNoise serves the precompressed .br/.gz siblings directly
+        app.wsgi_app = WhiteNoise(
+            app.wsgi_app,
+            root=app.static_folder,
+            prefix=app.static_url_path,
+            immutable_file_test=lambda path, url: is_fingerprinted(url),
+        )
+    else:
+        @app.after_request
+        def cache_fingerprinted_assets(response):
+            if request.endpoint == 'static' and is_fingerprinted(request.path):
+                response.cache_control.no_cache = None
+                response.cache_control.public = True
+                response.cache_control.max_age = IMMUTABLE_MAX_AGE
+                response.cache_control.immutable = True
+            return response
@@ -0,0 +1,114 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm.exc import StaleDataError
+
+from models import db, Note, NotePatch
+import sync
+
+# Patch positions are UTF-16 code unit offsets so they match JavaScript string
+# indexes exactly (Python indexes code points, which differ for emoji etc.)
+_CODEC = 'utf-16-le'
+
+
+class PatchError(ValueError):
+    """Raised when an autosave patch is malformed or out of range"""
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def apply_patches(content, patches):
+    """
+    Apply a list of {'start', 'end', 'text'} splices to content in order,
+    each replacing content[start:end] (UTF-16 offsets) with text.
+    """
+    if not isinstance(patches, list):
+        raise PatchError('patches must be a list.')
+    data = content.encode(_CODEC, 'surrogatepass')
+    for patch in patches:
+        start = patch.get('start') if isinstance(patch, dict) else None
+        end = patch.get('end') if isinstance(patch, dict) else None
+        text = patch.get('text', '') if isinstance(patch, dict) else None
+        if not (_is_int(start) and _is_int(end) and isinstance(text, str)):
+            raise PatchError('Each patch needs integer start/end and a text string.')
+        units = len(data) // 2
+        if not 0 <= start <= end <= units:
+            raise PatchError(f'Patch range {start}:{end} is outside the note ({units} units).')
+        data = data[:start * 2] + text.encode(_CODEC, 'surrogatepass') + data[end * 2:]
+    try:
+        return data.decode(_CODEC)
+    except UnicodeDecodeError:
+        raise PatchError('Patch splits a surrogate pair.')
+
+
+# Autosaves are buffered as NotePatch rows and folded into the note at most
+# once per coalescing window, so a burst of saves costs one content rewrite,
+# one version bump and one round of change-feed rows. Clients address the
+# buffer by (version, seq): version is the note's stored version and seq the
+# number of saves buffered on top of it.
+
+def pending(note):
+    """Return (title, content, seq, started_at) of a note with its buffered autosaves applied"""
+    rows = (NotePatch.query.filter_by(note_id=note.id, version=note.version)
+            .order_by(NotePatch.seq).all())
+    title, content = note.title, note.content
+    for row in rows:
+        content = apply_patches(content, json.loads(row.patches))
+        if row.title is not None:
+            title = row.title
+    if not rows:
+        return title, content, 0, None
+    return title, content, rows[-1].seq, rows[0].created_at
+
+
+def buffer_save(note, seq, title, patches):
+    """Add one autosave on top of seq; the caller commits (a concurrent save of the same seq fails)"""
+    db.session.add(NotePatch(note_id=note.id, version=note.version, seq=seq,
+                             title=title, patches=json.dumps(patches, separators=(',', ':'))))
+
+
+def is_due(started_at, window):
+    """Whether buffered saves started at started_at have waited out the coalescing window"""
+    if window <= 0:
+        return True
+    return started_at is not None and datetime.utcnow() - started_at >= timedelta(seconds=window)
+
+
+def fold(note, title, content):
+    """Write a note's current title/content and drop its buffered saves; the caller commits"""
+    clear(note)
+    note.title = title
+    note.content = content
+    note.updated_at = datetime.utcnow()
+    sync.notes_changed([note.id])
+
+
+def clear(note):
+    """Drop every buffered save of a note, including leftovers of older versions"""
+    NotePatch.query.filter_by(note_id=note.id).delete(synchronize_session=False)
+
+
+def fold_due(window, progress=None):
+    """Fold the buffered saves of every note whose window has passed (for abandoned editors)"""
+    cutoff = datetime.utcnow() - timedelta(seconds=window)
+    note_ids = [note_id for (note_id,) in db.session.query(NotePatch.note_id)
+                .filter(NotePatch.created_at <= cutoff).distinct()]
+    stats = {'folded': 0, 'cleared': 0}
+    for note_id in note_ids:
+        note = db.session.get(Note, note_id)
+        title, content, seq, started_at = pending(note)
+        if seq:
+            fold(note, title, content)
+        else:
+            clear(note)
+        try:
+            db.session.commit()
+            stats['folded' if seq else 'cleared'] += 1
+        except StaleDataError:
+            # The editor saved in the meantime; its next save or fold picks this up
+            db.session.rollback()
+        if progress:
+            progress(stats)
+    return stats
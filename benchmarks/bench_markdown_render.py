@@ -0,0 +1,56 @@
+"""
+Benchmark for server-side note rendering.
+
+Compares a cold markdown render + sanitize against a cache hit (content
+hash + LRU lookup) for increasingly large notes. Notes above
+MAX_MARKDOWN_CHARS take the escaped plain-text path, which is what keeps
+cold renders of multi-megabyte notes bounded. Run from the project root:
+
+    python benchmarks/bench_markdown_render.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from markdown_render import MAX_MARKDOWN_CHARS, RenderCache, render_markdown  # noqa: E402
+
+HITS = 20
+
+
+def make_note(size):
+    section = (
+        '## Section\n\n'
+        'Some **bold** and *italic* text with a [link](https://example.com) and `inline code`.\n\n'
+        '- first item\n- second item\n- third item\n\n'
+        '```\nfor i in range(10):\n    print(i)\n```\n\n'
+        '| col a | col b |\n|-------|-------|\n| 1     | 2     |\n\n'
+    )
+    return (section * (size // len(section) + 1))[:size]
+
+
+def main():
+    print(f"{'size':>10}{'mode':>10}{'cold render':>14}{'cache hit':>12}{'speedup':>10}")
+    for size in (16 * 1024, 64 * 1024, 256 * 1024, 1024 * 1024, 8 * 1024 * 1024):
+        text = make_note(size)
+        cache = RenderCache(max_bytes=256 * 1024 * 1024)
+
+        start = time.perf_counter()
+        cache.get_or_render(text)
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(HITS):
+            cache.get_or_render(text)
+        hit = (time.perf_counter() - start) / HITS
+
+        mode = 'markdown' if len(text) <= MAX_MARKDOWN_CHARS else 'plain'
+        print(f'{len(text):>10}{mode:>10}{cold * 1000:>12.1f}ms{hit * 1000:>10.2f}ms{cold / hit:>9.0f}x')
+
+    # Sanity check that the sanitizer is part of what is being measured
+    assert '<script>' not in render_markdown('<script>alert(1)</script>')
+
+
+if __name__ == '__main__':
+    main()
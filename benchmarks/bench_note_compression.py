@@ -0,0 +1,92 @@
+"""
+Benchmark for compressed Note.content storage.
+
+Reports the compression ratio of CompressedText on log/CSV-like bodies and
+the read/write overhead of a SQLite round trip compared to a plain Text
+column. Run from the project root:
+
+    python benchmarks/bench_note_compression.py
+"""
+import os
+import random
+import sys
+import time
+
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import CompressedText, zstandard  # noqa: E402
+
+ROUNDS = 20
+
+
+def make_log(size):
+    rng = random.Random(42)
+    levels = ['INFO', 'DEBUG', 'WARN', 'ERROR']
+    lines = []
+    total = 0
+    while total < size:
+        line = (f'2026-10-19T12:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}Z '
+                f'{rng.choice(levels)} worker-{rng.randint(1, 8)} request_id={rng.getrandbits(32):08x} '
+                f'path=/folder/{rng.randint(1, 5000)} status={rng.choice([200, 200, 200, 304, 404])} '
+                f'duration_ms={rng.random() * 250:.2f}\n')
+        lines.append(line)
+        total += len(line)
+    return ''.join(lines)
+
+
+def make_csv(size):
+    rng = random.Random(7)
+    rows = ['id,name,email,amount,created_at\n']
+    total = len(rows[0])
+    i = 0
+    while total < size:
+        row = f'{i},user{i},user{i}@example.com,{rng.random() * 1000:.2f},2026-10-{rng.randint(1, 28):02d}\n'
+        rows.append(row)
+        total += len(row)
+        i += 1
+    return ''.join(rows)
+
+
+def roundtrip(column_type, body):
+    engine = sa.create_engine('sqlite://')
+    metadata = sa.MetaData()
+    table = sa.Table('note', metadata,
+                     sa.Column('id', sa.Integer, primary_key=True),
+                     sa.Column('content', column_type))
+    metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        start = time.perf_counter()
+        for i in range(ROUNDS):
+            conn.execute(table.insert().values(id=i, content=body))
+        write = (time.perf_counter() - start) / ROUNDS
+
+        start = time.perf_counter()
+        for i in range(ROUNDS):
+            conn.execute(sa.select(table.c.content).where(table.c.id == i)).scalar_one()
+        read = (time.perf_counter() - start) / ROUNDS
+
+        stored = conn.execute(sa.select(sa.func.sum(sa.func.length(table.c.content)))).scalar() / ROUNDS
+    return write, read, stored
+
+
+def main():
+    codec = 'zstd' if zstandard is not None else 'zlib'
+    print(f'Codec: {codec}, {ROUNDS} rounds per case\n')
+    print(f"{'body':<12}{'size':>10}{'stored':>10}{'ratio':>8}"
+          f"{'write text':>12}{'write comp':>12}{'read text':>12}{'read comp':>12}")
+
+    for label, factory in (('log', make_log), ('csv', make_csv)):
+        for size in (2 * 1024, 64 * 1024, 1024 * 1024, 8 * 1024 * 1024):
+            body = factory(size)
+            text_write, text_read, _ = roundtrip(sa.Text(), body)
+            comp_write, comp_read, stored = roundtrip(CompressedText(threshold=4096), body)
+            print(f'{label:<12}{len(body):>10}{int(stored):>10}{len(body) / stored:>7.1f}x'
+                  f'{text_write * 1000:>10.2f}ms{comp_write * 1000:>10.2f}ms'
+                  f'{text_read * 1000:>10.2f}ms{comp_read * 1000:>10.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
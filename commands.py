@@ -0,0 +1,126 @@
+import os
+import time
+
+import click
+
+from models import db, User, Folder
+from storage import recompute_usage
+from assets import build_static
+from note_compression import compress_existing_notes
+from autosave import fold_due
+from importer import import_archive, ArchiveError
+from acl import rebuild_access
+from deletion import delete_user
+from file_search import index_pending, reindex_changed
+
+
+def register_commands(app):
+    """Register maintenance CLI commands with the Flask app instance"""
+
+    @app.cli.command('recompute-usage')
+    def recompute_usage_command():
+        """Recompute storage usage counters for all folders and users."""
+        recompute_usage()
+        folders = db.session.query(db.func.count(Folder.id)).scalar()
+        users = db.session.query(db.func.count(User.id)).scalar()
+        click.echo(f'Recomputed storage usage for {folders} folders and {users} users.')
+
+    @app.cli.command('build-static')
+    def build_static_command():
+        """Fingerprint and precompress static assets into static/build/."""
+        manifest = build_static(app.static_folder)
+        click.echo(f'Built {len(manifest)} static assets.')
+
+    @app.cli.command('compress-notes')
+    @click.option('--batch-size', default=500, show_default=True, help='Notes per transaction.')
+    def compress_notes_command(batch_size):
+        """Compress existing note bodies above the size threshold in batches."""
+        def report(stats):
+            click.echo(f"Scanned {stats['scanned']} notes, compressed {stats['compressed']}, "
+                       f"skipped {stats['skipped']} edited meanwhile")
+
+        stats = compress_existing_notes(batch_size=batch_size, progress=report)
+        if stats['bytes_after']:
+            ratio = stats['bytes_before'] / stats['bytes_after']
+            click.echo(f"Compressed {stats['bytes_before']} bytes to {stats['bytes_after']} ({ratio:.1f}x).")
+        else:
+            click.echo('No notes needed compression.')
+
+    @app.cli.command('fold-autosaves')
+    def fold_autosaves_command():
+        """Write autosaves left buffered by editors that went away into their notes."""
+        stats = fold_due(app.config['AUTOSAVE_COALESCE_SECONDS'])
+        click.echo(f"Folded autosaves into {stats['folded']} notes, cleared {stats['cleared']} stale buffers.")
+
+    @app.cli.command('import-archive')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--user', 'username', required=True, help='Username that will own the imported items.')
+    @click.option('--batch-size', default=1000, show_default=True, help='Rows per bulk insert and commit.')
+    def import_archive_command(path, username, batch_size):
+        """Import notes and files from a ZIP or tar archive."""
+        user = User.query.filter_by(username=username).first()
+        if not user:
+            raise click.ClickException(f'User not found: {username}')
+
+        def report(stats):
+            click.echo(f"{stats['notes']} notes, {stats['files']} files, {stats['error_count']} errors")
+
+        with open(path, 'rb') as fileobj:
+            try:
+                stats = import_archive(fileobj, os.path.basename(path), user, app.config['UPLOAD_FOLDER'],
+                                       batch_size=batch_size, progress=report)
+            except ArchiveError as e:
+                if e.stats and (e.stats['notes'] or e.stats['files']):
+                    raise click.ClickException(f"{e} (imported {e.stats['notes']} notes and "
+                                               f"{e.stats['files']} files before the error)")
+                raise click.ClickException(str(e))
+
+        for error in stats['errors']:
+            click.echo(f"  {error['entry']}: {error['error']}", err=True)
+        if stats['error_count'] > len(stats['errors']):
+            click.echo(f"  ... and {stats['error_count'] - len(stats['errors'])} more", err=True)
+        click.echo(f"Imported {stats['notes']} notes and {stats['files']} files into {stats['folders']} folders.")
+
+    @app.cli.command('rebuild-access')
+    def rebuild_access_command():
+        """Recompute the materialized note/folder access tables from shares and groups."""
+        rebuild_access()
+        click.echo('Rebuilt note and folder access tables.')
+
+    @app.cli.command('delete-user')
+    @click.argument('username')
+    @click.confirmation_option(prompt='Delete this user and everything they own?')
+    def delete_user_command(username):
+        """Delete a user with all of their notes, folders, files and groups."""
+        user = User.query.filter_by(username=username).first()
+        if not user:
+            raise click.ClickException(f'User not found: {username}')
+        delete_user(user)
+        db.session.commit()
+        click.echo(f'Deleted user {username}.')
+
+    @app.cli.command('index-files')
+    @click.option('--batch-size', default=100, show_default=True, help='Files per transaction.')
+    @click.option('--rescan', is_flag=True, help='Also re-extract indexed files that changed on disk.')
+    @click.option('--watch', type=int, default=None, metavar='SECONDS',
+                  help='Keep running, indexing new uploads every SECONDS.')
+    def index_files_command(batch_size, rescan, watch):
+        """Extract the text of uploaded files into the full-text search index."""
+        def report(stats):
+            click.echo(f"Indexed {stats['indexed']} files, {len(stats['errors'])} errors")
+
+        while True:
+            stats = index_pending(batch_size=batch_size, progress=report if watch is None else None)
+            if rescan:
+                changed = reindex_changed(batch_size=batch_size)
+                stats['indexed'] += changed['indexed']
+                stats['errors'] += changed['errors']
+            for error in stats['errors']:
+                click.echo(f"  file {error['file_id']}: {error['error']}", err=True)
+            if watch is None:
+                click.echo(f"Indexed {stats['indexed']} files.")
+                return
+            if stats['indexed']:
+                click.echo(f"Indexed {stats['indexed']} files.")
+            db.session.remove()
+            time.sleep(watch)
@@ -0,0 +1,51 @@
+import os
+
+from models import User, Note, Folder, File, Group
+from storage import record_folder_removed
+import acl
+import sync
+
+# Stored file paths fetched per round trip while unlinking uploads
+_PATH_BATCH = 1000
+
+
+def _remove_stored_files(query):
+    """Unlink the uploads of the File rows matched by query without loading the rows"""
+    for (filepath,) in query.with_entities(File.filepath).yield_per(_PATH_BATCH):
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+
+# Each delete below is a single DELETE on the parent row; the database removes
+# children (files, shares, memberships, access rows) through ON DELETE CASCADE.
+# Callers commit.
+
+def delete_note(note):
+    """Delete a note together with its shares and access rows"""
+    sync.notes_changed([note.id], deleted=True)
+    Note.query.filter_by(id=note.id).delete(synchronize_session=False)
+
+
+def delete_folder(folder):
+    """Delete a folder, its files on disk and in the database, and its shares"""
+    _remove_stored_files(File.query.filter_by(folder_id=folder.id))
+    record_folder_removed(folder)
+    sync.folders_changed([folder.id], deleted=True)
+    Folder.query.filter_by(id=folder.id).delete(synchronize_session=False)
+
+
+def delete_group(group):
+    """Delete a group, revoking the access its shares gave to the members"""
+    acl.remove_group(group)
+    sync.group_removed(group.id)
+    Group.query.filter_by(id=group.id).delete(synchronize_session=False)
+
+
+def delete_user(user):
+    """Delete a user account with all of their notes, folders, files, groups and shares"""
+    # Other members may have shared into the user's groups; their grants must be revoked
+    for group in Group.query.filter_by(owner_id=user.id).all():
+        delete_group(group)
+    _remove_stored_files(File.query.join(Folder).filter(Folder.user_id == user.id))
+    sync.user_removed(user.id)
+    User.query.filter_by(id=user.id).delete(synchronize_session=False)
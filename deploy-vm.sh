@@ -169,6 +169,7 @@ SECRET_KEY=$(openssl rand -base64 32)
 FLASK_ENV=production
 UPLOAD_FOLDER=/app/uploads
 MAX_CONTENT_LENGTH=16777216
+TRUSTED_PROXY_HOPS=1
 EOF
 
 # Start the application
@@ -494,6 +495,7 @@ SECRET_KEY=$SECRET_KEY
 FLASK_ENV=production
 UPLOAD_FOLDER=/app/uploads
 MAX_CONTENT_LENGTH=16777216
+TRUSTED_PROXY_HOPS=1
 EOF
         
         # Start application with Docker Compose
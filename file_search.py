@@ -0,0 +1,190 @@
+import os
+import re
+from datetime import datetime
+
+from markupsafe import Markup, escape
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload
+
+from models import db, File, FileText
+from text_preview import is_text_file
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDF text extraction is optional
+    PdfReader = None
+
+# Only the start of very large files is indexed, which also keeps every
+# document well below PostgreSQL's 1 MB tsvector limit
+MAX_INDEXED_CHARS = 500000
+
+# Highlight markers passed to snippet()/ts_headline(); stripped from indexed text
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+_SQLITE_SEARCH = """
+    SELECT file_text_fts.rowid AS file_id,
+           snippet(file_text_fts, 0, :mark_start, :mark_end, '...', 16) AS snippet
+    FROM file_text_fts
+    JOIN file ON file.id = file_text_fts.rowid
+    JOIN folder ON folder.id = file.folder_id
+    WHERE file_text_fts MATCH :query AND {scope}
+    ORDER BY bm25(file_text_fts)
+    LIMIT :limit
+"""
+
+# Headlines are expensive, so only the ranked page of hits gets one
+_POSTGRES_SEARCH = """
+    SELECT hits.file_id,
+           ts_headline('simple', hits.content, hits.query, :headline_options) AS snippet
+    FROM (
+        SELECT file_text.file_id, file_text.content, q.query, ts_rank(file_text.search, q.query) AS rank
+        FROM file_text
+        CROSS JOIN plainto_tsquery('simple', :query) AS q(query)
+        JOIN file ON file.id = file_text.file_id
+        JOIN folder ON folder.id = file.folder_id
+        WHERE file_text.search @@ q.query AND {scope}
+        ORDER BY rank DESC
+        LIMIT :limit
+    ) AS hits
+    ORDER BY hits.rank DESC
+"""
+
+_FOLDER_SCOPE = 'file.folder_id = :folder_id'
+_USER_SCOPE = ('(folder.user_id = :user_id OR file.folder_id IN '
+               '(SELECT folder_id FROM folder_access WHERE user_id = :user_id))')
+
+
+def _is_pdf(file):
+    return file.original_filename.lower().endswith('.pdf') or file.file_type == 'application/pdf'
+
+
+def extract_text(file):
+    """Return the searchable text of a stored file, or '' for files that have none"""
+    if is_text_file(file):
+        with open(file.filepath, 'rb') as f:
+            data = f.read(MAX_INDEXED_CHARS * 4)
+        content = data.decode('utf-8', errors='ignore')[:MAX_INDEXED_CHARS]
+    elif PdfReader is not None and _is_pdf(file):
+        parts = []
+        length = 0
+        for page in PdfReader(file.filepath).pages:
+            part = page.extract_text() or ''
+            parts.append(part)
+            length += len(part)
+            if length >= MAX_INDEXED_CHARS:
+                break
+        content = '\n'.join(parts)[:MAX_INDEXED_CHARS]
+    else:
+        return ''
+    # PostgreSQL text can't hold NUL, and the markers must only come from snippets
+    return content.replace('\x00', ' ').replace(MARK_START, ' ').replace(MARK_END, ' ')
+
+
+def index_file(file):
+    """Extract a file's text into its FileText row; the caller commits"""
+    row = db.session.get(FileText, file.id) or FileText(file_id=file.id)
+    content = ''
+    try:
+        stat = os.stat(file.filepath)
+        row.source_size, row.source_mtime = stat.st_size, stat.st_mtime
+        content = extract_text(file)
+    finally:
+        # Unreadable files get an empty row, replacing any text indexed from an
+        # earlier version, so they aren't retried until they change
+        row.content = content
+        if row.source_size is None:
+            row.source_size, row.source_mtime = 0, 0.0
+        row.indexed_at = datetime.utcnow()
+        db.session.add(row)
+
+
+def _index_batch(files, stats):
+    for file in files:
+        try:
+            index_file(file)
+            stats['indexed'] += 1
+        except Exception as e:  # one bad upload must not stop the worker
+            stats['errors'].append({'file_id': file.id, 'error': str(e)})
+    db.session.commit()
+
+
+def index_pending(batch_size=100, progress=None):
+    """Index files that have no FileText row yet, committing every batch"""
+    stats = {'indexed': 0, 'errors': []}
+    while True:
+        files = (File.query.outerjoin(FileText, FileText.file_id == File.id)
+                 .filter(FileText.file_id.is_(None))
+                 .order_by(File.id).limit(batch_size).all())
+        if not files:
+            return stats
+        _index_batch(files, stats)
+        if progress:
+            progress(stats)
+
+
+def reindex_changed(batch_size=100, progress=None):
+    """Re-extract indexed files whose size or mtime on disk no longer matches"""
+    stats = {'indexed': 0, 'errors': []}
+    last_id = 0
+    while True:
+        rows = (db.session.query(File, FileText.source_size, FileText.source_mtime)
+                .join(FileText, FileText.file_id == File.id)
+                .filter(File.id > last_id)
+                .order_by(File.id).limit(batch_size).all())
+        if not rows:
+            return stats
+        last_id = rows[-1][0].id
+
+        changed = []
+        for file, size, mtime in rows:
+            try:
+                stat = os.stat(file.filepath)
+            except OSError:
+                continue
+            if stat.st_size != size or stat.st_mtime != mtime:
+                changed.append(file)
+        _index_batch(changed, stats)
+        if progress:
+            progress(stats)
+
+
+def _fts5_query(q):
+    # Quote every word so user input can never be parsed as FTS5 syntax
+    return ' '.join('"{}"'.format(word) for word in re.findall(r'\w+', q))
+
+
+def _highlight(snippet):
+    html = str(escape(snippet or ''))
+    return Markup(html.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def search_files(q, user_id, folder_id=None, limit=20):
+    """
+    Return [(file, snippet_html)] for the best matches of q, best first, in
+    either one folder (the caller checks it may be viewed) or every folder
+    the user owns or has been given access to.
+    """
+    params = {'limit': limit, 'user_id': user_id, 'folder_id': folder_id}
+    scope = _FOLDER_SCOPE if folder_id is not None else _USER_SCOPE
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        query = _fts5_query(q)
+        if not query:
+            return []
+        sql = _SQLITE_SEARCH.format(scope=scope)
+        params.update(query=query, mark_start=MARK_START, mark_end=MARK_END)
+    elif dialect == 'postgresql':
+        if not q.strip():
+            return []
+        sql = _POSTGRES_SEARCH.format(scope=scope)
+        params.update(query=q, headline_options=(
+            f'StartSel={MARK_START}, StopSel={MARK_END}, MaxFragments=2, MaxWords=24, MinWords=8'))
+    else:
+        raise RuntimeError(f'File search is not supported on {dialect}')
+
+    hits = db.session.execute(text(sql), params).all()
+    files = {file.id: file for file in File.query.options(joinedload(File.folder))
+             .filter(File.id.in_([hit.file_id for hit in hits]))}
+    return [(files[hit.file_id], _highlight(hit.snippet)) for hit in hits if hit.file_id in files]
@@ -0,0 +1,246 @@
+import mimetypes
+import os
+import posixpath
+import shutil
+import tarfile
+import zipfile
+import zlib
+from datetime import datetime
+from functools import partial
+
+from werkzeug.utils import secure_filename
+
+from models import db, Note, Folder, File
+from storage import QuotaExceeded, record_upload, release_upload
+import sync
+
+NOTE_EXTENSIONS = ('.md', '.markdown', '.txt')
+TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+# Notes are held in memory while being inserted, so refuse absurdly large ones
+MAX_NOTE_BYTES = 10 * 1024 * 1024
+# Archive metadata that should never become notes or files
+IGNORED_NAMES = ('.DS_Store', 'Thumbs.db', 'desktop.ini')
+# Per-entry errors kept for the report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+# Raised while decompressing a damaged member (bad CRC, truncated data, ...)
+MEMBER_ERRORS = (OSError, EOFError, zlib.error, zipfile.BadZipFile, tarfile.TarError)
+
+
+class ArchiveError(Exception):
+    """
+    Raised when an archive cannot be opened, or can't be read any further.
+    stats holds what was imported before a damaged part, if anything.
+    """
+
+    def __init__(self, message, stats=None):
+        super().__init__(message)
+        self.stats = stats
+
+
+def _tar_members(archive):
+    # A streamed tar can't skip damage: the first bad header or truncated
+    # block ends the archive, so it is reported like an unreadable one
+    members = iter(archive)
+    while True:
+        try:
+            member = next(members)
+        except StopIteration:
+            return
+        except MEMBER_ERRORS as e:
+            raise ArchiveError(f'The archive is damaged or truncated: {e}')
+        yield member
+
+
+def iter_archive_entries(fileobj, filename):
+    """
+    Yield (path, size, open_member) for each regular file in a ZIP or tar
+    archive, one at a time and without extracting anything to disk;
+    open_member() returns the member's stream and must be called before the
+    next entry. Tar archives are read in streaming mode; ZIP archives need a
+    seekable file for the central directory but members are still
+    decompressed on demand.
+    """
+    lower = filename.lower()
+    if lower.endswith(TAR_EXTENSIONS):
+        try:
+            archive = tarfile.open(fileobj=fileobj, mode='r|*')
+        except (tarfile.TarError, EOFError, zlib.error) as e:
+            raise ArchiveError(f'Not a valid tar archive: {e}')
+        with archive:
+            for member in _tar_members(archive):
+                if member.isfile():
+                    yield member.name, member.size, partial(archive.extractfile, member)
+    elif lower.endswith('.zip'):
+        try:
+            archive = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile as e:
+            raise ArchiveError(f'Not a valid ZIP archive: {e}')
+        with archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    yield info.filename, info.file_size, partial(archive.open, info)
+    else:
+        raise ArchiveError('Unsupported archive type; use .zip or .tar(.gz/.bz2/.xz).')
+
+
+def _is_ignored(path):
+    parts = path.split('/')
+    return (any(part.startswith('.') or part == '__MACOSX' for part in parts[:-1])
+            or parts[-1] in IGNORED_NAMES or parts[-1].startswith('._'))
+
+
+def _note_title(path, content):
+    # Prefer a leading markdown heading, otherwise the file name
+    first_line = content.lstrip().split('\n', 1)[0].strip()
+    if first_line.startswith('# '):
+        return first_line[2:].strip()[:200]
+    return os.path.splitext(posixpath.basename(path))[0][:200]
+
+
+class ArchiveImporter:
+    """
+    Turn archive entries into notes (text/markdown) and files (everything
+    else, in one folder per archive directory) using bulk inserts with a
+    commit every batch_size rows, so memory stays bounded by the batch.
+    """
+
+    def __init__(self, user, upload_folder, archive_name, batch_size=500, progress=None):
+        self.user = user
+        self.upload_folder = upload_folder
+        self.root_folder_name = os.path.splitext(secure_filename(archive_name) or 'import')[0]
+        self.batch_size = batch_size
+        self.progress = progress
+
+        self.folder_ids = {}
+        self.new_folder_ids = []
+        self.notes = []
+        self.files = []
+        self.written_paths = []
+        self.stats = {'notes': 0, 'files': 0, 'folders': 0, 'errors': [], 'error_count': 0}
+
+    def _folder_for(self, directory):
+        name = f'{self.root_folder_name}/{directory}' if directory else self.root_folder_name
+        name = name[:150]
+        if name not in self.folder_ids:
+            folder = Folder(name=name, description='Imported from archive', user_id=self.user.id)
+            db.session.add(folder)
+            db.session.flush()
+            self.folder_ids[name] = folder.id
+            self.new_folder_ids.append(folder.id)
+            self.stats['folders'] += 1
+        return db.session.get(Folder, self.folder_ids[name])
+
+    def _add_note(self, path, stream, size):
+        if size > MAX_NOTE_BYTES:
+            raise ValueError(f'Note larger than {MAX_NOTE_BYTES // (1024 * 1024)} MB')
+        content = stream.read(MAX_NOTE_BYTES + 1).decode('utf-8')
+        now = datetime.utcnow()
+        self.notes.append({
+            'title': _note_title(path, content),
+            'content': content,
+            'user_id': self.user.id,
+            'is_public': False,
+            'created_at': now,
+            'updated_at': now,
+            'version': 1,
+        })
+
+    def _add_file(self, path, stream, size):
+        folder = self._folder_for(posixpath.dirname(path))
+        # Charged per file, so the owner's quota sees every folder of the batch;
+        # member streams yield exactly the size recorded in the archive
+        record_upload(folder, size)
+
+        original_filename = secure_filename(posixpath.basename(path)) or 'file'
+        name, ext = os.path.splitext(original_filename)
+        unique_filename = f'{name}_{os.urandom(4).hex()}{ext}'
+        filepath = os.path.join(self.upload_folder, unique_filename)
+        # Tracked before writing so a failed batch also removes a partial copy
+        self.written_paths.append(filepath)
+        try:
+            with open(filepath, 'wb') as out:
+                shutil.copyfileobj(stream, out, 1024 * 1024)
+        except MEMBER_ERRORS:
+            # Only this entry is skipped: drop the partial copy and its charge
+            self.written_paths.pop()
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            release_upload(folder, size)
+            raise
+
+        self.files.append({
+            'filename': unique_filename,
+            'original_filename': original_filename,
+            'filepath': filepath,
+            'file_size': size,
+            'file_type': mimetypes.guess_type(original_filename)[0] or 'application/octet-stream',
+            'folder_id': folder.id,
+            'uploaded_by': self.user.username,
+            'uploaded_by_user_id': self.user.id,
+            'uploaded_at': datetime.utcnow(),
+        })
+
+    def flush(self):
+        """Bulk insert the pending batch and commit"""
+        if self.notes:
+            db.session.bulk_insert_mappings(Note, self.notes, return_defaults=True)
+            self.stats['notes'] += len(self.notes)
+        if self.files:
+            db.session.bulk_insert_mappings(File, self.files, return_defaults=True)
+            self.stats['files'] += len(self.files)
+        sync.folders_changed(self.new_folder_ids)
+        sync.notes_changed([note['id'] for note in self.notes])
+        sync.files_changed([file['id'] for file in self.files])
+        db.session.commit()
+
+        self.new_folder_ids = []
+        self.notes = []
+        self.files = []
+        self.written_paths = []
+        if self.progress:
+            self.progress(self.stats)
+
+    def run(self, fileobj, archive_name):
+        try:
+            try:
+                for path, size, open_member in iter_archive_entries(fileobj, archive_name):
+                    path = path.replace('\\', '/').lstrip('/')
+                    if _is_ignored(path):
+                        continue
+                    try:
+                        with open_member() as stream:
+                            if path.lower().endswith(NOTE_EXTENSIONS):
+                                self._add_note(path, stream, size)
+                            else:
+                                self._add_file(path, stream, size)
+                    except (ValueError, QuotaExceeded) + MEMBER_ERRORS as e:
+                        self.stats['error_count'] += 1
+                        if len(self.stats['errors']) < MAX_REPORTED_ERRORS:
+                            self.stats['errors'].append({'entry': path, 'error': str(e)})
+
+                    if len(self.notes) + len(self.files) >= self.batch_size:
+                        self.flush()
+            except ArchiveError as e:
+                # Keep the entries read before the damage
+                if self.notes or self.files:
+                    self.flush()
+                raise ArchiveError(str(e), self.stats) from e
+            self.flush()
+        except Exception:
+            # Files of the uncommitted batch have no rows pointing at them
+            db.session.rollback()
+            for filepath in self.written_paths:
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+            raise
+        return self.stats
+
+
+def import_archive(fileobj, archive_name, user, upload_folder, batch_size=500, progress=None):
+    """
+    Import a ZIP or tar archive for a user and return counts plus per-entry
+    errors (the first MAX_REPORTED_ERRORS of error_count). Raises ArchiveError,
+    with the counts so far as its stats, if the archive can't be read to the end.
+    """
+    importer = ArchiveImporter(user, upload_folder, archive_name, batch_size=batch_size, progress=progress)
+    return importer.run(fileobj, archive_name)
@@ -0,0 +1,164 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+from models import db, File
+
+# Sort keys exposed to the UI/API mapped to the indexed File column they order by.
+# Every (folder_id, <column>, id) combination is backed by an index in models.py.
+FILE_SORT_COLUMNS = {
+    'name': File.original_filename,
+    'size': File.file_size,
+    'date': File.uploaded_at,
+    'uploader': File.uploaded_by,
+}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(data):
+    """Encode a dict as an opaque, URL-safe cursor string"""
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, returning None if it is malformed"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _cursor_value(sort, value):
+    if sort == 'date' and value is not None:
+        return value.isoformat()
+    return value
+
+
+def _parse_cursor_value(sort, value):
+    """Turn a cursor value back into a column value; raises ValueError/TypeError if it was tampered with"""
+    if value is None:
+        return None
+    if sort == 'date':
+        return datetime.fromisoformat(value)
+    if sort == 'size':
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise TypeError('size cursor must be an integer')
+        return value
+    if not isinstance(value, str):
+        raise TypeError('cursor value must be a string')
+    return value
+
+
+def _cursor_position(cursor, sort, order):
+    """Return (value, last_id) of a cursor for this sort and order, or None to start at page 1"""
+    position = decode_cursor(cursor)
+    if not position or position.get('s') != sort or position.get('o') != order:
+        return None
+    last_id = position.get('id', 0)
+    if not isinstance(last_id, int) or isinstance(last_id, bool):
+        return None
+    try:
+        return _parse_cursor_value(sort, position.get('v')), last_id
+    except (ValueError, TypeError):
+        return None
+
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _nulls_sort_high():
+    # PostgreSQL sorts NULLs above every value, SQLite below. The listing keeps
+    # the database's own placement so ORDER BY matches the plain btree indexes.
+    return db.session.get_bind().dialect.name == 'postgresql'
+
+
+def _order_by(column, order):
+    if order == 'asc':
+        return column.asc(), File.id.asc()
+    return column.desc(), File.id.desc()
+
+
+def _after_filter(column, value, last_id, order, nulls_high=False):
+    """
+    Keyset condition for rows after (value, last_id). Comparisons never match
+    NULL, so nullable columns get explicit IS NULL branches placed where the
+    database sorts NULLs: after every value when they sort high and the order
+    is ascending (or low and descending), before every value otherwise.
+    """
+    after_id = File.id > last_id if order == 'asc' else File.id < last_id
+    nulls_last = (order == 'asc') == nulls_high
+
+    if value is None:
+        if nulls_last:
+            return and_(column.is_(None), after_id)
+        return or_(and_(column.is_(None), after_id), column.isnot(None))
+    after_value = column > value if order == 'asc' else column < value
+    condition = or_(after_value, and_(column == value, after_id))
+    if nulls_last and column.expression.nullable:
+        return or_(condition, column.is_(None))
+    return condition
+
+
+def parse_page_size(value):
+    """Clamp a requested page size to [1, MAX_PAGE_SIZE]"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def paginate_files(folder_id, sort='date', order='desc', q='', file_type='', cursor=None,
+                   limit=DEFAULT_PAGE_SIZE):
+    """
+    Return one keyset-paginated page of files in a folder.
+
+    Rows are ordered by (sort column, id) and the cursor stores the last row's
+    values, so each page is a single index range scan regardless of how deep
+    into the listing the client is.
+
+    Returns a tuple of (files, next_cursor); next_cursor is None on the last page.
+    """
+    if sort not in FILE_SORT_COLUMNS:
+        sort = 'date'
+    if order not in ('asc', 'desc'):
+        order = 'desc'
+    column = FILE_SORT_COLUMNS[sort]
+
+    query = File.query.filter(File.folder_id == folder_id)
+    if q:
+        query = query.filter(File.original_filename.ilike(f'%{_escape_like(q)}%', escape='\\'))
+    if file_type:
+        query = query.filter(File.file_type.like(f'{_escape_like(file_type)}%', escape='\\'))
+
+    # A malformed or tampered cursor just restarts the listing at page 1
+    position = _cursor_position(cursor, sort, order)
+    if position:
+        query = query.filter(_after_filter(column, *position, order, _nulls_sort_high()))
+    query = query.order_by(*_order_by(column, order))
+
+    # Fetch one extra row to learn whether another page exists without a COUNT(*)
+    rows = query.limit(limit + 1).all()
+    files = rows[:limit]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = files[-1]
+        next_cursor = encode_cursor({
+            's': sort,
+            'o': order,
+            'v': _cursor_value(sort, getattr(last, column.key)),
+            'id': last.id,
+        })
+
+    return files, next_cursor
@@ -0,0 +1,82 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import bleach
+import markdown
+from markupsafe import escape
+
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'sane_lists', 'nl2br']
+
+ALLOWED_TAGS = [
+    'a', 'abbr', 'b', 'blockquote', 'br', 'code', 'del', 'em', 'h1', 'h2', 'h3',
+    'h4', 'h5', 'h6', 'hr', 'i', 'img', 'li', 'ol', 'p', 'pre', 'strong', 'sub',
+    'sup', 'table', 'tbody', 'td', 'th', 'thead', 'tr', 'ul',
+]
+ALLOWED_ATTRIBUTES = {
+    'a': ['href', 'title'],
+    'abbr': ['title'],
+    'img': ['src', 'alt', 'title'],
+    'td': ['align'],
+    'th': ['align'],
+}
+ALLOWED_PROTOCOLS = ['http', 'https', 'mailto']
+
+# Markdown parsing and sanitizing grow faster than linearly with note size
+# (see benchmarks/bench_markdown_render.py); bigger notes are almost always
+# pasted logs or data, so they are shown as escaped preformatted text.
+MAX_MARKDOWN_CHARS = 64 * 1024
+
+
+def render_markdown(text):
+    """Render markdown to HTML and strip anything outside the allow-list"""
+    if len(text) > MAX_MARKDOWN_CHARS:
+        return f'<pre class="plain-text">{escape(text)}</pre>'
+    html = markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS, output_format='html')
+    return bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES,
+                        protocols=ALLOWED_PROTOCOLS, strip=True)
+
+
+class RenderCache:
+    """
+    Thread-safe LRU of rendered HTML keyed by the SHA-256 of the markdown
+    source, bounded by the total UTF-8 size of the cached HTML. Edits change
+    the hash, so stale entries are never served and simply age out.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_or_render(self, text):
+        key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        # Render outside the lock so a huge note does not block other readers
+        html = render_markdown(text)
+        size = len(html.encode('utf-8'))
+        if size > self.max_bytes:
+            return html
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (html, size)
+                self._size += size
+                while self._size > self.max_bytes:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self._size -= evicted_size
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+render_cache = RenderCache()
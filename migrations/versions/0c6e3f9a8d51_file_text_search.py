@@ -0,0 +1,58 @@
+"""Add extracted file text and full-text search index
+
+Revision ID: 0c6e3f9a8d51
+Revises: f4b2c8d6e913
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0c6e3f9a8d51'
+down_revision = 'f4b2c8d6e913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('file_text',
+        sa.Column('file_id', sa.Integer(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('source_size', sa.BigInteger(), nullable=False),
+        sa.Column('source_mtime', sa.Float(), nullable=False),
+        sa.Column('indexed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['file_id'], ['file.id'], name='fk_file_text_file_id', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('file_id')
+    )
+
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE file_text_fts USING fts5(content, content='file_text', content_rowid='file_id')")
+        op.execute(
+            'CREATE TRIGGER file_text_ai AFTER INSERT ON file_text BEGIN '
+            'INSERT INTO file_text_fts(rowid, content) VALUES (new.file_id, new.content); END'
+        )
+        op.execute(
+            'CREATE TRIGGER file_text_ad AFTER DELETE ON file_text BEGIN '
+            "INSERT INTO file_text_fts(file_text_fts, rowid, content) VALUES ('delete', old.file_id, old.content); END"
+        )
+        op.execute(
+            'CREATE TRIGGER file_text_au AFTER UPDATE ON file_text BEGIN '
+            "INSERT INTO file_text_fts(file_text_fts, rowid, content) VALUES ('delete', old.file_id, old.content); "
+            'INSERT INTO file_text_fts(rowid, content) VALUES (new.file_id, new.content); END'
+        )
+    elif op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "ALTER TABLE file_text ADD COLUMN search tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED"
+        )
+        op.execute('CREATE INDEX ix_file_text_search ON file_text USING gin (search)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for trigger in ('file_text_au', 'file_text_ad', 'file_text_ai'):
+            op.execute(f'DROP TRIGGER {trigger}')
+        op.execute('DROP TABLE file_text_fts')
+    op.drop_table('file_text')
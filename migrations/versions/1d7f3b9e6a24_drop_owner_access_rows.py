@@ -0,0 +1,33 @@
+"""Drop access rows that grant owners access to their own notes and folders
+
+Revision ID: 1d7f3b9e6a24
+Revises: 0c6e3f9a8d51
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1d7f3b9e6a24'
+down_revision = '0c6e3f9a8d51'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Written when owners shared with a group they belong to; acl.py no longer creates them
+    op.execute(
+        'DELETE FROM note_access WHERE EXISTS (SELECT 1 FROM note '
+        'WHERE note.id = note_access.note_id AND note.user_id = note_access.user_id)'
+    )
+    op.execute(
+        'DELETE FROM folder_access WHERE EXISTS (SELECT 1 FROM folder '
+        'WHERE folder.id = folder_access.folder_id AND folder.user_id = folder_access.user_id)'
+    )
+
+
+def downgrade():
+    # The rows carried no information beyond what ownership already grants
+    pass
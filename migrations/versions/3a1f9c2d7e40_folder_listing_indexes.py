@@ -0,0 +1,34 @@
+"""Add composite indexes for paginated folder listings
+
+Revision ID: 3a1f9c2d7e40
+Revises: 
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a1f9c2d7e40'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.create_index('ix_file_folder_uploaded_at', ['folder_id', 'uploaded_at', 'id'], unique=False)
+        batch_op.create_index('ix_file_folder_name', ['folder_id', 'original_filename', 'id'], unique=False)
+        batch_op.create_index('ix_file_folder_size', ['folder_id', 'file_size', 'id'], unique=False)
+        batch_op.create_index('ix_file_folder_uploader', ['folder_id', 'uploaded_by', 'id'], unique=False)
+        batch_op.create_index('ix_file_folder_type', ['folder_id', 'file_type'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.drop_index('ix_file_folder_type')
+        batch_op.drop_index('ix_file_folder_uploader')
+        batch_op.drop_index('ix_file_folder_size')
+        batch_op.drop_index('ix_file_folder_name')
+        batch_op.drop_index('ix_file_folder_uploaded_at')
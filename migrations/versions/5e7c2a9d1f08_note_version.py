@@ -0,0 +1,26 @@
+"""Add version column to note for optimistic concurrency
+
+Revision ID: 5e7c2a9d1f08
+Revises: c4d81e7a5b92
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e7c2a9d1f08'
+down_revision = 'c4d81e7a5b92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.drop_column('version')
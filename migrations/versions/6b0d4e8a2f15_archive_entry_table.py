@@ -0,0 +1,42 @@
+"""Move archive entry listings from a JSON column to their own table
+
+Revision ID: 6b0d4e8a2f15
+Revises: 1d7f3b9e6a24
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6b0d4e8a2f15'
+down_revision = '1d7f3b9e6a24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archive_entry',
+        sa.Column('file_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('member', sa.Integer(), nullable=False),
+        sa.Column('name', sa.Text(), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('compressed_size', sa.BigInteger(), nullable=True),
+        sa.Column('modified', sa.DateTime(), nullable=True),
+        sa.Column('data_offset', sa.BigInteger(), nullable=True),
+        sa.ForeignKeyConstraint(['file_id'], ['file.id'], name='fk_archive_entry_file_id', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('file_id', 'position')
+    )
+    # The JSON listings are a cache; archives are listed again on next view
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('archive_entry_count', sa.Integer(), nullable=True))
+        batch_op.drop_column('archive_index')
+
+
+def downgrade():
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('archive_index', sa.LargeBinary(), nullable=True))
+        batch_op.drop_column('archive_entry_count')
+    op.drop_table('archive_entry')
@@ -0,0 +1,48 @@
+"""Add storage usage counters to user and folder
+
+Revision ID: 8b2e4f61c9a3
+Revises: 3a1f9c2d7e40
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4f61c9a3'
+down_revision = '3a1f9c2d7e40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('bytes_used', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('file_count', sa.Integer(), nullable=False, server_default='0'))
+
+    with op.batch_alter_table('folder', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('bytes_used', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('file_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from existing files (same as `flask recompute-usage`)
+    op.execute(
+        'UPDATE folder SET '
+        'bytes_used = (SELECT COALESCE(SUM(file.file_size), 0) FROM file WHERE file.folder_id = folder.id), '
+        'file_count = (SELECT COUNT(file.id) FROM file WHERE file.folder_id = folder.id)'
+    )
+    op.execute(
+        'UPDATE "user" SET '
+        'bytes_used = (SELECT COALESCE(SUM(folder.bytes_used), 0) FROM folder WHERE folder.user_id = "user".id), '
+        'file_count = (SELECT COALESCE(SUM(folder.file_count), 0) FROM folder WHERE folder.user_id = "user".id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('folder', schema=None) as batch_op:
+        batch_op.drop_column('file_count')
+        batch_op.drop_column('bytes_used')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('file_count')
+        batch_op.drop_column('bytes_used')
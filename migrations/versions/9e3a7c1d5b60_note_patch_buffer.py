@@ -0,0 +1,34 @@
+"""Buffer autosave patches before folding them into note content
+
+Revision ID: 9e3a7c1d5b60
+Revises: 6b0d4e8a2f15
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3a7c1d5b60'
+down_revision = '6b0d4e8a2f15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('note_patch',
+        sa.Column('note_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=200), nullable=True),
+        sa.Column('patches', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['note_id'], ['note.id'], name='fk_note_patch_note_id', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('note_id', 'version', 'seq')
+    )
+
+
+def downgrade():
+    # Buffered autosaves that were never folded into their notes are lost
+    op.drop_table('note_patch')
@@ -0,0 +1,76 @@
+"""Add ON DELETE CASCADE / SET NULL to foreign keys
+
+Revision ID: a7d3c5f81e26
+Revises: e92b6d3f4a17
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3c5f81e26'
+down_revision = 'e92b6d3f4a17'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table, ondelete)
+FOREIGN_KEYS = [
+    ('note', 'user_id', 'user', 'CASCADE'),
+    ('folder', 'user_id', 'user', 'CASCADE'),
+    ('file', 'folder_id', 'folder', 'CASCADE'),
+    ('file', 'uploaded_by_user_id', 'user', 'SET NULL'),
+    ('group', 'owner_id', 'user', 'CASCADE'),
+    ('group_membership', 'group_id', 'group', 'CASCADE'),
+    ('group_membership', 'user_id', 'user', 'CASCADE'),
+    ('shared_note', 'note_id', 'note', 'CASCADE'),
+    ('shared_note', 'shared_with_user_id', 'user', 'CASCADE'),
+    ('shared_note', 'shared_with_group_id', 'group', 'CASCADE'),
+    ('shared_note', 'shared_by_user_id', 'user', 'CASCADE'),
+    ('shared_folder', 'folder_id', 'folder', 'CASCADE'),
+    ('shared_folder', 'shared_with_user_id', 'user', 'CASCADE'),
+    ('shared_folder', 'shared_with_group_id', 'group', 'CASCADE'),
+    ('shared_folder', 'shared_by_user_id', 'user', 'CASCADE'),
+    ('note_access', 'user_id', 'user', 'CASCADE'),
+    ('note_access', 'note_id', 'note', 'CASCADE'),
+    ('folder_access', 'user_id', 'user', 'CASCADE'),
+    ('folder_access', 'folder_id', 'folder', 'CASCADE'),
+]
+
+# Gives the unnamed constraints SQLite reflects a name batch mode can drop
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s'}
+
+
+def _existing_names(table):
+    names = {}
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys(table):
+        column = fk['constrained_columns'][0]
+        names[column] = fk['name'] or f'fk_{table}_{column}'
+    return names
+
+
+def _replace_foreign_keys(cascade):
+    tables = []
+    for table, *_ in FOREIGN_KEYS:
+        if table not in tables:
+            tables.append(table)
+
+    for table in tables:
+        existing = _existing_names(table)
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            for fk_table, column, referred, ondelete in FOREIGN_KEYS:
+                if fk_table != table:
+                    continue
+                if column in existing:
+                    batch_op.drop_constraint(existing[column], type_='foreignkey')
+                batch_op.create_foreign_key(f'fk_{table}_{column}', referred, [column], ['id'],
+                                            ondelete=ondelete if cascade else None)
+
+
+def upgrade():
+    _replace_foreign_keys(cascade=True)
+
+
+def downgrade():
+    _replace_foreign_keys(cascade=False)
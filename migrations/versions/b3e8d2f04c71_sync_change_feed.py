@@ -0,0 +1,56 @@
+"""Add change feed table and per-user change sequence for delta sync
+
+Revision ID: b3e8d2f04c71
+Revises: a7d3c5f81e26
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8d2f04c71'
+down_revision = 'a7d3c5f81e26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sync_seq', sa.Integer(), nullable=False, server_default='0'))
+
+    op.create_table('sync_change',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('object_id', sa.Integer(), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('deleted', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], name='fk_sync_change_user_id', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'kind', 'object_id')
+    )
+    op.create_index('ix_sync_change_user_seq', 'sync_change', ['user_id', 'seq', 'kind', 'object_id'], unique=False)
+
+    # Seed the feed with everything each user can currently see, all at sequence 1
+    op.execute(
+        'INSERT INTO sync_change (user_id, kind, object_id, seq, deleted) '
+        "SELECT user_id, 'note', id, 1, FALSE FROM note "
+        "UNION SELECT user_id, 'note', note_id, 1, FALSE FROM note_access "
+        "UNION SELECT user_id, 'folder', id, 1, FALSE FROM folder "
+        "UNION SELECT user_id, 'folder', folder_id, 1, FALSE FROM folder_access "
+        "UNION SELECT folder.user_id, 'file', file.id, 1, FALSE FROM file JOIN folder ON folder.id = file.folder_id "
+        "UNION SELECT folder_access.user_id, 'file', file.id, 1, FALSE FROM file "
+        'JOIN folder_access ON folder_access.folder_id = file.folder_id '
+        "UNION SELECT shared_by_user_id, 'note_share', id, 1, FALSE FROM shared_note "
+        "UNION SELECT shared_with_user_id, 'note_share', id, 1, FALSE FROM shared_note WHERE shared_with_user_id IS NOT NULL "
+        "UNION SELECT shared_by_user_id, 'folder_share', id, 1, FALSE FROM shared_folder "
+        "UNION SELECT shared_with_user_id, 'folder_share', id, 1, FALSE FROM shared_folder WHERE shared_with_user_id IS NOT NULL"
+    )
+    op.execute('UPDATE "user" SET sync_seq = 1')
+
+
+def downgrade():
+    op.drop_index('ix_sync_change_user_seq', table_name='sync_change')
+    op.drop_table('sync_change')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('sync_seq')
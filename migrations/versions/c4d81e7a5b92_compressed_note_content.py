@@ -0,0 +1,60 @@
+"""Store note content as compressible bytes
+
+Revision ID: c4d81e7a5b92
+Revises: 8b2e4f61c9a3
+Create Date: 2026-10-19 11:00:00.000000
+
+Existing rows are converted as-is (UTF-8, no format marker) and stay
+readable; run `flask compress-notes` afterwards to compress them in
+batches while the app is online.
+
+The conversion itself is not online: on PostgreSQL the ALTER COLUMN ...
+USING convert_to(...) rewrites the whole note table under an ACCESS
+EXCLUSIVE lock, blocking reads and writes of notes until it finishes.
+Schedule it in a maintenance window on large databases.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from models import CompressedText
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d81e7a5b92'
+down_revision = '8b2e4f61c9a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.alter_column('content',
+                              existing_type=sa.Text(),
+                              type_=sa.LargeBinary(),
+                              existing_nullable=False,
+                              postgresql_using="convert_to(content, 'UTF8')")
+
+
+def downgrade():
+    # Compressed rows cannot be converted in SQL, so decode them in Python
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_text', sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    note = sa.table('note', sa.column('id', sa.Integer), sa.column('content', sa.LargeBinary),
+                    sa.column('content_text', sa.Text))
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.select(note.c.id, note.c.content)
+                            .where(note.c.id > last_id).order_by(note.c.id).limit(500)).all()
+        if not rows:
+            break
+        for note_id, raw in rows:
+            bind.execute(note.update().where(note.c.id == note_id)
+                         .values(content_text=CompressedText.decompress(raw)))
+        last_id = rows[-1][0]
+
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.drop_column('content')
+        batch_op.alter_column('content_text', new_column_name='content', nullable=False)
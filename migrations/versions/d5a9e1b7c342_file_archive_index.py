@@ -0,0 +1,26 @@
+"""Add cached archive entry listing to file
+
+Revision ID: d5a9e1b7c342
+Revises: b3e8d2f04c71
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a9e1b7c342'
+down_revision = 'b3e8d2f04c71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('archive_index', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.drop_column('archive_index')
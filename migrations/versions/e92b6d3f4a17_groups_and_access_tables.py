@@ -0,0 +1,104 @@
+"""Add groups, group shares and materialized access tables
+
+Revision ID: e92b6d3f4a17
+Revises: 5e7c2a9d1f08
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e92b6d3f4a17'
+down_revision = '5e7c2a9d1f08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('group',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=150), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    op.create_table('group_membership',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('group_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('added_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['group_id'], ['group.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('group_id', 'user_id', name='uq_group_membership')
+    )
+    op.create_index('ix_group_membership_user_id', 'group_membership', ['user_id'], unique=False)
+
+    op.create_table('note_access',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('note_id', sa.Integer(), nullable=False),
+        sa.Column('grant_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['note_id'], ['note.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'note_id')
+    )
+    op.create_index('ix_note_access_note_id', 'note_access', ['note_id'], unique=False)
+    op.create_table('folder_access',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('folder_id', sa.Integer(), nullable=False),
+        sa.Column('grant_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['folder_id'], ['folder.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'folder_id')
+    )
+    op.create_index('ix_folder_access_folder_id', 'folder_access', ['folder_id'], unique=False)
+
+    for table in ('shared_note', 'shared_folder'):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('shared_with_group_id', sa.Integer(), nullable=True))
+            batch_op.alter_column('shared_with_user_id', existing_type=sa.Integer(), nullable=True)
+            batch_op.create_index(f'ix_{table}_shared_with_group_id', ['shared_with_group_id'], unique=False)
+            batch_op.create_foreign_key(f'fk_{table}_shared_with_group_id', 'group', ['shared_with_group_id'], ['id'])
+
+    # Existing shares are all direct user shares
+    op.execute(
+        'INSERT INTO note_access (user_id, note_id, grant_count) '
+        'SELECT shared_with_user_id, note_id, COUNT(*) FROM shared_note GROUP BY shared_with_user_id, note_id'
+    )
+    op.execute(
+        'INSERT INTO folder_access (user_id, folder_id, grant_count) '
+        'SELECT shared_with_user_id, folder_id, COUNT(*) FROM shared_folder GROUP BY shared_with_user_id, folder_id'
+    )
+
+    # The JSON shared_with columns were never read or written
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.drop_column('shared_with')
+    with op.batch_alter_table('folder', schema=None) as batch_op:
+        batch_op.drop_column('shared_with')
+
+
+def downgrade():
+    with op.batch_alter_table('folder', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('shared_with', sa.Text(), nullable=True))
+    with op.batch_alter_table('note', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('shared_with', sa.Text(), nullable=True))
+
+    for table in ('shared_folder', 'shared_note'):
+        op.execute(f'DELETE FROM {table} WHERE shared_with_user_id IS NULL')
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_constraint(f'fk_{table}_shared_with_group_id', type_='foreignkey')
+            batch_op.drop_index(f'ix_{table}_shared_with_group_id')
+            batch_op.alter_column('shared_with_user_id', existing_type=sa.Integer(), nullable=False)
+            batch_op.drop_column('shared_with_group_id')
+
+    op.drop_index('ix_folder_access_folder_id', table_name='folder_access')
+    op.drop_table('folder_access')
+    op.drop_index('ix_note_access_note_id', table_name='note_access')
+    op.drop_table('note_access')
+    op.drop_index('ix_group_membership_user_id', table_name='group_membership')
+    op.drop_table('group_membership')
+    op.drop_table('group')
@@ -0,0 +1,26 @@
+"""Add cached line index for the text viewer to file
+
+Revision ID: f4b2c8d6e913
+Revises: d5a9e1b7c342
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b2c8d6e913'
+down_revision = 'd5a9e1b7c342'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('line_index', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('file', schema=None) as batch_op:
+        batch_op.drop_column('line_index')
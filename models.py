@@ -2,9 +2,86 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import sqlite3
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+from replica import RoutingSession
 
 # Initialize db here to avoid circular imports
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite only honours ON DELETE CASCADE when foreign keys are switched on per connection
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+class CompressedText(db.TypeDecorator):
+    """
+    Text stored as bytes, compressed once it grows past a threshold.
+    
+    Stored values start with a one-byte format marker (plain UTF-8, zlib or
+    zstd). Values without a marker are legacy uncompressed text from before
+    the column was converted, so reads always return a plain str.
+    """
+    impl = db.LargeBinary
+    cache_ok = True
+    
+    MARKER_PLAIN = b'\x00'
+    MARKER_ZLIB = b'\x01'
+    MARKER_ZSTD = b'\x02'
+    
+    def __init__(self, threshold=4096, level=6, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threshold = threshold
+        self.level = level
+    
+    def compress(self, text):
+        data = text.encode('utf-8')
+        if len(data) < self.threshold:
+            return self.MARKER_PLAIN + data
+        if zstandard is not None:
+            return self.MARKER_ZSTD + zstandard.ZstdCompressor(level=self.level).compress(data)
+        return self.MARKER_ZLIB + zlib.compress(data, self.level)
+    
+    @classmethod
+    def decompress(cls, value):
+        if isinstance(value, str):
+            return value
+        value = bytes(value)
+        marker, body = value[:1], value[1:]
+        if marker == cls.MARKER_PLAIN:
+            return body.decode('utf-8')
+        if marker == cls.MARKER_ZLIB:
+            return zlib.decompress(body).decode('utf-8')
+        if marker == cls.MARKER_ZSTD:
+            if zstandard is None:
+                raise RuntimeError('zstandard is required to read zstd-compressed content')
+            return zstandard.ZstdDecompressor().decompress(body).decode('utf-8')
+        return value.decode('utf-8')
+    
+    @classmethod
+    def is_compressed(cls, value):
+        return isinstance(value, (bytes, memoryview)) and bytes(value[:1]) in (cls.MARKER_ZLIB, cls.MARKER_ZSTD)
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return self.compress(value)
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return self.decompress(value)
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -13,9 +90,15 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Relationships
-    notes = db.relationship('Note', backref='user', lazy=True, cascade='all, delete-orphan')
-    folders = db.relationship('Folder', backref='user', lazy=True, cascade='all, delete-orphan')
+    # Storage usage across all folders owned by this user (maintained by storage.py)
+    bytes_used = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    file_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Sequence number of the user's latest change feed entry (maintained by sync.py)
+    sync_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Relationships (child rows are removed by ON DELETE CASCADE, never loaded for deletion)
+    notes = db.relationship('Note', backref='user', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    folders = db.relationship('Folder', backref='user', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -29,28 +112,46 @@ class User(UserMixin, db.Model):
 class Note(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
-    content = db.Column(db.Text, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    content = db.Column(CompressedText(threshold=4096), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     is_public = db.Column(db.Boolean, default=False)
-    shared_with = db.Column(db.Text)  # JSON string of user IDs
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped on every write; UPDATEs are guarded by it (optimistic concurrency)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    
+    __mapper_args__ = {'version_id_col': version}
     
     def __repr__(self):
         return f'<Note {self.title}>'
 
+# Autosaves buffered against a note version (see autosave.py). They are folded
+# into Note.content, which bumps the version and writes the change feed, at
+# most once per AUTOSAVE_COALESCE_SECONDS; rows left from an older version are
+# ignored and cleared on the next fold.
+class NotePatch(db.Model):
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id', ondelete='CASCADE'), primary_key=True)
+    version = db.Column(db.Integer, primary_key=True)
+    seq = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200))  # None when the save left the title alone
+    patches = db.Column(db.Text, nullable=False)  # JSON list of splices
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 class Folder(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(150), nullable=False)
     description = db.Column(db.Text)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     is_public = db.Column(db.Boolean, default=False)
     allow_file_drop = db.Column(db.Boolean, default=False)
-    shared_with = db.Column(db.Text)  # JSON string of user IDs
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Storage usage of the files in this folder (maintained by storage.py)
+    bytes_used = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    file_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Relationships
-    files = db.relationship('File', backref='folder', lazy=True, cascade='all, delete-orphan')
+    files = db.relationship('File', backref='folder', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     
     def __repr__(self):
         return f'<Folder {self.name}>'
@@ -62,32 +163,149 @@ class File(db.Model):
     filepath = db.Column(db.String(500), nullable=False)
     file_size = db.Column(db.Integer, nullable=False)
     file_type = db.Column(db.String(100))
-    folder_id = db.Column(db.Integer, db.ForeignKey('folder.id'), nullable=False)
+    folder_id = db.Column(db.Integer, db.ForeignKey('folder.id', ondelete='CASCADE'), nullable=False)
     uploaded_by = db.Column(db.String(150))  # Can be 'anonymous' for public uploads
-    uploaded_by_user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    uploaded_by_user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'))
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Number of ArchiveEntry rows listed for a ZIP/tar upload, None until first listed
+    archive_entry_count = db.Column(db.Integer)
+    # Cached newline counts per block for the text viewer (see text_preview.py)
+    line_index = db.deferred(db.Column(CompressedText(threshold=4096)))
+    
+    # Composite indexes backing the keyset-paginated folder listing (see listing.py)
+    __table_args__ = (
+        db.Index('ix_file_folder_uploaded_at', 'folder_id', 'uploaded_at', 'id'),
+        db.Index('ix_file_folder_name', 'folder_id', 'original_filename', 'id'),
+        db.Index('ix_file_folder_size', 'folder_id', 'file_size', 'id'),
+        db.Index('ix_file_folder_uploader', 'folder_id', 'uploaded_by', 'id'),
+        db.Index('ix_file_folder_type', 'folder_id', 'file_type'),
+    )
     
     def __repr__(self):
         return f'<File {self.original_filename}>'
 
+class Group(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(150), unique=True, nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    owner = db.relationship('User', foreign_keys=[owner_id])
+    
+    def __repr__(self):
+        return f'<Group {self.name}>'
+
+class GroupMembership(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.Integer, db.ForeignKey('group.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    added_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    group = db.relationship('Group', backref=db.backref('memberships', passive_deletes=True))
+    user = db.relationship('User', foreign_keys=[user_id])
+    
+    __table_args__ = (
+        db.UniqueConstraint('group_id', 'user_id', name='uq_group_membership'),
+    )
+
+# A share targets either a single user or a whole group
 class SharedNote(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    note_id = db.Column(db.Integer, db.ForeignKey('note.id'), nullable=False)
-    shared_with_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    shared_by_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id', ondelete='CASCADE'), nullable=False)
+    shared_with_user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'))
+    shared_with_group_id = db.Column(db.Integer, db.ForeignKey('group.id', ondelete='CASCADE'), index=True)
+    shared_by_user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     shared_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    note = db.relationship('Note', backref='shared_notes')
+    note = db.relationship('Note', backref=db.backref('shared_notes', passive_deletes=True))
     shared_with_user = db.relationship('User', foreign_keys=[shared_with_user_id])
+    shared_with_group = db.relationship('Group', foreign_keys=[shared_with_group_id])
     shared_by_user = db.relationship('User', foreign_keys=[shared_by_user_id])
 
 class SharedFolder(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    folder_id = db.Column(db.Integer, db.ForeignKey('folder.id'), nullable=False)
-    shared_with_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    shared_by_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    folder_id = db.Column(db.Integer, db.ForeignKey('folder.id', ondelete='CASCADE'), nullable=False)
+    shared_with_user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'))
+    shared_with_group_id = db.Column(db.Integer, db.ForeignKey('group.id', ondelete='CASCADE'), index=True)
+    shared_by_user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     shared_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    folder = db.relationship('Folder', backref='shared_folders')
+    folder = db.relationship('Folder', backref=db.backref('shared_folders', passive_deletes=True))
     shared_with_user = db.relationship('User', foreign_keys=[shared_with_user_id])
-    shared_by_user = db.relationship('User', foreign_keys=[shared_by_user_id])
\ No newline at end of file
+    shared_with_group = db.relationship('Group', foreign_keys=[shared_with_group_id])
+    shared_by_user = db.relationship('User', foreign_keys=[shared_by_user_id])
+
+# Materialized effective access, maintained incrementally by acl.py.
+# grant_count is the number of shares (direct or through groups) that give
+# the user access, so a row disappears only when the last path is removed.
+class NoteAccess(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id', ondelete='CASCADE'), primary_key=True, index=True)
+    grant_count = db.Column(db.Integer, nullable=False, default=1)
+
+class FolderAccess(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    folder_id = db.Column(db.Integer, db.ForeignKey('folder.id', ondelete='CASCADE'), primary_key=True, index=True)
+    grant_count = db.Column(db.Integer, nullable=False, default=1)
+
+# Change feed for delta sync, maintained by sync.py. One row per user and
+# object, replaced on every change; deleted rows are tombstones.
+class SyncChange(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    kind = db.Column(db.String(20), primary_key=True)
+    object_id = db.Column(db.Integer, primary_key=True)
+    seq = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    
+    __table_args__ = (
+        db.Index('ix_sync_change_user_seq', 'user_id', 'seq', 'kind', 'object_id'),
+    )
+
+# Entry listing of ZIP/tar uploads, built on first view by archives.py. Rows
+# are numbered by position so a page is a range scan on the primary key;
+# member is the entry's index in the archive itself, which stays unambiguous
+# when several members share a name.
+class ArchiveEntry(db.Model):
+    file_id = db.Column(db.Integer, db.ForeignKey('file.id', ondelete='CASCADE'), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True)
+    member = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.Text, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    compressed_size = db.Column(db.BigInteger)
+    modified = db.Column(db.DateTime)
+    # Start of the member's data in uncompressed tars, which are read in place
+    data_offset = db.Column(db.BigInteger)
+
+# Extracted text of uploaded files for full-text search, filled outside the
+# request path by file_search.py. Files that aren't text get an empty row so
+# they are not picked up again; source_size/source_mtime detect changes.
+class FileText(db.Model):
+    file_id = db.Column(db.Integer, db.ForeignKey('file.id', ondelete='CASCADE'), primary_key=True)
+    content = db.Column(db.Text, nullable=False, default='')
+    source_size = db.Column(db.BigInteger, nullable=False)
+    source_mtime = db.Column(db.Float, nullable=False)
+    indexed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# The search index itself is dialect specific: an FTS5 table kept in sync by
+# triggers on SQLite, a stored tsvector column with a GIN index on PostgreSQL
+FILE_TEXT_SEARCH_DDL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE file_text_fts USING fts5(content, content='file_text', content_rowid='file_id')",
+        'CREATE TRIGGER file_text_ai AFTER INSERT ON file_text BEGIN '
+        'INSERT INTO file_text_fts(rowid, content) VALUES (new.file_id, new.content); END',
+        'CREATE TRIGGER file_text_ad AFTER DELETE ON file_text BEGIN '
+        "INSERT INTO file_text_fts(file_text_fts, rowid, content) VALUES ('delete', old.file_id, old.content); END",
+        'CREATE TRIGGER file_text_au AFTER UPDATE ON file_text BEGIN '
+        "INSERT INTO file_text_fts(file_text_fts, rowid, content) VALUES ('delete', old.file_id, old.content); "
+        'INSERT INTO file_text_fts(rowid, content) VALUES (new.file_id, new.content); END',
+    ],
+    'postgresql': [
+        "ALTER TABLE file_text ADD COLUMN search tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED",
+        'CREATE INDEX ix_file_text_search ON file_text USING gin (search)',
+    ],
+}
+
+for dialect, statements in FILE_TEXT_SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(FileText.__table__, 'after_create', db.DDL(statement).execute_if(dialect=dialect))
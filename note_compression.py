@@ -0,0 +1,65 @@
+from sqlalchemy import bindparam, select, type_coerce
+
+from models import db, Note, CompressedText
+
+
+def compress_existing_notes(batch_size=500, progress=None):
+    """
+    Rewrite legacy or below-threshold-at-the-time Note.content values into
+    the compressed format, walking the table by primary key in small batches
+    with a commit after each one so the app keeps serving while it runs.
+
+    Each row is only rewritten if its version is unchanged since the batch
+    was read; rows edited in the meantime are counted as skipped and were
+    already stored in the current format by the edit itself.
+
+    Returns a dict with rows scanned/compressed/skipped and stored bytes
+    before/after.
+    """
+    table = Note.__table__
+    column_type = table.c.content.type
+    # Read the stored bytes as-is so already-compressed rows can be skipped cheaply
+    raw_content = type_coerce(table.c.content, db.LargeBinary)
+
+    stats = {'scanned': 0, 'compressed': 0, 'skipped': 0, 'bytes_before': 0, 'bytes_after': 0}
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, table.c.version, raw_content.label('raw'))
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        for note_id, version, raw in rows:
+            stats['scanned'] += 1
+            if raw is None or CompressedText.is_compressed(raw):
+                continue
+
+            stored = column_type.compress(CompressedText.decompress(raw))
+            if not CompressedText.is_compressed(stored):
+                continue
+
+            result = db.session.execute(
+                table.update()
+                # An edit committed since the batch was read must not be overwritten
+                .where(table.c.id == note_id, table.c.version == version)
+                # Keep updated_at and version untouched: compression is not a user edit
+                .values({table.c.content: bindparam('stored', stored, type_=db.LargeBinary),
+                         table.c.updated_at: table.c.updated_at})
+            )
+            if result.rowcount == 0:
+                stats['skipped'] += 1
+                continue
+            stats['compressed'] += 1
+            stats['bytes_before'] += len(raw.encode('utf-8') if isinstance(raw, str) else raw)
+            stats['bytes_after'] += len(stored)
+
+        db.session.commit()
+        last_id = rows[-1][0]
+        if progress:
+            progress(stats)
+
+    return stats
@@ -0,0 +1,220 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import abort
+
+try:
+    import redis
+except ImportError:  # only needed for the shared backend
+    redis = None
+
+
+class MemoryBackend:
+    """Token buckets and concurrency counters held in this process only"""
+
+    # Drop buckets that have refilled once the table grows past this many
+    # keys, scanning at most once per PRUNE_INTERVAL seconds
+    MAX_KEYS = 10000
+    PRUNE_INTERVAL = 10.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (tokens, updated, time at which the bucket is full again)
+        self._buckets = {}
+        self._counters = {}
+        self._next_prune = 0.0
+
+    def take(self, buckets):
+        """Take cost from every (key, cost, capacity, rate) bucket, or from none if any is short"""
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            retry_after = 0.0
+            for key, cost, capacity, rate in buckets:
+                tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+                tokens = min(capacity, tokens + (now - updated) * rate)
+                if tokens < cost:
+                    retry_after = max(retry_after, (cost - tokens) / rate)
+                levels.append(tokens)
+            for (key, cost, capacity, rate), tokens in zip(buckets, levels):
+                if not retry_after:
+                    tokens -= cost
+                self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            if len(self._buckets) > self.MAX_KEYS and now >= self._next_prune:
+                self._prune(now)
+        return retry_after
+
+    def _prune(self, now):
+        # A bucket that has refilled completely carries no state
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if bucket[2] > now}
+        self._next_prune = now + self.PRUNE_INTERVAL
+
+    def acquire(self, key, limit):
+        with self._lock:
+            if self._counters.get(key, 0) >= limit:
+                return False
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return True
+
+    def release(self, key):
+        with self._lock:
+            self._counters[key] = max(0, self._counters.get(key, 0) - 1)
+
+
+class RedisBackend:
+    """Token buckets and concurrency counters shared by every worker through Redis"""
+
+    # Refill every bucket, then take from all of them only if none is short,
+    # atomically and using the Redis clock so all workers agree.
+    # ARGV holds capacity, rate and cost for each key in turn.
+    TAKE_SCRIPT = """
+    local now_parts = redis.call('TIME')
+    local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+    local levels = {}
+    local retry_after = 0
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[i * 3 - 2])
+        local rate = tonumber(ARGV[i * 3 - 1])
+        local cost = tonumber(ARGV[i * 3])
+        local state = redis.call('HMGET', key, 'tokens', 'ts')
+        local tokens = tonumber(state[1]) or capacity
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + (now - updated) * rate)
+        if tokens < cost then
+            retry_after = math.max(retry_after, (cost - tokens) / rate)
+        end
+        levels[i] = tokens
+    end
+    for i, key in ipairs(KEYS) do
+        local capacity = tonumber(ARGV[i * 3 - 2])
+        local rate = tonumber(ARGV[i * 3 - 1])
+        local tokens = levels[i]
+        if retry_after == 0 then
+            tokens = tokens - tonumber(ARGV[i * 3])
+        end
+        redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+        redis.call('EXPIRE', key, math.ceil((capacity - tokens) / rate) + 1)
+    end
+    return tostring(retry_after)
+    """
+
+    # The TTL is only set when the counter is created, so it runs out one
+    # SLOT_TTL after the first upload even under steady traffic and clears
+    # slots leaked by crashed workers
+    ACQUIRE_SCRIPT = """
+    local count = redis.call('INCR', KEYS[1])
+    if count == 1 then
+        redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+    end
+    if count > tonumber(ARGV[1]) then
+        redis.call('DECR', KEYS[1])
+        return 0
+    end
+    return 1
+    """
+
+    # Never go below zero after the counter expired under a running upload
+    RELEASE_SCRIPT = """
+    if tonumber(redis.call('GET', KEYS[1]) or '0') > 0 then
+        redis.call('DECR', KEYS[1])
+    end
+    return 1
+    """
+
+    SLOT_TTL = 3600
+
+    def __init__(self, url, prefix='ratelimit:'):
+        if redis is None:
+            raise RuntimeError('The redis package is required for RATELIMIT_STORAGE_URL')
+        self._redis = redis.Redis.from_url(url)
+        self._take = self._redis.register_script(self.TAKE_SCRIPT)
+        self._acquire = self._redis.register_script(self.ACQUIRE_SCRIPT)
+        self._release = self._redis.register_script(self.RELEASE_SCRIPT)
+        self._prefix = prefix
+
+    def take(self, buckets):
+        keys = [self._prefix + key for key, _, _, _ in buckets]
+        args = [value for _, cost, capacity, rate in buckets for value in (capacity, rate, cost)]
+        return float(self._take(keys=keys, args=args))
+
+    def acquire(self, key, limit):
+        return bool(self._acquire(keys=[self._prefix + key], args=[limit, self.SLOT_TTL]))
+
+    def release(self, key):
+        self._release(keys=[self._prefix + key])
+
+
+class RateLimiter:
+    """
+    Admission control for anonymous uploads.
+
+    Each limit is a token bucket refilled continuously over a minute, keyed
+    by client IP or folder, for both request count and uploaded bytes. A
+    separate cap bounds the number of anonymous uploads in flight so they
+    cannot occupy every worker. Rejections abort with 429 and Retry-After.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_STORAGE_URL', '')
+        app.config.setdefault('UPLOAD_RATE_IP_REQUESTS', 0)
+        app.config.setdefault('UPLOAD_RATE_IP_BYTES', 0)
+        app.config.setdefault('UPLOAD_RATE_FOLDER_REQUESTS', 0)
+        app.config.setdefault('UPLOAD_RATE_FOLDER_BYTES', 0)
+        app.config.setdefault('UPLOAD_MAX_CONCURRENT', 0)
+
+        url = app.config['RATELIMIT_STORAGE_URL']
+        self.backend = RedisBackend(url) if url else MemoryBackend()
+        self.config = app.config
+        app.extensions['ratelimiter'] = self
+
+    def _check_buckets(self, *limits):
+        """Charge every (key, per_minute, cost) limit that is enabled, or none of them"""
+        buckets = []
+        for key, per_minute, cost in limits:
+            if per_minute:
+                capacity = float(per_minute)
+                # A single request larger than the bucket may still pass on a full bucket
+                buckets.append((key, min(float(cost), capacity), capacity, capacity / 60.0))
+        if not buckets:
+            return
+        retry_after = self.backend.take(buckets)
+        if retry_after > 0:
+            abort(429, retry_after=math.ceil(retry_after))
+
+    def check_request(self, ip, folder_id):
+        """Count one request against the per-IP and per-folder request buckets"""
+        self._check_buckets(
+            (f'ip:{ip}:requests', self.config['UPLOAD_RATE_IP_REQUESTS'], 1),
+            (f'folder:{folder_id}:requests', self.config['UPLOAD_RATE_FOLDER_REQUESTS'], 1),
+        )
+
+    def check_bytes(self, ip, folder_id, size):
+        """Count an upload body against the per-IP and per-folder byte buckets"""
+        self._check_buckets(
+            (f'ip:{ip}:bytes', self.config['UPLOAD_RATE_IP_BYTES'], size),
+            (f'folder:{folder_id}:bytes', self.config['UPLOAD_RATE_FOLDER_BYTES'], size),
+        )
+
+    @contextmanager
+    def upload_slot(self):
+        """Hold one of UPLOAD_MAX_CONCURRENT anonymous upload slots"""
+        limit = self.config['UPLOAD_MAX_CONCURRENT']
+        if not limit:
+            yield
+            return
+        if not self.backend.acquire('uploads:active', limit):
+            abort(429, retry_after=1)
+        try:
+            yield
+        finally:
+            self.backend.release('uploads:active')
+
+
+limiter = RateLimiter()
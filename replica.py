@@ -0,0 +1,134 @@
+import itertools
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, select, literal
+from sqlalchemy.sql.dml import UpdateBase
+
+# Session cookie key holding the time until which this user reads from the primary
+STICKY_KEY = '_db_primary_until'
+
+
+def replica_safe(view):
+    """Mark a GET view whose queries may be served by a read replica"""
+    view.replica_safe = True
+    return view
+
+
+class RoutingSession(Session):
+    """
+    Session that sends reads to the replica chosen for the current request
+    and everything else (flushes, bulk UPDATE/DELETE, INSERTs) to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not isinstance(clause, UpdateBase)
+                and has_request_context() and g.get('db_replica')):
+            return self._db.engines[g.db_replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _mark_write():
+    if has_request_context():
+        g.db_wrote = True
+        # Any later reads in this request must see the write
+        g.db_replica = None
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    _mark_write()
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _on_execute(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        _mark_write()
+
+
+class ReplicaRouter:
+    """
+    Route replica_safe GET requests to a healthy read replica.
+
+    Replicas come from SQLALCHEMY_REPLICA_URLS and are registered as
+    Flask-SQLAlchemy binds. After a request that writes, the user's session
+    sticks to the primary for REPLICA_STICKY_SECONDS so they read their own
+    writes. Replicas that fail a health check are skipped for
+    REPLICA_RETRY_SECONDS; with none healthy, reads go to the primary.
+    """
+
+    def __init__(self, app=None):
+        self.keys = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Register replica binds; must run before db.init_app(app)"""
+        app.config.setdefault('SQLALCHEMY_REPLICA_URLS', [])
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 5)
+        app.config.setdefault('REPLICA_HEALTH_CHECK_INTERVAL', 10)
+        app.config.setdefault('REPLICA_RETRY_SECONDS', 30)
+
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        self.keys = []
+        for index, url in enumerate(app.config['SQLALCHEMY_REPLICA_URLS']):
+            key = f'replica_{index}'
+            binds[key] = url
+            self.keys.append(key)
+
+        self.config = app.config
+        self._round_robin = itertools.count()
+        self._lock = threading.Lock()
+        self._checked_at = {}
+        self._down_until = {}
+
+        app.before_request(self._choose_bind)
+        app.after_request(self._stick_to_primary)
+        app.extensions['replica_router'] = self
+
+    def _is_healthy(self, key, engines):
+        now = time.monotonic()
+        with self._lock:
+            if self._down_until.get(key, 0) > now:
+                return False
+            if now - self._checked_at.get(key, -float('inf')) < self.config['REPLICA_HEALTH_CHECK_INTERVAL']:
+                return True
+            self._checked_at[key] = now
+
+        try:
+            with engines[key].connect() as connection:
+                connection.execute(select(literal(1)))
+        except Exception:
+            with self._lock:
+                self._down_until[key] = now + self.config['REPLICA_RETRY_SECONDS']
+            return False
+        return True
+
+    def pick_replica(self, engines):
+        """Return the bind key of the next healthy replica, or None for the primary"""
+        for _ in range(len(self.keys)):
+            key = self.keys[next(self._round_robin) % len(self.keys)]
+            if self._is_healthy(key, engines):
+                return key
+        return None
+
+    def _choose_bind(self):
+        g.db_replica = None
+        if not self.keys or request.method not in ('GET', 'HEAD'):
+            return
+        view = current_app.view_functions.get(request.endpoint)
+        if not getattr(view, 'replica_safe', False):
+            return
+        if session.get(STICKY_KEY, 0) > time.time():
+            return
+        g.db_replica = self.pick_replica(current_app.extensions['sqlalchemy'].engines)
+
+    def _stick_to_primary(self, response):
+        if g.get('db_wrote'):
+            session[STICKY_KEY] = time.time() + self.config['REPLICA_STICKY_SECONDS']
+        return response
+
+
+replicas = ReplicaRouter()
@@ -1,13 +1,34 @@
-from flask import render_template, url_for, flash, redirect, request, abort, jsonify, send_file
+from flask import render_template, url_for, flash, redirect, request, abort, jsonify, send_file, make_response, Response
 from flask_login import login_user, current_user, logout_user, login_required
 from werkzeug.utils import secure_filename
 import os
 import uuid
 import json
+import mimetypes
+import posixpath
 from datetime import datetime
+from urllib.parse import quote
 
 # Import models (db and models will be imported when function is called)
-from models import db, User, Note, Folder, File, SharedNote, SharedFolder
+from models import (db, User, Note, Folder, File, SharedNote, SharedFolder, Group, GroupMembership,
+                    NoteAccess, FolderAccess)
+from listing import paginate_files, parse_page_size, FILE_SORT_COLUMNS
+from ratelimit import limiter
+from replica import replica_safe
+from autosave import apply_patches, PatchError
+import autosave
+from importer import import_archive, ArchiveError
+from archives import archive_type, list_archive, page_entries, get_entry, stream_member
+from text_preview import is_text_file, text_page, parse_page_bytes
+from file_search import search_files
+from markdown_render import render_cache
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+import acl
+import deletion
+import sync
+from storage import QuotaExceeded, upload_size, record_upload, record_file_removed
 
 # Helper functions
 def allowed_file(filename):
@@ -21,10 +42,38 @@ def generate_unique_filename(filename):
     unique_name = f"{name}_{uuid.uuid4().hex[:8]}{ext}"
     return unique_name
 
+def can_view_folder(folder):
+    """Check whether the current user may view a folder and its files"""
+    if folder.is_public:
+        return True
+    if not current_user.is_authenticated:
+        return False
+    if folder.user_id == current_user.id:
+        return True
+    # Shared directly or through a group
+    return acl.has_folder_access(current_user.id, folder.id)
+
+def groups_for_user(user_id):
+    """Groups a user owns or belongs to, i.e. the groups they may share with"""
+    member_of = db.session.query(GroupMembership.group_id).filter(GroupMembership.user_id == user_id)
+    return Group.query.filter(or_(Group.owner_id == user_id, Group.id.in_(member_of))).order_by(Group.name).all()
+
+def file_listing_args():
+    """Read folder listing sort/filter/pagination options from the query string"""
+    return {
+        'sort': request.args.get('sort', 'date'),
+        'order': request.args.get('order', 'desc'),
+        'q': request.args.get('q', '').strip(),
+        'file_type': request.args.get('type', '').strip(),
+        'cursor': request.args.get('cursor'),
+        'limit': parse_page_size(request.args.get('limit')),
+    }
+
 def register_routes(app):
     """Register all routes with the Flask app instance"""
     
     @app.route('/')
+    @replica_safe
     def index():
         # Show public notes and folders on the home page
         public_notes = Note.query.filter_by(is_public=True).order_by(Note.created_at.desc()).limit(10).all()
@@ -90,14 +139,17 @@ def register_routes(app):
 
     @app.route('/dashboard')
     @login_required
+    @replica_safe
     def dashboard():
         # Get user's notes and folders
         user_notes = Note.query.filter_by(user_id=current_user.id).order_by(Note.updated_at.desc()).all()
         user_folders = Folder.query.filter_by(user_id=current_user.id).order_by(Folder.created_at.desc()).all()
         
         # Get shared notes and folders
-        shared_notes = db.session.query(Note).join(SharedNote).filter(SharedNote.shared_with_user_id == current_user.id).all()
-        shared_folders = db.session.query(Folder).join(SharedFolder).filter(SharedFolder.shared_with_user_id == current_user.id).all()
+        shared_notes = Note.query.join(NoteAccess, NoteAccess.note_id == Note.id).filter(
+            NoteAccess.user_id == current_user.id, Note.user_id != current_user.id).all()
+        shared_folders = Folder.query.join(FolderAccess, FolderAccess.folder_id == Folder.id).filter(
+            FolderAccess.user_id == current_user.id, Folder.user_id != current_user.id).all()
         
         return render_template('dashboard.html', 
                              user_notes=user_notes, 
@@ -116,6 +168,8 @@ def register_routes(app):
             
             note = Note(title=title, content=content, user_id=current_user.id, is_public=is_public)
             db.session.add(note)
+            db.session.flush()
+            sync.notes_changed([note.id])
             db.session.commit()
             
             flash('Note created successfully!', 'success')
@@ -124,6 +178,7 @@ def register_routes(app):
         return render_template('create_note.html')
 
     @app.route('/note/<int:note_id>')
+    @replica_safe
     def view_note(note_id):
         note = Note.query.get_or_404(note_id)
         
@@ -132,12 +187,12 @@ def register_routes(app):
             if not current_user.is_authenticated:
                 abort(403)
             if note.user_id != current_user.id:
-                # Check if note is shared with current user
-                shared = SharedNote.query.filter_by(note_id=note_id, shared_with_user_id=current_user.id).first()
-                if not shared:
+                # Check if note is shared with current user, directly or via a group
+                if not acl.has_note_access(current_user.id, note_id):
                     abort(403)
         
-        return render_template('view_note.html', note=note)
+        content_html = render_cache.get_or_render(note.content)
+        return render_template('view_note.html', note=note, content_html=content_html)
 
     @app.route('/edit_note/<int:note_id>', methods=['GET', 'POST'])
     @login_required
@@ -148,17 +203,110 @@ def register_routes(app):
         if note.user_id != current_user.id:
             abort(403)
         
+        def conflict(note):
+            # Show the latest version's number with the user's unsaved text
+            flash('This note was changed elsewhere since you opened it. Your text is below; '
+                  'saving again will replace the newer version.', 'danger')
+            seq = autosave.pending(note)[2]
+            return render_template('edit_note.html', note=note, draft=request.form, seq=seq), 409
+        
+        title, content, seq, _ = autosave.pending(note)
         if request.method == 'POST':
+            # The form carries the version and buffered autosave it was loaded at (kept current by autosave)
+            if (request.form.get('version', type=int) != note.version
+                    or request.form.get('seq', 0, type=int) != seq):
+                return conflict(note)
+            
+            # The form holds the full text, so buffered autosaves are superseded
+            autosave.clear(note)
             note.title = request.form['title']
             note.content = request.form['content']
             note.is_public = 'is_public' in request.form
             note.updated_at = datetime.utcnow()
-            db.session.commit()
+            try:
+                sync.notes_changed([note.id])
+                db.session.commit()
+            except StaleDataError:
+                db.session.rollback()
+                return conflict(db.session.get(Note, note_id))
             
             flash('Note updated successfully!', 'success')
             return redirect(url_for('view_note', note_id=note.id))
         
-        return render_template('edit_note.html', note=note)
+        return render_template('edit_note.html', note=note, autosaved={'title': title, 'content': content},
+                               seq=seq)
+
+    @app.route('/api/notes/<int:note_id>/autosave', methods=['POST'])
+    @login_required
+    def autosave_note(note_id):
+        note = Note.query.get_or_404(note_id)
+        
+        # Check if user owns the note
+        if note.user_id != current_user.id:
+            abort(403)
+        
+        data = request.get_json(silent=True)
+        if data is None:
+            data = {}
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Expected a JSON object.'}), 400
+        
+        def conflict(note):
+            title, content, seq, _ = autosave.pending(note)
+            return jsonify({
+                'error': 'Note was modified elsewhere.',
+                'version': note.version,
+                'seq': seq,
+                'title': title,
+                'content': content,
+            }), 409
+        
+        version = data.get('version')
+        if not isinstance(version, int) or isinstance(version, bool):
+            return jsonify({'error': 'version must be an integer.'}), 400
+        seq = data.get('seq', 0)
+        if not isinstance(seq, int) or isinstance(seq, bool) or seq < 0:
+            return jsonify({'error': 'seq must be a non-negative integer.'}), 400
+        if 'title' in data and (not isinstance(data['title'], str) or len(data['title']) > 200):
+            return jsonify({'error': 'title must be a string of at most 200 characters.'}), 400
+        flush = data.get('flush', False)
+        if not isinstance(flush, bool):
+            return jsonify({'error': 'flush must be a boolean.'}), 400
+        
+        # Saves build on the stored note plus the autosaves buffered since
+        saved_title, saved_content, saved_seq, started_at = autosave.pending(note)
+        if version != note.version or seq != saved_seq:
+            return conflict(note)
+        
+        patches = data.get('patches', [])
+        try:
+            content = apply_patches(saved_content, patches)
+        except PatchError as e:
+            return jsonify({'error': str(e)}), 400
+        title = data.get('title', saved_title)
+        
+        # Buffer the save, or fold everything into the note once the coalescing
+        # window has passed or the editor is leaving the page
+        changed = content != saved_content or title != saved_title
+        due = flush or autosave.is_due(started_at, app.config['AUTOSAVE_COALESCE_SECONDS'])
+        if changed and not due:
+            seq += 1
+            autosave.buffer_save(note, seq, title if title != saved_title else None, patches)
+        elif due and (changed or seq):
+            autosave.fold(note, title, content)
+            seq = 0
+        else:
+            # Skip no-op saves: nothing is written and the version stays put
+            return jsonify({'version': note.version, 'seq': seq, 'saved': False})
+        
+        try:
+            db.session.commit()
+        except (StaleDataError, IntegrityError):
+            # Another request committed between our read and write
+            db.session.rollback()
+            return conflict(db.session.get(Note, note_id))
+        
+        return jsonify({'version': note.version, 'seq': seq, 'saved': True})
 
     @app.route('/delete_note/<int:note_id>', methods=['POST'])
     @login_required
@@ -169,7 +317,7 @@ def register_routes(app):
         if note.user_id != current_user.id:
             abort(403)
         
-        db.session.delete(note)
+        deletion.delete_note(note)
         db.session.commit()
         
         flash('Note deleted successfully!', 'success')
@@ -184,33 +332,84 @@ def register_routes(app):
         if note.user_id != current_user.id:
             abort(403)
         
+        groups = groups_for_user(current_user.id)
+        
         if request.method == 'POST':
-            username = request.form['username']
-            user_to_share = User.query.filter_by(username=username).first()
-            
-            if not user_to_share:
-                flash('User not found.', 'danger')
-                return render_template('share_note.html', note=note)
-            
-            if user_to_share.id == current_user.id:
-                flash('You cannot share a note with yourself.', 'warning')
-                return render_template('share_note.html', note=note)
+            username = request.form.get('username', '').strip()
+            group_name = request.form.get('group', '').strip()
             
-            # Check if already shared
-            existing_share = SharedNote.query.filter_by(note_id=note_id, shared_with_user_id=user_to_share.id).first()
-            if existing_share:
-                flash(f'Note is already shared with {username}.', 'warning')
-                return render_template('share_note.html', note=note)
+            if group_name:
+                group = Group.query.filter_by(name=group_name).first()
+                if not group or group.id not in {g.id for g in groups}:
+                    flash('Group not found.', 'danger')
+                    return render_template('share_note.html', note=note, groups=groups)
+                
+                # Check if already shared
+                existing_share = SharedNote.query.filter_by(note_id=note_id, shared_with_group_id=group.id).first()
+                if existing_share:
+                    flash(f'Note is already shared with group {group_name}.', 'warning')
+                    return render_template('share_note.html', note=note, groups=groups)
+                
+                shared_note = SharedNote(note_id=note_id, shared_with_group_id=group.id, shared_by_user_id=current_user.id)
+                target = f'group {group_name}'
+            else:
+                user_to_share = User.query.filter_by(username=username).first()
+                
+                if not user_to_share:
+                    flash('User not found.', 'danger')
+                    return render_template('share_note.html', note=note, groups=groups)
+                
+                if user_to_share.id == current_user.id:
+                    flash('You cannot share a note with yourself.', 'warning')
+                    return render_template('share_note.html', note=note, groups=groups)
+                
+                # Check if already shared
+                existing_share = SharedNote.query.filter_by(note_id=note_id, shared_with_user_id=user_to_share.id).first()
+                if existing_share:
+                    flash(f'Note is already shared with {username}.', 'warning')
+                    return render_template('share_note.html', note=note, groups=groups)
+                
+                shared_note = SharedNote(note_id=note_id, shared_with_user_id=user_to_share.id, shared_by_user_id=current_user.id)
+                target = username
             
-            # Create share
-            shared_note = SharedNote(note_id=note_id, shared_with_user_id=user_to_share.id, shared_by_user_id=current_user.id)
+            # Create share and materialize the access it grants
             db.session.add(shared_note)
+            db.session.flush()
+            acl.share_added(shared_note)
+            sync.share_changed(shared_note)
             db.session.commit()
             
-            flash(f'Note shared with {username} successfully!', 'success')
+            flash(f'Note shared with {target} successfully!', 'success')
             return redirect(url_for('view_note', note_id=note.id))
         
-        return render_template('share_note.html', note=note)
+        return render_template('share_note.html', note=note, groups=groups)
+
+    @app.route('/import', methods=['GET', 'POST'])
+    @login_required
+    def import_notes():
+        if request.method == 'POST':
+            archive = request.files.get('archive')
+            if not archive or not archive.filename:
+                flash('No archive selected.', 'danger')
+                return redirect(request.url)
+            
+            try:
+                stats = import_archive(archive.stream, archive.filename, current_user,
+                                       app.config['UPLOAD_FOLDER'])
+            except ArchiveError as e:
+                flash(str(e), 'danger')
+                if e.stats and (e.stats['notes'] or e.stats['files']):
+                    flash(f"Imported {e.stats['notes']} notes and {e.stats['files']} files "
+                          f"before the error.", 'warning')
+                return redirect(request.url)
+            
+            flash(f"Imported {stats['notes']} notes and {stats['files']} files "
+                  f"into {stats['folders']} folders.", 'success')
+            if stats['error_count']:
+                flash(f"{stats['error_count']} entries could not be imported.", 'warning')
+            return render_template('import.html', stats=stats)
+        
+        return render_template('import.html', stats=None)
 
     # Folder routes
     @app.route('/create_folder', methods=['GET', 'POST'])
@@ -225,6 +424,8 @@ def register_routes(app):
             folder = Folder(name=name, description=description, user_id=current_user.id, 
                            is_public=is_public, allow_file_drop=allow_file_drop)
             db.session.add(folder)
+            db.session.flush()
+            sync.folders_changed([folder.id])
             db.session.commit()
             
             flash('Folder created successfully!', 'success')
@@ -233,21 +434,76 @@ def register_routes(app):
         return render_template('create_folder.html')
 
     @app.route('/folder/<int:folder_id>')
+    @replica_safe
     def view_folder(folder_id):
         folder = Folder.query.get_or_404(folder_id)
         
         # Check permissions
-        if not folder.is_public:
-            if not current_user.is_authenticated:
-                abort(403)
-            if folder.user_id != current_user.id:
-                # Check if folder is shared with current user
-                shared = SharedFolder.query.filter_by(folder_id=folder_id, shared_with_user_id=current_user.id).first()
-                if not shared:
-                    abort(403)
+        if not can_view_folder(folder):
+            abort(403)
+        
+        listing = file_listing_args()
+        files, next_cursor = paginate_files(folder_id, **listing)
+        return render_template('view_folder.html', folder=folder, files=files,
+                             next_cursor=next_cursor, listing=listing,
+                             sort_options=FILE_SORT_COLUMNS.keys(), archive_type=archive_type,
+                             is_text_file=is_text_file)
+
+    def save_uploaded_files(folder):
+        """Store the files posted to upload_file and redirect back to the folder"""
+        if 'files[]' not in request.files:
+            flash('No files selected.', 'danger')
+            return redirect(request.url)
+        
+        files = request.files.getlist('files[]')
+        uploaded_files = []
+        
+        for file in files:
+            if file and file.filename:
+                if allowed_file(file.filename):
+                    # Charge the quotas before anything is written to disk
+                    file_size = upload_size(file)
+                    try:
+                        record_upload(folder, file_size)
+                    except QuotaExceeded as e:
+                        flash(f'{e} Skipped: {file.filename}', 'danger')
+                        continue
+        
+                    # Generate unique filename
+                    original_filename = secure_filename(file.filename)
+                    unique_filename = generate_unique_filename(original_filename)
+                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+        
+                    # Save file
+                    file.save(filepath)
+        
+                    # Create database record
+                    uploaded_by = current_user.username if current_user.is_authenticated else 'anonymous'
+                    uploaded_by_user_id = current_user.id if current_user.is_authenticated else None
+        
+                    db_file = File(
+                        filename=unique_filename,
+                        original_filename=original_filename,
+                        filepath=filepath,
+                        file_size=file_size,
+                        file_type=file.content_type,
+                        folder_id=folder.id,
+                        uploaded_by=uploaded_by,
+                        uploaded_by_user_id=uploaded_by_user_id
+                    )
+                    db.session.add(db_file)
+                    uploaded_files.append(db_file)
+                else:
+                    flash(f'File type not allowed: {file.filename}', 'warning')
+        
+        if uploaded_files:
+            db.session.flush()
+            sync.files_changed([db_file.id for db_file in uploaded_files])
+            db.session.commit()
+            names = ', '.join(db_file.original_filename for db_file in uploaded_files)
+            flash(f'Successfully uploaded: {names}', 'success')
         
-        files = File.query.filter_by(folder_id=folder_id).order_by(File.uploaded_at.desc()).all()
-        return render_template('view_folder.html', folder=folder, files=files)
+        return redirect(url_for('view_folder', folder_id=folder.id))
 
     @app.route('/upload_file/<int:folder_id>', methods=['GET', 'POST'])
     def upload_file(folder_id):
@@ -261,77 +517,132 @@ def register_routes(app):
             can_upload = True
         elif current_user.is_authenticated:
             # Check if folder is shared with current user
-            shared = SharedFolder.query.filter_by(folder_id=folder_id, shared_with_user_id=current_user.id).first()
-            if shared:
+            if acl.has_folder_access(current_user.id, folder_id):
                 can_upload = True
         
         if not can_upload:
             abort(403)
         
+        anonymous = not current_user.is_authenticated
+        if anonymous:
+            limiter.check_request(request.remote_addr, folder_id)
+        
         if request.method == 'POST':
-            if 'files[]' not in request.files:
-                flash('No files selected.', 'danger')
-                return redirect(request.url)
-            
-            files = request.files.getlist('files[]')
-            uploaded_files = []
-            
-            for file in files:
-                if file and file.filename:
-                    if allowed_file(file.filename):
-                        # Generate unique filename
-                        original_filename = secure_filename(file.filename)
-                        unique_filename = generate_unique_filename(original_filename)
-                        filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-                        
-                        # Save file
-                        file.save(filepath)
-                        file_size = os.path.getsize(filepath)
-                        
-                        # Create database record
-                        uploaded_by = current_user.username if current_user.is_authenticated else 'anonymous'
-                        uploaded_by_user_id = current_user.id if current_user.is_authenticated else None
-                        
-                        db_file = File(
-                            filename=unique_filename,
-                            original_filename=original_filename,
-                            filepath=filepath,
-                            file_size=file_size,
-                            file_type=file.content_type,
-                            folder_id=folder_id,
-                            uploaded_by=uploaded_by,
-                            uploaded_by_user_id=uploaded_by_user_id
-                        )
-                        db.session.add(db_file)
-                        uploaded_files.append(original_filename)
-                    else:
-                        flash(f'File type not allowed: {file.filename}', 'warning')
-            
-            if uploaded_files:
-                db.session.commit()
-                flash(f'Successfully uploaded: {", ".join(uploaded_files)}', 'success')
-            
-            return redirect(url_for('view_folder', folder_id=folder_id))
+            if anonymous:
+                # Admission control runs before the request body is parsed
+                limiter.check_bytes(request.remote_addr, folder_id, request.content_length or 0)
+                with limiter.upload_slot():
+                    return save_uploaded_files(folder)
+            return save_uploaded_files(folder)
         
         return render_template('upload_file.html', folder=folder)
 
     @app.route('/download_file/<int:file_id>')
     def download_file(file_id):
         file = File.query.get_or_404(file_id)
-        folder = file.folder
         
         # Check permissions
-        if not folder.is_public:
-            if not current_user.is_authenticated:
-                abort(403)
-            if folder.user_id != current_user.id:
-                # Check if folder is shared with current user
-                shared = SharedFolder.query.filter_by(folder_id=folder.id, shared_with_user_id=current_user.id).first()
-                if not shared:
-                    abort(403)
+        if not can_view_folder(file.folder):
+            abort(403)
         
         return send_file(file.filepath, as_attachment=True, download_name=file.original_filename)
 
+    def viewable_text_file(file_id):
+        """Load a file for the text viewer with the same checks as download_file"""
+        file = File.query.get_or_404(file_id)
+        if not can_view_folder(file.folder):
+            abort(403)
+        if not is_text_file(file):
+            abort(404)
+        return file
+
+    def text_page_args():
+        """Read the text viewer window position (offset, before or line) from the query string"""
+        return {
+            'offset': request.args.get('offset', type=int),
+            'before': request.args.get('before', type=int),
+            'line': request.args.get('line', type=int),
+            'size': parse_page_bytes(request.args.get('size')),
+        }
+
+    @app.route('/file/<int:file_id>/view')
+    def view_text_file(file_id):
+        file = viewable_text_file(file_id)
+        page = text_page(file, **text_page_args())
+        return render_template('view_text_file.html', file=file, page=page)
+
+    @app.route('/api/file/<int:file_id>/text')
+    def api_file_text(file_id):
+        file = viewable_text_file(file_id)
+        return jsonify(text_page(file, **text_page_args()))
+
+    def viewable_archive(file_id):
+        """Load a file for the archive views with the same checks as download_file"""
+        file = File.query.get_or_404(file_id)
+        if not can_view_folder(file.folder):
+            abort(403)
+        if not archive_type(file.original_filename):
+            abort(404)
+        return file
+
+    @app.route('/file/<int:file_id>/archive')
+    def view_archive(file_id):
+        file = viewable_archive(file_id)
+        
+        try:
+            total = list_archive(file)
+        except ArchiveError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('view_folder', folder_id=file.folder_id))
+        
+        cursor = request.args.get('cursor')
+        page, next_cursor = page_entries(file, cursor, parse_page_size(request.args.get('limit')))
+        return render_template('view_archive.html', file=file, entries=page, total=total,
+                             cursor=cursor, next_cursor=next_cursor)
+
+    @app.route('/api/file/<int:file_id>/archive')
+    def api_archive_entries(file_id):
+        file = viewable_archive(file_id)
+        
+        try:
+            total = list_archive(file)
+        except ArchiveError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        page, next_cursor = page_entries(file, request.args.get('cursor'),
+                                         parse_page_size(request.args.get('limit')))
+        return jsonify({
+            'entries': [{
+                'index': entry.position,
+                'name': entry.name,
+                'size': entry.size,
+                'modified': entry.modified.isoformat() if entry.modified else None,
+                'download_url': url_for('download_archive_member', file_id=file.id, index=entry.position),
+            } for entry in page],
+            'total': total,
+            'next_cursor': next_cursor,
+        })
+
+    @app.route('/file/<int:file_id>/archive/<int:index>')
+    def download_archive_member(file_id, index):
+        file = viewable_archive(file_id)
+        
+        try:
+            list_archive(file)
+        except ArchiveError:
+            abort(404)
+        entry = get_entry(file, index)
+        if entry is None:
+            abort(404)
+        
+        # Stream just this member out of the stored archive
+        name = posixpath.basename(entry.name) or 'file'
+        response = Response(stream_member(file, entry),
+                            mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+        response.headers['Content-Length'] = str(entry.size)
+        response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(name)}"
+        return response
+
     @app.route('/delete_file/<int:file_id>', methods=['POST'])
     @login_required
     def delete_file(file_id):
@@ -347,6 +658,8 @@ def register_routes(app):
             os.remove(file.filepath)
         
         # Delete from database
+        record_file_removed(file)
+        sync.files_changed([file.id], deleted=True)
         db.session.delete(file)
         db.session.commit()
         
@@ -362,33 +675,57 @@ def register_routes(app):
         if folder.user_id != current_user.id:
             abort(403)
         
+        groups = groups_for_user(current_user.id)
+        
         if request.method == 'POST':
-            username = request.form['username']
-            user_to_share = User.query.filter_by(username=username).first()
+            username = request.form.get('username', '').strip()
+            group_name = request.form.get('group', '').strip()
             
-            if not user_to_share:
-                flash('User not found.', 'danger')
-                return render_template('share_folder.html', folder=folder)
-            
-            if user_to_share.id == current_user.id:
-                flash('You cannot share a folder with yourself.', 'warning')
-                return render_template('share_folder.html', folder=folder)
-            
-            # Check if already shared
-            existing_share = SharedFolder.query.filter_by(folder_id=folder_id, shared_with_user_id=user_to_share.id).first()
-            if existing_share:
-                flash(f'Folder is already shared with {username}.', 'warning')
-                return render_template('share_folder.html', folder=folder)
+            if group_name:
+                group = Group.query.filter_by(name=group_name).first()
+                if not group or group.id not in {g.id for g in groups}:
+                    flash('Group not found.', 'danger')
+                    return render_template('share_folder.html', folder=folder, groups=groups)
+                
+                # Check if already shared
+                existing_share = SharedFolder.query.filter_by(folder_id=folder_id, shared_with_group_id=group.id).first()
+                if existing_share:
+                    flash(f'Folder is already shared with group {group_name}.', 'warning')
+                    return render_template('share_folder.html', folder=folder, groups=groups)
+                
+                shared_folder = SharedFolder(folder_id=folder_id, shared_with_group_id=group.id, shared_by_user_id=current_user.id)
+                target = f'group {group_name}'
+            else:
+                user_to_share = User.query.filter_by(username=username).first()
+                
+                if not user_to_share:
+                    flash('User not found.', 'danger')
+                    return render_template('share_folder.html', folder=folder, groups=groups)
+                
+                if user_to_share.id == current_user.id:
+                    flash('You cannot share a folder with yourself.', 'warning')
+                    return render_template('share_folder.html', folder=folder, groups=groups)
+                
+                # Check if already shared
+                existing_share = SharedFolder.query.filter_by(folder_id=folder_id, shared_with_user_id=user_to_share.id).first()
+                if existing_share:
+                    flash(f'Folder is already shared with {username}.', 'warning')
+                    return render_template('share_folder.html', folder=folder, groups=groups)
+                
+                shared_folder = SharedFolder(folder_id=folder_id, shared_with_user_id=user_to_share.id, shared_by_user_id=current_user.id)
+                target = username
             
-            # Create share
-            shared_folder = SharedFolder(folder_id=folder_id, shared_with_user_id=user_to_share.id, shared_by_user_id=current_user.id)
+            # Create share and materialize the access it grants
             db.session.add(shared_folder)
+            db.session.flush()
+            acl.share_added(shared_folder)
+            sync.share_changed(shared_folder)
             db.session.commit()
             
-            flash(f'Folder shared with {username} successfully!', 'success')
+            flash(f'Folder shared with {target} successfully!', 'success')
             return redirect(url_for('view_folder', folder_id=folder.id))
         
-        return render_template('share_folder.html', folder=folder)
+        return render_template('share_folder.html', folder=folder, groups=groups)
 
     @app.route('/delete_folder/<int:folder_id>', methods=['POST'])
     @login_required
@@ -399,18 +736,105 @@ def register_routes(app):
         if folder.user_id != current_user.id:
             abort(403)
         
-        # Delete all files in the folder from filesystem
-        for file in folder.files:
-            if os.path.exists(file.filepath):
-                os.remove(file.filepath)
-        
-        # Delete folder from database (cascade will handle files and shares)
-        db.session.delete(folder)
+        # Delete the stored files, then the folder (the database cascades to files and shares)
+        deletion.delete_folder(folder)
         db.session.commit()
         
         flash('Folder and all its contents deleted successfully!', 'success')
         return redirect(url_for('dashboard'))
 
+    # Group routes
+    @app.route('/groups', methods=['GET', 'POST'])
+    @login_required
+    def groups():
+        if request.method == 'POST':
+            name = request.form['name'].strip()
+            
+            if not name:
+                flash('Group name is required.', 'danger')
+            elif Group.query.filter_by(name=name).first():
+                flash('A group with that name already exists.', 'danger')
+            else:
+                group = Group(name=name, owner_id=current_user.id)
+                db.session.add(group)
+                db.session.flush()
+                # The owner is always a member of their group
+                db.session.add(GroupMembership(group_id=group.id, user_id=current_user.id))
+                db.session.commit()
+                flash(f'Group {name} created successfully!', 'success')
+                return redirect(url_for('view_group', group_id=group.id))
+        
+        return render_template('groups.html', groups=groups_for_user(current_user.id))
+
+    @app.route('/group/<int:group_id>', methods=['GET', 'POST'])
+    @login_required
+    def view_group(group_id):
+        group = Group.query.get_or_404(group_id)
+        is_member = GroupMembership.query.filter_by(group_id=group_id, user_id=current_user.id).first()
+        
+        # Only the owner and members may see a group
+        if group.owner_id != current_user.id and not is_member:
+            abort(403)
+        
+        if request.method == 'POST':
+            if group.owner_id != current_user.id:
+                abort(403)
+            
+            username = request.form['username']
+            user_to_add = User.query.filter_by(username=username).first()
+            
+            if not user_to_add:
+                flash('User not found.', 'danger')
+            elif GroupMembership.query.filter_by(group_id=group_id, user_id=user_to_add.id).first():
+                flash(f'{username} is already a member.', 'warning')
+            else:
+                db.session.add(GroupMembership(group_id=group_id, user_id=user_to_add.id))
+                acl.member_added(group_id, user_to_add.id)
+                db.session.commit()
+                flash(f'{username} added to {group.name}.', 'success')
+            return redirect(url_for('view_group', group_id=group_id))
+        
+        members = User.query.join(GroupMembership, GroupMembership.user_id == User.id).filter(
+            GroupMembership.group_id == group_id).order_by(User.username).all()
+        return render_template('view_group.html', group=group, members=members)
+
+    @app.route('/group/<int:group_id>/remove/<int:user_id>', methods=['POST'])
+    @login_required
+    def remove_group_member(group_id, user_id):
+        group = Group.query.get_or_404(group_id)
+        
+        # Owners manage members; anyone may leave a group themselves
+        if group.owner_id != current_user.id and user_id != current_user.id:
+            abort(403)
+        if user_id == group.owner_id:
+            flash('The group owner cannot be removed.', 'warning')
+            return redirect(url_for('view_group', group_id=group_id))
+        
+        membership = GroupMembership.query.filter_by(group_id=group_id, user_id=user_id).first_or_404()
+        acl.member_removed(group_id, user_id)
+        db.session.delete(membership)
+        db.session.commit()
+        
+        flash('Member removed.', 'success')
+        if user_id == current_user.id:
+            return redirect(url_for('groups'))
+        return redirect(url_for('view_group', group_id=group_id))
+
+    @app.route('/delete_group/<int:group_id>', methods=['POST'])
+    @login_required
+    def delete_group(group_id):
+        group = Group.query.get_or_404(group_id)
+        
+        # Check if user owns the group
+        if group.owner_id != current_user.id:
+            abort(403)
+        
+        deletion.delete_group(group)
+        db.session.commit()
+        
+        flash('Group deleted successfully!', 'success')
+        return redirect(url_for('groups'))
+
     # Public file drop route
     @app.route('/public_drop/<int:folder_id>')
     def public_drop(folder_id):
@@ -420,11 +844,34 @@ def register_routes(app):
         if not (folder.is_public and folder.allow_file_drop):
             abort(404)
         
+        if not current_user.is_authenticated:
+            limiter.check_request(request.remote_addr, folder_id)
+        
         return render_template('public_drop.html', folder=folder)
 
+    def file_search_args():
+        # Search text, page size and an optional folder the search is limited to
+        folder = None
+        folder_id = request.args.get('folder', type=int)
+        if folder_id is not None:
+            folder = Folder.query.get_or_404(folder_id)
+            if not can_view_folder(folder):
+                abort(403)
+        return request.args.get('q', '').strip(), folder, parse_page_size(request.args.get('limit'))
+
+    @app.route('/search')
+    @login_required
+    @replica_safe
+    def search():
+        q, folder, limit = file_search_args()
+        results = search_files(q, current_user.id, folder.id if folder else None, limit) if q else []
+        return render_template('search.html', q=q, folder=folder, results=results,
+                               is_text_file=is_text_file)
+
     # API routes for AJAX functionality
     @app.route('/api/search_users')
     @login_required
+    @replica_safe
     def search_users():
         query = request.args.get('q', '')
         if len(query) < 2:
@@ -437,6 +884,59 @@ def register_routes(app):
         
         return jsonify([{'id': user.id, 'username': user.username} for user in users])
 
+    @app.route('/api/folder/<int:folder_id>/files')
+    @replica_safe
+    def api_folder_files(folder_id):
+        folder = Folder.query.get_or_404(folder_id)
+        
+        if not can_view_folder(folder):
+            abort(403)
+        
+        files, next_cursor = paginate_files(folder_id, **file_listing_args())
+        return jsonify({
+            'files': [{
+                'id': file.id,
+                'name': file.original_filename,
+                'size': file.file_size,
+                'type': file.file_type,
+                'uploaded_by': file.uploaded_by,
+                'uploaded_at': file.uploaded_at.isoformat() if file.uploaded_at else None,
+                'download_url': url_for('download_file', file_id=file.id),
+            } for file in files],
+            'next_cursor': next_cursor,
+        })
+
+    @app.route('/api/sync')
+    @login_required
+    @replica_safe
+    def api_sync():
+        # Changes to the user's notes, folders, files and shares since the cursor
+        try:
+            changes, cursor, has_more = sync.changes_since(current_user.id, request.args.get('cursor'),
+                                                           parse_page_size(request.args.get('limit')))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({'changes': changes, 'cursor': cursor, 'has_more': has_more})
+
+    @app.route('/api/search_files')
+    @login_required
+    @replica_safe
+    def api_search_files():
+        q, folder, limit = file_search_args()
+        if not q:
+            return jsonify({'error': 'Missing search query.'}), 400
+        
+        return jsonify({'results': [{
+            'id': file.id,
+            'name': file.original_filename,
+            'folder_id': file.folder_id,
+            'size': file.file_size,
+            'type': file.file_type,
+            'snippet': str(snippet),
+            'download_url': url_for('download_file', file_id=file.id),
+        } for file, snippet in search_files(q, current_user.id, folder.id if folder else None, limit)]})
+
     # Error handlers
     @app.errorhandler(403)
     def forbidden(error):
@@ -446,6 +946,13 @@ def register_routes(app):
     def not_found(error):
         return render_template('errors/404.html'), 404
 
+    @app.errorhandler(429)
+    def too_many_requests(error):
+        response = make_response(render_template('errors/429.html'), 429)
+        if error.retry_after:
+            response.headers['Retry-After'] = str(error.retry_after)
+        return response
+
     @app.errorhandler(500)
     def internal_error(error):
         db.session.rollback()
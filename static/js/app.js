@@ -53,18 +53,121 @@ function setupDragAndDrop(dropZone, fileInput) {
 }
 
 // Auto-save functionality for notes
+// Sends only the changed span of the content (common prefix/suffix diff)
+// against the last saved state, identified by the note version plus the
+// number of saves the server has buffered on top of it (seq); the server
+// rejects stale states with 409. Buffered saves are written to the note
+// every so often, and straight away (flush) when the page is left.
+// The form's hidden version/seq fields follow each save so a full submit of
+// the form is checked against the latest autosaved state too.
+function diffText(oldText, newText) {
+    let start = 0;
+    const minLength = Math.min(oldText.length, newText.length);
+    while (start < minLength && oldText[start] === newText[start]) {
+        start++;
+    }
+    
+    let oldEnd = oldText.length;
+    let newEnd = newText.length;
+    while (oldEnd > start && newEnd > start && oldText[oldEnd - 1] === newText[newEnd - 1]) {
+        oldEnd--;
+        newEnd--;
+    }
+    
+    if (start === oldEnd && start === newEnd) return [];
+    return [{start: start, end: oldEnd, text: newText.slice(start, newEnd)}];
+}
+
 function setupAutoSave(formId, saveUrl) {
     const form = document.getElementById(formId);
     if (!form) return;
     
+    const titleInput = form.querySelector('[name="title"]');
+    const contentInput = form.querySelector('[name="content"]');
+    const versionInput = form.querySelector('[name="version"]');
+    const seqInput = form.querySelector('[name="seq"]');
+    let version = parseInt(versionInput.value, 10);
+    let seq = parseInt(seqInput.value, 10);
+    let savedTitle = titleInput.value;
+    let savedContent = contentInput.value;
     let saveTimeout;
+    let saving = false;
+    let pending = false;
+    let pendingFlush = false;
+    let stopped = false;
+    
+    function save(flush) {
+        if (stopped) return;
+        // Coalesce: edits made while a save is in flight go out in the next one
+        if (saving) {
+            pending = true;
+            pendingFlush = pendingFlush || flush;
+            return;
+        }
+        
+        const title = titleInput.value;
+        const content = contentInput.value;
+        const patches = diffText(savedContent, content);
+        if (patches.length === 0 && title === savedTitle && !(flush && seq > 0)) return;
+        
+        const body = {version: version, seq: seq, patches: patches};
+        if (title !== savedTitle) body.title = title;
+        if (flush) body.flush = true;
+        
+        saving = true;
+        fetch(saveUrl, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(body),
+            keepalive: !!flush // let the final save outlive the page
+        })
+        .then(response => response.json().then(data => ({status: response.status, data: data})))
+        .then(({status, data}) => {
+            if (status === 200) {
+                version = data.version;
+                seq = data.seq;
+                versionInput.value = version;
+                seqInput.value = seq;
+                savedTitle = title;
+                savedContent = content;
+            } else if (status === 409) {
+                stopped = true;
+                showToast('This note was changed elsewhere. Reload to see the latest version before editing.', 'danger');
+            } else {
+                showToast(data.error || 'Auto-save failed.', 'warning');
+            }
+        })
+        .catch(() => showToast('Auto-save failed. Check your connection.', 'warning'))
+        .finally(() => {
+            saving = false;
+            if (pending) {
+                const flushNext = pendingFlush;
+                pending = false;
+                pendingFlush = false;
+                save(flushNext);
+            }
+        });
+    }
     
     form.addEventListener('input', function() {
         clearTimeout(saveTimeout);
-        saveTimeout = setTimeout(function() {
-            // Auto-save logic here
-            console.log('Auto-saving...');
-        }, 2000); // Save after 2 seconds of inactivity
+        saveTimeout = setTimeout(() => save(false), 2000); // Save after 2 seconds of inactivity
+    });
+    
+    // Submitting the form writes the full text, which supersedes buffered saves
+    form.addEventListener('submit', function() {
+        clearTimeout(saveTimeout);
+        stopped = true;
+    });
+    
+    // Leaving the page writes any buffered saves to the note
+    function flushOnLeave() {
+        clearTimeout(saveTimeout);
+        save(true);
+    }
+    window.addEventListener('pagehide', flushOnLeave);
+    document.addEventListener('visibilitychange', function() {
+        if (document.visibilityState === 'hidden') flushOnLeave();
     });
 }
 
@@ -0,0 +1,121 @@
+import os
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from models import db, User, Folder, File
+
+
+class QuotaExceeded(Exception):
+    """Raised when an upload would push a folder or user past its configured quota"""
+
+
+def upload_size(file_storage):
+    """Return the size in bytes of an uploaded file without reading it into memory"""
+    stream = file_storage.stream
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+
+# (config key, message) of the byte and file quotas applying to each counter row
+_QUOTAS = {
+    Folder: (('FOLDER_QUOTA_BYTES', 'Folder storage quota exceeded.'),
+             ('FOLDER_QUOTA_FILES', 'Folder file limit reached.')),
+    User: (('USER_QUOTA_BYTES', 'Storage quota of the folder owner exceeded.'),
+           ('USER_QUOTA_FILES', 'File limit of the folder owner reached.')),
+}
+
+
+def _charge(model, row_id, delta_bytes, delta_files):
+    """
+    Add to one row's counters only if that keeps it within its quotas, and
+    return the message of the quota that blocked it otherwise. The limits are
+    part of the UPDATE's WHERE clause, so concurrent uploads are serialized
+    on the row and can't all pass a check and overshoot together.
+    """
+    (bytes_key, bytes_message), (files_key, files_message) = _QUOTAS[model]
+    byte_limit = current_app.config.get(bytes_key)
+    file_limit = current_app.config.get(files_key)
+
+    query = model.query.filter(model.id == row_id)
+    if byte_limit:
+        query = query.filter(model.bytes_used + delta_bytes <= byte_limit)
+    if file_limit:
+        query = query.filter(model.file_count + delta_files <= file_limit)
+    if query.update({
+        model.bytes_used: model.bytes_used + delta_bytes,
+        model.file_count: model.file_count + delta_files,
+    }, synchronize_session=False):
+        return None
+
+    used_files = db.session.query(model.file_count).filter(model.id == row_id).scalar() or 0
+    return files_message if file_limit and used_files + delta_files > file_limit else bytes_message
+
+
+def _adjust_usage(folder_id, owner_id, delta_bytes, delta_files):
+    # Relative UPDATEs so concurrent uploads never lose increments
+    Folder.query.filter_by(id=folder_id).update({
+        Folder.bytes_used: Folder.bytes_used + delta_bytes,
+        Folder.file_count: Folder.file_count + delta_files,
+    }, synchronize_session=False)
+    if owner_id is None:
+        return
+    User.query.filter_by(id=owner_id).update({
+        User.bytes_used: User.bytes_used + delta_bytes,
+        User.file_count: User.file_count + delta_files,
+    }, synchronize_session=False)
+
+
+def record_upload(folder, file_size, file_count=1):
+    """
+    Charge files about to be stored to the folder's and its owner's usage
+    counters, or raise QuotaExceeded without charging anything. Call before
+    writing the files and commit with their File rows.
+    """
+    message = _charge(Folder, folder.id, file_size, file_count)
+    if message is None:
+        message = _charge(User, folder.user_id, file_size, file_count)
+        if message is None:
+            return
+        _adjust_usage(folder.id, None, -file_size, -file_count)
+    raise QuotaExceeded(message)
+
+
+def release_upload(folder, file_size, file_count=1):
+    """Undo record_upload for files that could not be written after all"""
+    _adjust_usage(folder.id, folder.user_id, -file_size, -file_count)
+
+
+def record_file_removed(file):
+    """Remove a file from the usage counters; commit with the File deletion"""
+    _adjust_usage(file.folder_id, file.folder.user_id, -file.file_size, -1)
+
+
+def record_folder_removed(folder):
+    """Remove a whole folder's usage from its owner's counters"""
+    User.query.filter_by(id=folder.user_id).update({
+        User.bytes_used: User.bytes_used - folder.bytes_used,
+        User.file_count: User.file_count - folder.file_count,
+    }, synchronize_session=False)
+
+
+def recompute_usage():
+    """
+    Rebuild every folder and user counter from the file table using
+    set-based UPDATEs (one statement per table, no rows loaded into Python).
+    """
+    folder_bytes = select(func.coalesce(func.sum(File.file_size), 0)).where(
+        File.folder_id == Folder.id).scalar_subquery()
+    folder_files = select(func.count(File.id)).where(File.folder_id == Folder.id).scalar_subquery()
+    db.session.execute(db.update(Folder).values(bytes_used=folder_bytes, file_count=folder_files))
+
+    user_bytes = select(func.coalesce(func.sum(Folder.bytes_used), 0)).where(
+        Folder.user_id == User.id).scalar_subquery()
+    user_files = select(func.coalesce(func.sum(Folder.file_count), 0)).where(
+        Folder.user_id == User.id).scalar_subquery()
+    db.session.execute(db.update(User).values(bytes_used=user_bytes, file_count=user_files))
+
+    db.session.commit()
@@ -0,0 +1,265 @@
+from flask import url_for
+from sqlalchemy import and_, or_, select, union, union_all, literal, true, tuple_
+
+from models import db, User, Note, Folder, File, SharedNote, SharedFolder, NoteAccess, FolderAccess, SyncChange
+from listing import encode_cursor, decode_cursor, DEFAULT_PAGE_SIZE
+
+# The change log keeps one row per (user, kind, object): recording a change
+# replaces the previous row with a fresh sequence number, so a client that
+# resumes from its cursor reads each changed object once, and deletes stay
+# behind as tombstones. Sequence numbers are per user; bumping the user's
+# counter locks their row until commit, so a user's changes become visible
+# in sequence order and a cursor never skips a row that commits late.
+# Counters are locked in user id order, so two transactions that change
+# the same users queue behind each other instead of deadlocking.
+
+_SHARE_KINDS = {
+    'note_share': SharedNote,
+    'folder_share': SharedFolder,
+}
+
+
+def _pair(user_col, object_col):
+    return user_col.label('user_id'), object_col.label('object_id')
+
+
+def _record(kind, pairs, deleted=False):
+    """Write a change row for every (user_id, object_id) the pairs select yields"""
+    pairs = pairs.subquery()
+    users = select(pairs.c.user_id)
+    db.session.execute(
+        select(User.id).where(User.id.in_(users)).order_by(User.id).with_for_update()).all()
+    db.session.execute(
+        db.update(User).where(User.id.in_(users))
+        .values(sync_seq=User.sync_seq + 1)
+        .execution_options(synchronize_session=False))
+    db.session.execute(
+        db.delete(SyncChange).where(
+            SyncChange.kind == kind,
+            tuple_(SyncChange.user_id, SyncChange.object_id).in_(select(pairs.c.user_id, pairs.c.object_id)))
+        .execution_options(synchronize_session=False))
+    db.session.execute(db.insert(SyncChange).from_select(
+        ['user_id', 'kind', 'object_id', 'seq', 'deleted'],
+        select(pairs.c.user_id, literal(kind), pairs.c.object_id, User.sync_seq, literal(deleted))
+        .join(User, User.id == pairs.c.user_id)))
+
+
+def _explicit_pairs(object_col, match_col, pairs):
+    """Select (user_id, object_id) for known (user_id, match value) pairs, grouped to keep it short"""
+    by_user, by_match = {}, {}
+    for user_id, value in pairs:
+        by_user.setdefault(user_id, []).append(value)
+        by_match.setdefault(value, []).append(user_id)
+    # Deliberate cross join; the WHERE clause picks the pairs out of it
+    base = select(*_pair(User.id, object_col)).join_from(User, object_col.table, true())
+    if len(by_user) < len(by_match):
+        parts = [base.where(User.id == user_id, match_col.in_(values)) for user_id, values in by_user.items()]
+    else:
+        parts = [base.where(User.id.in_(user_ids), match_col == value) for value, user_ids in by_match.items()]
+    return parts[0] if len(parts) == 1 else union_all(*parts)
+
+
+def _note_pairs(condition):
+    return union(
+        select(*_pair(Note.user_id, Note.id)).where(condition),
+        select(*_pair(NoteAccess.user_id, NoteAccess.note_id)).join(Note, Note.id == NoteAccess.note_id).where(condition),
+    )
+
+
+def _folder_pairs(condition):
+    return union(
+        select(*_pair(Folder.user_id, Folder.id)).where(condition),
+        select(*_pair(FolderAccess.user_id, FolderAccess.folder_id)).join(Folder, Folder.id == FolderAccess.folder_id).where(condition),
+    )
+
+
+def _share_pairs(share, condition):
+    # Shares are listed for the user who made them and a directly targeted user;
+    # group members see the shared item itself through their access rows
+    return union(
+        select(*_pair(share.shared_by_user_id, share.id)).where(condition),
+        select(*_pair(share.shared_with_user_id, share.id)).where(condition, share.shared_with_user_id.isnot(None)),
+    )
+
+
+def notes_changed(note_ids, deleted=False):
+    """Record created, updated or (before deleting them) deleted notes for everyone who sees them"""
+    if not note_ids:
+        return
+    if deleted:
+        _record('note_share', _share_pairs(SharedNote, SharedNote.note_id.in_(note_ids)), deleted=True)
+    _record('note', _note_pairs(Note.id.in_(note_ids)), deleted)
+
+
+def folders_changed(folder_ids, deleted=False):
+    """Record created, updated or (before deleting them) deleted folders for everyone who sees them"""
+    if not folder_ids:
+        return
+    if deleted:
+        _record('folder_share', _share_pairs(SharedFolder, SharedFolder.folder_id.in_(folder_ids)), deleted=True)
+        # A folder tombstone stands for its files, so their rows are dropped instead of tombstoned
+        db.session.execute(
+            db.delete(SyncChange).where(
+                SyncChange.kind == 'file',
+                SyncChange.object_id.in_(select(File.id).where(File.folder_id.in_(folder_ids))))
+            .execution_options(synchronize_session=False))
+    _record('folder', _folder_pairs(Folder.id.in_(folder_ids)), deleted)
+
+
+def files_changed(file_ids, deleted=False):
+    """Record uploaded or (before deleting them) deleted files for everyone who sees their folder"""
+    if not file_ids:
+        return
+    _record('file', union(
+        select(*_pair(Folder.user_id, File.id)).join(Folder, Folder.id == File.folder_id).where(File.id.in_(file_ids)),
+        select(*_pair(FolderAccess.user_id, File.id)).join(FolderAccess, FolderAccess.folder_id == File.folder_id)
+        .where(File.id.in_(file_ids)),
+    ), deleted)
+
+
+def share_changed(share, deleted=False):
+    """Record a new SharedNote/SharedFolder row, or one about to be deleted"""
+    kind = 'note_share' if isinstance(share, SharedNote) else 'folder_share'
+    model = _SHARE_KINDS[kind]
+    _record(kind, _share_pairs(model, model.id == share.id), deleted)
+
+
+def access_changed(kind, granted, revoked):
+    """
+    Record (user_id, resource_id) pairs that gained or lost access (called by acl.py).
+
+    A granted folder is a single change, however many files it holds: clients
+    page its existing files from the folder's files_url, so sharing a large
+    folder with a large group costs one row per member. Losing a folder is a
+    single tombstone that stands for its files.
+    """
+    model = Note if kind == 'note' else Folder
+    if granted:
+        _record(kind, _explicit_pairs(model.id, model.id, granted))
+    if revoked:
+        _record(kind, _explicit_pairs(model.id, model.id, revoked), deleted=True)
+
+
+def group_removed(group_id):
+    """Record the deletion of a group's shares (call before deleting the group)"""
+    for kind, share in _SHARE_KINDS.items():
+        _record(kind, _share_pairs(share, share.shared_with_group_id == group_id), deleted=True)
+
+
+def user_removed(user_id):
+    """Tombstone, for everyone else, what disappears with a user (call before deleting the user)"""
+    _record('note', select(*_pair(NoteAccess.user_id, NoteAccess.note_id))
+            .join(Note, Note.id == NoteAccess.note_id).where(Note.user_id == user_id), deleted=True)
+    _record('folder', select(*_pair(FolderAccess.user_id, FolderAccess.folder_id))
+            .join(Folder, Folder.id == FolderAccess.folder_id).where(Folder.user_id == user_id), deleted=True)
+    for kind, share in _SHARE_KINDS.items():
+        _record(kind, union(
+            select(*_pair(share.shared_with_user_id, share.id))
+            .where(share.shared_by_user_id == user_id, share.shared_with_user_id.isnot(None)),
+            select(*_pair(share.shared_by_user_id, share.id)).where(share.shared_with_user_id == user_id),
+        ), deleted=True)
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _share_data(share, resource_key):
+    return {
+        'id': share.id,
+        resource_key: getattr(share, resource_key),
+        'shared_with_user': share.shared_with_user.username if share.shared_with_user else None,
+        'shared_with_group': share.shared_with_group.name if share.shared_with_group else None,
+        'shared_by_user_id': share.shared_by_user_id,
+        'shared_at': _isoformat(share.shared_at),
+    }
+
+
+_SERIALIZERS = {
+    'note': (Note, lambda note: {
+        'id': note.id,
+        'title': note.title,
+        'content': note.content,
+        'user_id': note.user_id,
+        'is_public': note.is_public,
+        'version': note.version,
+        'created_at': _isoformat(note.created_at),
+        'updated_at': _isoformat(note.updated_at),
+    }),
+    'folder': (Folder, lambda folder: {
+        'id': folder.id,
+        'name': folder.name,
+        'description': folder.description,
+        'user_id': folder.user_id,
+        'is_public': folder.is_public,
+        'allow_file_drop': folder.allow_file_drop,
+        'created_at': _isoformat(folder.created_at),
+        'files_url': url_for('api_folder_files', folder_id=folder.id),
+    }),
+    'file': (File, lambda file: {
+        'id': file.id,
+        'folder_id': file.folder_id,
+        'name': file.original_filename,
+        'size': file.file_size,
+        'type': file.file_type,
+        'uploaded_by': file.uploaded_by,
+        'uploaded_at': _isoformat(file.uploaded_at),
+        'download_url': url_for('download_file', file_id=file.id),
+    }),
+    'note_share': (SharedNote, lambda share: _share_data(share, 'note_id')),
+    'folder_share': (SharedFolder, lambda share: _share_data(share, 'folder_id')),
+}
+
+
+def changes_since(user_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return one page of a user's changes after cursor, oldest first.
+
+    Returns a tuple of (changes, next_cursor, has_more); next_cursor is the
+    position to resume from and equals the given position when nothing has
+    changed. Raises ValueError for a cursor that is malformed or belongs to
+    another user.
+    """
+    query = SyncChange.query.filter(SyncChange.user_id == user_id)
+    position = decode_cursor(cursor)
+    if cursor:
+        if not position or position.get('u') != user_id:
+            raise ValueError('Invalid cursor.')
+        seq, kind, object_id = position.get('s', 0), position.get('k', ''), position.get('id', 0)
+        if not (_is_int(seq) and isinstance(kind, str) and _is_int(object_id)):
+            raise ValueError('Invalid cursor.')
+        query = query.filter(or_(
+            SyncChange.seq > seq,
+            and_(SyncChange.seq == seq, or_(
+                SyncChange.kind > kind,
+                and_(SyncChange.kind == kind, SyncChange.object_id > object_id)))))
+    else:
+        position = {'u': user_id, 's': 0, 'k': '', 'id': 0}
+
+    rows = query.order_by(SyncChange.seq, SyncChange.kind, SyncChange.object_id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # One IN query per kind for the objects that still exist
+    objects = {}
+    for kind, (model, _) in _SERIALIZERS.items():
+        ids = [row.object_id for row in rows if row.kind == kind and not row.deleted]
+        if ids:
+            objects.update({(kind, obj.id): obj for obj in model.query.filter(model.id.in_(ids))})
+
+    changes = []
+    for row in rows:
+        obj = objects.get((row.kind, row.object_id))
+        change = {'type': row.kind, 'id': row.object_id, 'seq': row.seq, 'deleted': obj is None}
+        if obj is not None:
+            change['data'] = _SERIALIZERS[row.kind][1](obj)
+        changes.append(change)
+
+    if rows:
+        last = rows[-1]
+        position = {'u': user_id, 's': last.seq, 'k': last.kind, 'id': last.object_id}
+    return changes, encode_cursor(position), has_more
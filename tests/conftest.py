@@ -0,0 +1,72 @@
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+
+# app.py configures itself from the environment at import time
+_tmp = tempfile.mkdtemp(prefix='notes-tests-')
+os.environ['DATABASE_URL'] = f'sqlite:///{_tmp}/test.db'
+os.environ.pop('DATABASE_REPLICA_URLS', None)
+os.environ.pop('RATELIMIT_STORAGE_URL', None)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app  # noqa: E402
+from models import db, User, Folder  # noqa: E402
+from ratelimit import limiter  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    flask_app.config.update(
+        TESTING=True,
+        WTF_CSRF_ENABLED=False,
+        UPLOAD_FOLDER=str(tmp_path / 'uploads'),
+        USER_QUOTA_BYTES=0, USER_QUOTA_FILES=0, FOLDER_QUOTA_BYTES=0, FOLDER_QUOTA_FILES=0,
+        UPLOAD_RATE_IP_REQUESTS=0, UPLOAD_RATE_IP_BYTES=0, UPLOAD_RATE_FOLDER_REQUESTS=0,
+        UPLOAD_RATE_FOLDER_BYTES=0, UPLOAD_MAX_CONCURRENT=0,
+        AUTOSAVE_COALESCE_SECONDS=30,
+    )
+    os.makedirs(flask_app.config['UPLOAD_FOLDER'])
+    limiter.init_app(flask_app)
+    with flask_app.app_context():
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+        # The FTS5 table isn't part of the metadata
+        db.session.execute(db.text('DROP TABLE IF EXISTS file_text_fts'))
+        db.session.commit()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def make_user(username):
+    user = User(username=username, email=f'{username}@example.com')
+    user.set_password('password')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def make_folder(user, name='Folder', **kwargs):
+    folder = Folder(name=name, user_id=user.id, **kwargs)
+    db.session.add(folder)
+    db.session.commit()
+    return folder
+
+
+def login(client, username):
+    client.post('/login', data={'username': username, 'password': 'password'})
+    return client
+
+
+def upload(client, folder_id, *files):
+    """Upload (filename, bytes) pairs through the normal upload form"""
+    return client.post(f'/upload_file/{folder_id}', data={
+        'files[]': [(io.BytesIO(data), name) for name, data in files],
+    }, content_type='multipart/form-data')
@@ -0,0 +1,119 @@
+import pytest
+
+import acl
+from models import db, Note, Group, NoteAccess, FolderAccess, SharedNote
+from conftest import make_user, make_folder, login
+
+
+@pytest.fixture
+def users(client):
+    alice, bob, carol = make_user('alice'), make_user('bob'), make_user('carol')
+    login(client, 'alice')
+    return alice, bob, carol
+
+
+def make_note(user, title='Plan'):
+    note = Note(title=title, content='secret', user_id=user.id)
+    db.session.add(note)
+    db.session.commit()
+    return note
+
+
+def make_group(client, name, *members):
+    client.post('/groups', data={'name': name})
+    group = Group.query.filter_by(name=name).one()
+    for member in members:
+        client.post(f'/group/{group.id}', data={'username': member.username})
+    return group
+
+
+def access_rows(model):
+    column = model.note_id if model is NoteAccess else model.folder_id
+    return sorted((row.user_id, getattr(row, column.key), row.grant_count) for row in model.query)
+
+
+def test_direct_share_grants_and_revokes(client, users):
+    alice, bob, _ = users
+    note = make_note(alice)
+
+    client.post(f'/share_note/{note.id}', data={'username': 'bob'})
+    assert access_rows(NoteAccess) == [(bob.id, note.id, 1)]
+    assert acl.has_note_access(bob.id, note.id)
+
+    acl.share_removed(SharedNote.query.one())
+    db.session.commit()
+    assert access_rows(NoteAccess) == []
+
+
+def test_sharing_with_own_group_skips_the_owner(client, users):
+    alice, bob, _ = users
+    note = make_note(alice, 'Mine')
+    folder = make_folder(alice, 'Stuff')
+    group = make_group(client, 'team', bob)
+
+    client.post(f'/share_note/{note.id}', data={'group': 'team'})
+    client.post(f'/share_folder/{folder.id}', data={'group': 'team'})
+    assert access_rows(NoteAccess) == [(bob.id, note.id, 1)]
+    assert access_rows(FolderAccess) == [(bob.id, folder.id, 1)]
+
+    dashboard = client.get('/dashboard').data.decode()
+    assert 'Shared with You' not in dashboard
+
+    # Re-adding memberships or rebuilding must not bring the owner's rows back
+    acl.member_added(group.id, alice.id)
+    acl.rebuild_access()
+    assert access_rows(NoteAccess) == [(bob.id, note.id, 1)]
+
+
+def test_group_and_direct_paths_are_counted(client, users):
+    alice, bob, carol = users
+    note = make_note(alice)
+    group = make_group(client, 'team', bob, carol)
+
+    client.post(f'/share_note/{note.id}', data={'group': 'team'})
+    client.post(f'/share_note/{note.id}', data={'username': 'bob'})
+    assert access_rows(NoteAccess) == [(bob.id, note.id, 2), (carol.id, note.id, 1)]
+
+    # Bob keeps access through the direct share after leaving the group
+    client.post(f'/group/{group.id}/remove/{bob.id}')
+    assert access_rows(NoteAccess) == [(bob.id, note.id, 1), (carol.id, note.id, 1)]
+
+    client.post(f'/delete_group/{group.id}')
+    assert access_rows(NoteAccess) == [(bob.id, note.id, 1)]
+
+
+def test_new_member_gets_existing_group_shares(client, users):
+    alice, bob, carol = users
+    folder = make_folder(alice)
+    group = make_group(client, 'team', bob)
+    client.post(f'/share_folder/{folder.id}', data={'group': 'team'})
+
+    client.post(f'/group/{group.id}', data={'username': 'carol'})
+    assert access_rows(FolderAccess) == [(bob.id, folder.id, 1), (carol.id, folder.id, 1)]
+    assert client.get(f'/folder/{folder.id}').status_code == 200
+
+
+def test_grant_of_a_pair_inserted_concurrently_adds_to_it(app, users):
+    alice, bob, _ = users
+    note = make_note(alice)
+    # Another transaction inserted the row after this one looked for it
+    db.session.add(NoteAccess(user_id=bob.id, note_id=note.id, grant_count=1))
+    db.session.flush()
+
+    acl._grant(NoteAccess, 'note_id', {(bob.id, note.id): 1})
+    db.session.commit()
+    assert access_rows(NoteAccess) == [(bob.id, note.id, 2)]
+
+
+def test_rebuild_matches_incremental_state(client, users):
+    alice, bob, carol = users
+    note = make_note(alice)
+    folder = make_folder(alice)
+    make_group(client, 'team', bob, carol)
+    client.post(f'/share_note/{note.id}', data={'group': 'team'})
+    client.post(f'/share_note/{note.id}', data={'username': 'carol'})
+    client.post(f'/share_folder/{folder.id}', data={'username': 'bob'})
+    before = access_rows(NoteAccess), access_rows(FolderAccess)
+
+    acl.rebuild_access()
+    assert (access_rows(NoteAccess), access_rows(FolderAccess)) == before
@@ -0,0 +1,193 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+import archives
+from listing import encode_cursor
+from models import db, File, ArchiveEntry
+from conftest import make_user, make_folder, login, upload
+
+
+def make_zip(*members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members:
+            if name.endswith('/'):
+                archive.writestr(zipfile.ZipInfo(name), b'')
+            else:
+                archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def make_tar(*members, mode='w', mtime=1700000000):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.mtime = mtime
+            if name.endswith('/'):
+                info.type = tarfile.DIRTYPE
+                archive.addfile(info)
+            else:
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def uploaded(client):
+    """Upload one archive as alice and return its File row"""
+    alice = make_user('alice')
+    folder = make_folder(alice)
+    login(client, 'alice')
+
+    def _upload(name, data):
+        upload(client, folder.id, (name, data))
+        return File.query.filter_by(original_filename=name).one()
+    return _upload
+
+
+def listing(client, file, cursor=None, limit=None):
+    params = {}
+    if cursor:
+        params['cursor'] = cursor
+    if limit:
+        params['limit'] = limit
+    response = client.get(f'/api/file/{file.id}/archive', query_string=params)
+    assert response.status_code == 200, response.data
+    return response.get_json()
+
+
+def download(client, file, index):
+    return client.get(f'/file/{file.id}/archive/{index}')
+
+
+ARCHIVES = [
+    ('bundle.zip', make_zip),
+    ('bundle.tar', make_tar),
+    ('bundle.tar.gz', lambda *members: make_tar(*members, mode='w:gz')),
+]
+
+
+@pytest.mark.parametrize('name, build', ARCHIVES)
+def test_lists_and_downloads_members(client, uploaded, name, build):
+    file = uploaded(name, build(('docs/', b''), ('docs/a.txt', b'alpha'), ('b.bin', b'\x00' * 300)))
+
+    data = listing(client, file)
+    assert data['total'] == 2 and data['next_cursor'] is None
+    assert [(e['index'], e['name'], e['size']) for e in data['entries']] == [
+        (0, 'docs/a.txt', 5), (1, 'b.bin', 300)]
+    assert data['entries'][0]['modified']
+
+    response = download(client, file, 0)
+    assert response.data == b'alpha'
+    assert response.headers['Content-Length'] == '5'
+    assert 'a.txt' in response.headers['Content-Disposition']
+    assert download(client, file, 1).data == b'\x00' * 300
+    assert download(client, file, 2).status_code == 404
+
+
+@pytest.mark.parametrize('name, build', ARCHIVES)
+def test_duplicate_names_resolve_by_index(client, uploaded, name, build):
+    file = uploaded(name, build(('same.txt', b'first'), ('same.txt', b'second')))
+
+    assert [e['name'] for e in listing(client, file)['entries']] == ['same.txt', 'same.txt']
+    assert download(client, file, 0).data == b'first'
+    assert download(client, file, 1).data == b'second'
+
+
+def test_pages_follow_the_cursor(client, uploaded):
+    file = uploaded('many.zip', make_zip(*[(f'f{i:02}.txt', b'x') for i in range(25)]))
+
+    names, cursor = [], None
+    while True:
+        data = listing(client, file, cursor, limit=10)
+        names += [e['name'] for e in data['entries']]
+        cursor = data['next_cursor']
+        if not cursor:
+            break
+    assert names == [f'f{i:02}.txt' for i in range(25)]
+    assert ArchiveEntry.query.filter_by(file_id=file.id).count() == 25
+
+
+def test_listing_is_stored_once(client, uploaded):
+    file = uploaded('bundle.zip', make_zip(('a.txt', b'a')))
+    listing(client, file)
+    db.session.refresh(file)
+    assert file.archive_entry_count == 1
+
+    # Later views read the stored rows, not the archive
+    with open(file.filepath, 'wb') as f:
+        f.write(b'no longer a zip')
+    assert listing(client, file)['entries'][0]['name'] == 'a.txt'
+
+
+@pytest.mark.parametrize('cursor', [
+    encode_cursor({'i': -5}),
+    encode_cursor({'i': 'x'}),
+    encode_cursor({'i': True}),
+    'garbage',
+])
+def test_bad_cursor_starts_at_the_first_page(client, uploaded, cursor):
+    file = uploaded('bundle.zip', make_zip(('a.txt', b'a'), ('b.txt', b'b')))
+    data = listing(client, file, cursor)
+    assert [e['index'] for e in data['entries']] == [0, 1]
+
+
+@pytest.mark.parametrize('mtime', [10 ** 13, -10 ** 13])
+def test_out_of_range_tar_mtime_is_left_empty(client, uploaded, mtime):
+    file = uploaded('odd.tar', make_tar(('a.txt', b'a'), mtime=mtime))
+    assert listing(client, file)['entries'][0]['modified'] is None
+
+
+def test_unreadable_archive_reports_an_error(client, uploaded):
+    file = uploaded('broken.zip', b'not a zip at all')
+    response = client.get(f'/api/file/{file.id}/archive')
+    assert response.status_code == 400
+    assert 'Not a valid ZIP archive' in response.get_json()['error']
+    assert db.session.get(File, file.id).archive_entry_count is None
+
+
+def test_truncated_tar_reports_an_error(client, uploaded, monkeypatch):
+    monkeypatch.setattr(archives, '_INSERT_BATCH', 1)
+    data = make_tar(('a.txt', b'a'), ('b.txt', b'b'), ('big.bin', os.urandom(200_000)), ('c.txt', b'c'),
+                    mode='w:gz')
+    file = uploaded('cut.tar.gz', data[:100_000])
+
+    response = client.get(f'/api/file/{file.id}/archive')
+    assert response.status_code == 400
+    assert 'damaged or truncated' in response.get_json()['error']
+    assert ArchiveEntry.query.count() == 0
+    assert db.session.get(File, file.id).archive_entry_count is None
+
+    response = client.get(f'/file/{file.id}/archive')
+    assert response.status_code == 302
+    assert b'damaged or truncated' in client.get(response.location).data
+    assert download(client, file, 0).status_code == 404
+
+
+def test_too_many_entries_are_refused(client, uploaded, monkeypatch):
+    monkeypatch.setattr(archives, 'MAX_ARCHIVE_ENTRIES', 3)
+    file = uploaded('big.zip', make_zip(*[(f'{i}.txt', b'') for i in range(4)]))
+    response = client.get(f'/api/file/{file.id}/archive')
+    assert response.status_code == 400
+    assert ArchiveEntry.query.count() == 0
+
+
+def test_html_view_renders_a_page(client, uploaded):
+    file = uploaded('bundle.tar', make_tar(('notes/readme.md', b'# hi')))
+    page = client.get(f'/file/{file.id}/archive').data.decode()
+    assert 'notes/readme.md' in page
+    assert f'/file/{file.id}/archive/0' in page
+
+
+def test_members_of_private_folders_are_hidden(client, uploaded):
+    file = uploaded('bundle.zip', make_zip(('a.txt', b'a')))
+    client.get('/logout')
+    make_user('bob')
+    login(client, 'bob')
+    assert client.get(f'/api/file/{file.id}/archive').status_code == 403
+    assert download(client, file, 0).status_code == 403
@@ -0,0 +1,148 @@
+import gzip
+import hashlib
+import json
+
+import pytest
+from flask import Flask, Response, jsonify, send_file, url_for
+
+import assets
+from assets import build_static, load_manifest, init_assets, is_fingerprinted
+import compression
+from compression import init_compression
+
+APP_JS = b'console.log("autosave");\n' * 100
+LOGO = b'\x89PNG'
+
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+@pytest.fixture
+def static(tmp_path):
+    root = tmp_path / 'static'
+    (root / 'js').mkdir(parents=True)
+    (root / 'img').mkdir()
+    (root / 'js' / 'app.js').write_bytes(APP_JS)
+    (root / 'img' / 'logo.png').write_bytes(LOGO)
+    return root
+
+
+def make_app(static, **config):
+    app = Flask('assets_test', static_folder=str(static))
+    app.config.update(config)
+    init_assets(app)
+    init_compression(app)
+    return app
+
+
+def test_build_static_fingerprints_and_precompresses(static):
+    manifest = build_static(str(static))
+    js = f'build/js/app.{digest(APP_JS)}.js'
+    assert manifest == {'js/app.js': js, 'img/logo.png': f'build/img/logo.{digest(LOGO)}.png'}
+    assert (static / js).read_bytes() == APP_JS
+    assert gzip.decompress((static / (js + '.gz')).read_bytes()) == APP_JS
+    # Binary assets aren't precompressed and the build never fingerprints itself
+    assert not list((static / 'build' / 'img').glob('*.gz'))
+    assert json.loads((static / 'build' / 'manifest.json').read_text()) == manifest
+
+    assert build_static(str(static)) == manifest
+    assert sorted(p.name for p in (static / 'build' / 'js').iterdir() if not p.name.endswith('.br')) == [
+        f'app.{digest(APP_JS)}.js', f'app.{digest(APP_JS)}.js.gz']
+
+
+def test_url_for_uses_the_build_only_when_enabled(static):
+    build_static(str(static))
+    for enabled, expected in ((True, f'/static/build/js/app.{digest(APP_JS)}.js'), (False, '/static/js/app.js')):
+        app = make_app(static, ASSETS_FINGERPRINT=enabled)
+        with app.test_request_context():
+            assert url_for('static', filename='js/app.js') == expected
+            assert url_for('static', filename='missing.css') == '/static/missing.css'
+
+
+def test_stale_build_entries_are_skipped(static):
+    build_static(str(static))
+    (static / 'js' / 'app.js').write_bytes(b'// edited after the build\n')
+
+    manifest, stale = load_manifest(str(static))
+    assert stale == ['js/app.js']
+    assert list(manifest) == ['img/logo.png']
+    app = make_app(static, ASSETS_FINGERPRINT=True)
+    with app.test_request_context():
+        assert url_for('static', filename='js/app.js') == '/static/js/app.js'
+        assert url_for('static', filename='img/logo.png').startswith('/static/build/img/logo.')
+
+
+def test_missing_build_serves_plain_files(static):
+    assert load_manifest(str(static)) == ({}, [])
+    app = make_app(static, ASSETS_FINGERPRINT=True)
+    with app.test_request_context():
+        assert url_for('static', filename='js/app.js') == '/static/js/app.js'
+
+
+@pytest.mark.parametrize('whitenoise', [True, False])
+def test_fingerprinted_files_are_cached_forever(static, monkeypatch, whitenoise):
+    if not whitenoise:
+        monkeypatch.setattr(assets, 'WhiteNoise', None)
+    elif assets.WhiteNoise is None:
+        pytest.skip('whitenoise is not installed')
+    build_static(str(static))
+    client = make_app(static, ASSETS_FINGERPRINT=True).test_client()
+
+    response = client.get(f'/static/build/js/app.{digest(APP_JS)}.js')
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert f'max-age={assets.IMMUTABLE_MAX_AGE}' in response.headers['Cache-Control']
+
+    response = client.get('/static/js/app.js')
+    assert 'immutable' not in response.headers.get('Cache-Control', '')
+
+
+def test_is_fingerprinted():
+    assert is_fingerprinted('/static/build/js/app.0123456789ab.js')
+    assert not is_fingerprinted('/static/js/app.js')
+    assert not is_fingerprinted('/static/js/app.0123456789ab')
+
+
+@pytest.fixture
+def compressing(static, tmp_path):
+    app = make_app(static, COMPRESS_MIN_SIZE=100)
+    download = tmp_path / 'big.txt'
+    download.write_bytes(b'x' * 5000)
+
+    app.add_url_rule('/big', 'big', lambda: 'hello ' * 100)
+    app.add_url_rule('/small', 'small', lambda: 'hi')
+    app.add_url_rule('/json', 'json', lambda: jsonify(items=['x'] * 100))
+    app.add_url_rule('/image', 'image', lambda: Response(b'\x00' * 5000, mimetype='image/png'))
+    app.add_url_rule('/download', 'download', lambda: send_file(str(download)))
+    app.add_url_rule('/stream', 'stream', lambda: Response((b'line\n' for _ in range(500)), mimetype='text/plain'))
+    app.add_url_rule('/missing', 'missing', lambda: ('not here ' * 100, 404))
+    return app.test_client()
+
+
+def test_large_text_responses_are_compressed(compressing):
+    response = compressing.get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == b'hello ' * 100
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+    assert compressing.get('/json', headers={'Accept-Encoding': 'gzip'}).headers['Content-Encoding'] == 'gzip'
+
+
+def test_brotli_is_preferred_when_available(compressing):
+    response = compressing.get('/big', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == ('br' if compression.brotli else 'gzip')
+
+
+@pytest.mark.parametrize('path, headers', [
+    ('/small', {'Accept-Encoding': 'gzip'}),
+    ('/big', {}),
+    ('/image', {'Accept-Encoding': 'gzip'}),
+    ('/download', {'Accept-Encoding': 'gzip'}),
+    ('/stream', {'Accept-Encoding': 'gzip'}),
+    ('/missing', {'Accept-Encoding': 'gzip'}),
+])
+def test_responses_left_uncompressed(compressing, path, headers):
+    response = compressing.get(path, headers=headers)
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
@@ -0,0 +1,208 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import autosave as autosave_module
+from autosave import apply_patches, PatchError
+from models import db, Note, NotePatch, SyncChange
+from conftest import make_user, login
+
+
+@pytest.fixture
+def note(client):
+    user = make_user('alice')
+    note = Note(title='Title', content='Hello world', user_id=user.id)
+    db.session.add(note)
+    db.session.commit()
+    login(client, 'alice')
+    return note
+
+
+def autosave(client, note, body):
+    return client.post(f'/api/notes/{note.id}/autosave', json=body)
+
+
+def current(note):
+    db.session.expire_all()
+    return db.session.get(Note, note.id)
+
+
+def test_apply_patches_uses_utf16_offsets():
+    assert apply_patches('Hello world', [{'start': 6, 'end': 11, 'text': 'there'}]) == 'Hello there'
+    # The emoji is two UTF-16 code units, as in JavaScript
+    assert apply_patches('a😀b', [{'start': 3, 'end': 4, 'text': 'c'}]) == 'a😀c'
+    with pytest.raises(PatchError):
+        apply_patches('a😀b', [{'start': 2, 'end': 2, 'text': 'x'}])
+
+
+@pytest.mark.parametrize('patches', [
+    5, 'abc', {'start': 0}, [5], [None], [{'start': '1', 'end': 2, 'text': ''}],
+    [{'start': 0, 'end': 1, 'text': 5}], [{'start': True, 'end': 1}], [{'start': 0, 'end': 99}],
+])
+def test_apply_patches_rejects_malformed(patches):
+    with pytest.raises(PatchError):
+        apply_patches('Hello', patches)
+
+
+def test_autosaves_are_buffered_then_folded_once(client, note):
+    response = autosave(client, note, {'version': 1, 'seq': 0, 'title': 'New',
+                                       'patches': [{'start': 6, 'end': 11, 'text': 'there'}]})
+    assert response.status_code == 200
+    assert response.get_json() == {'version': 1, 'seq': 1, 'saved': True}
+    response = autosave(client, note, {'version': 1, 'seq': 1, 'patches': [{'start': 11, 'end': 11, 'text': '!'}]})
+    assert response.get_json() == {'version': 1, 'seq': 2, 'saved': True}
+    response = autosave(client, note, {'version': 1, 'seq': 2, 'patches': []})
+    assert response.get_json() == {'version': 1, 'seq': 2, 'saved': False}
+
+    # Nothing reaches the note, its version or the change feed until the fold
+    assert (current(note).content, current(note).version) == ('Hello world', 1)
+    assert SyncChange.query.count() == 0
+    assert NotePatch.query.count() == 2
+
+    response = autosave(client, note, {'version': 1, 'seq': 2, 'flush': True})
+    assert response.get_json() == {'version': 2, 'seq': 0, 'saved': True}
+    assert (current(note).title, current(note).content) == ('New', 'Hello there!')
+    assert NotePatch.query.count() == 0
+    assert [change.seq for change in SyncChange.query] == [1]
+
+
+def test_saves_after_the_window_fold_the_buffer(app, client, note):
+    autosave(client, note, {'version': 1, 'seq': 0, 'patches': [{'start': 0, 'end': 0, 'text': '>'}]})
+    NotePatch.query.update({'created_at': datetime.utcnow() - timedelta(seconds=31)})
+    db.session.commit()
+
+    response = autosave(client, note, {'version': 1, 'seq': 1, 'patches': [{'start': 1, 'end': 1, 'text': '>'}]})
+    assert response.get_json() == {'version': 2, 'seq': 0, 'saved': True}
+    assert current(note).content == '>>Hello world'
+
+
+def test_zero_window_writes_every_save(app, client, note):
+    app.config['AUTOSAVE_COALESCE_SECONDS'] = 0
+    response = autosave(client, note, {'version': 1, 'patches': [{'start': 0, 'end': 0, 'text': '>'}]})
+    assert response.get_json() == {'version': 2, 'seq': 0, 'saved': True}
+    assert current(note).content == '>Hello world'
+
+
+def test_autosave_skips_no_op_saves(client, note):
+    response = autosave(client, note, {'version': 1, 'patches': []})
+    assert response.get_json() == {'version': 1, 'seq': 0, 'saved': False}
+    # A flush with nothing buffered writes nothing either
+    response = autosave(client, note, {'version': 1, 'seq': 0, 'flush': True})
+    assert response.get_json() == {'version': 1, 'seq': 0, 'saved': False}
+    assert current(note).version == 1
+
+
+def test_stale_autosave_conflicts(client, note):
+    autosave(client, note, {'version': 1, 'seq': 0, 'patches': [{'start': 0, 'end': 0, 'text': '>'}]})
+
+    # A second tab still at seq 0 sees the buffered text in the conflict
+    response = autosave(client, note, {'version': 1, 'seq': 0, 'patches': [{'start': 0, 'end': 0, 'text': '!'}]})
+    assert response.status_code == 409
+    assert response.get_json()['content'] == '>Hello world'
+    assert response.get_json()['seq'] == 1
+
+    autosave(client, note, {'version': 1, 'seq': 1, 'flush': True})
+    response = autosave(client, note, {'version': 1, 'seq': 1, 'patches': []})
+    assert response.status_code == 409
+    assert response.get_json()['version'] == 2
+    assert current(note).content == '>Hello world'
+
+
+def test_concurrent_saves_of_the_same_seq_conflict(client, note, monkeypatch):
+    real_pending = autosave_module.pending
+    calls = []
+
+    def racing_pending(note):
+        # Another request buffers seq 1 after this one read the buffer
+        state = real_pending(note)
+        if not calls:
+            autosave_module.buffer_save(note, 1, None, [{'start': 0, 'end': 0, 'text': '#'}])
+            db.session.commit()
+        calls.append(state)
+        return state
+
+    monkeypatch.setattr(autosave_module, 'pending', racing_pending)
+    response = autosave(client, note, {'version': 1, 'seq': 0, 'patches': [{'start': 0, 'end': 0, 'text': '!'}]})
+    assert response.status_code == 409
+    assert response.get_json()['content'] == '#Hello world'
+    assert [row.seq for row in NotePatch.query] == [1]
+
+
+@pytest.mark.parametrize('body', [
+    {'version': 1, 'patches': 5},
+    {'version': 1, 'patches': [5]},
+    {'version': 1, 'title': None},
+    {'version': 1, 'title': 'x' * 201},
+    {'version': '1'},
+    {'version': True},
+    {'version': 1, 'seq': -1},
+    {'version': 1, 'seq': '0'},
+    {'version': 1, 'flush': 'yes'},
+    [1, 2],
+    'text',
+])
+def test_invalid_autosave_bodies_are_rejected(client, note, body):
+    assert autosave(client, note, body).status_code == 400
+    assert current(note).version == 1
+
+
+def test_edit_form_checks_version_and_buffered_saves(client, note):
+    autosave(client, note, {'version': 1, 'seq': 0, 'patches': [{'start': 0, 'end': 0, 'text': '>'}]})
+
+    response = client.post(f'/edit_note/{note.id}', data={'title': 'Form', 'content': 'stale', 'version': 1, 'seq': 0})
+    assert response.status_code == 409
+    assert b'stale' in response.data
+    assert b'name="seq" value="1"' in response.data
+    assert current(note).content == 'Hello world'
+
+    response = client.post(f'/edit_note/{note.id}', data={'title': 'Form', 'content': 'fresh', 'version': 1, 'seq': 1})
+    assert response.status_code == 302
+    assert (current(note).content, current(note).version) == ('fresh', 2)
+    assert NotePatch.query.count() == 0
+
+    autosave(client, note, {'version': 2, 'seq': 0, 'flush': True, 'patches': [{'start': 0, 'end': 0, 'text': '>'}]})
+    response = client.post(f'/edit_note/{note.id}', data={'title': 'Form', 'content': 'stale', 'version': 2, 'seq': 0})
+    assert response.status_code == 409
+    assert b'name="version" value="3"' in response.data
+
+
+def test_edit_form_without_version_conflicts(client, note):
+    response = client.post(f'/edit_note/{note.id}', data={'title': 'Form', 'content': 'x'})
+    assert response.status_code == 409
+    assert current(note).content == 'Hello world'
+
+
+def test_edit_page_carries_version(client, note):
+    response = client.get(f'/edit_note/{note.id}')
+    assert response.status_code == 200
+    assert b'name="version" value="1"' in response.data
+    assert b'name="seq" value="0"' in response.data
+    assert b'value="Title"' in response.data
+
+
+def test_edit_page_shows_buffered_saves(client, note):
+    autosave(client, note, {'version': 1, 'seq': 0, 'title': 'Draft',
+                            'patches': [{'start': 0, 'end': 5, 'text': 'Goodbye'}]})
+    response = client.get(f'/edit_note/{note.id}')
+    assert b'Goodbye world' in response.data
+    assert b'value="Draft"' in response.data
+    assert b'name="seq" value="1"' in response.data
+    # Readers see the note as last written
+    assert b'Hello world' in client.get(f'/note/{note.id}').data
+
+
+def test_fold_autosaves_command(app, client, note):
+    autosave(client, note, {'version': 1, 'seq': 0, 'patches': [{'start': 0, 'end': 0, 'text': '>'}]})
+    result = app.test_cli_runner().invoke(args=['fold-autosaves'])
+    assert 'Folded autosaves into 0 notes' in result.output
+
+    # Saves buffered by an editor that went away, plus leftovers of an older version
+    NotePatch.query.update({'created_at': datetime.utcnow() - timedelta(minutes=5)})
+    db.session.add(NotePatch(note_id=note.id, version=0, seq=1, patches='[]',
+                             created_at=datetime.utcnow() - timedelta(minutes=5)))
+    db.session.commit()
+    result = app.test_cli_runner().invoke(args=['fold-autosaves'])
+    assert result.exit_code == 0, result.output
+    assert 'Folded autosaves into 1 notes' in result.output
+    assert (current(note).content, current(note).version) == ('>Hello world', 2)
+    assert NotePatch.query.count() == 0
@@ -0,0 +1,117 @@
+import os
+
+from models import (db, User, Note, Folder, File, Group, GroupMembership, SharedNote,
+                    SharedFolder, NoteAccess, FolderAccess)
+from conftest import make_user, make_folder, login, upload
+
+
+def count(model):
+    return db.session.query(model).count()
+
+
+def shared_setup(client):
+    """alice owns a note and a folder with two uploads, shared with bob directly and via a group"""
+    alice, bob = make_user('alice'), make_user('bob')
+    login(client, 'alice')
+    note = Note(title='Plan', content='secret', user_id=alice.id)
+    db.session.add(note)
+    db.session.commit()
+    folder = make_folder(alice)
+    upload(client, folder.id, ('a.txt', b'aaa'), ('b.txt', b'bb'))
+    client.post('/groups', data={'name': 'team'})
+    group = Group.query.one()
+    client.post(f'/group/{group.id}', data={'username': 'bob'})
+    client.post(f'/share_note/{note.id}', data={'username': 'bob'})
+    client.post(f'/share_folder/{folder.id}', data={'group': 'team'})
+    return alice, bob, note, folder, group
+
+
+def test_foreign_keys_are_enforced_on_sqlite(app):
+    assert db.session.execute(db.text('PRAGMA foreign_keys')).scalar() == 1
+
+
+def test_delete_note_removes_shares_and_access(client):
+    alice, bob, note, folder, group = shared_setup(client)
+    assert count(SharedNote) == 1 and count(NoteAccess) == 1
+
+    client.post(f'/delete_note/{note.id}')
+    assert count(Note) == 0
+    assert count(SharedNote) == 0
+    assert count(NoteAccess) == 0
+    assert count(File) == 2
+
+
+def test_delete_folder_removes_files_on_disk_and_rows(client):
+    alice, bob, note, folder, group = shared_setup(client)
+    paths = [f.filepath for f in File.query]
+    assert all(os.path.exists(path) for path in paths)
+
+    client.post(f'/delete_folder/{folder.id}')
+    assert count(Folder) == 0
+    assert count(File) == 0
+    assert count(SharedFolder) == 0
+    assert count(FolderAccess) == 0
+    assert not any(os.path.exists(path) for path in paths)
+    assert db.session.get(User, alice.id).bytes_used == 0
+
+
+def test_only_the_owner_can_delete(client):
+    alice, bob, note, folder, group = shared_setup(client)
+    client.get('/logout')
+    login(client, 'bob')
+    assert client.post(f'/delete_note/{note.id}').status_code == 403
+    assert client.post(f'/delete_folder/{folder.id}').status_code == 403
+    assert client.post(f'/delete_group/{group.id}').status_code == 403
+    assert count(Note) == count(Folder) == count(Group) == 1
+
+
+def test_delete_group_revokes_access_given_through_it(client):
+    alice, bob, note, folder, group = shared_setup(client)
+    assert count(FolderAccess) == 1
+
+    client.post(f'/delete_group/{group.id}')
+    assert count(Group) == 0
+    assert count(GroupMembership) == 0
+    assert count(SharedFolder) == 0
+    assert count(FolderAccess) == 0
+    # The direct note share is untouched
+    assert count(NoteAccess) == 1
+
+
+def test_delete_user_removes_everything_they_own(app, client):
+    alice, bob, note, folder, group = shared_setup(client)
+    bobs_note = Note(title='Bob', content='', user_id=bob.id)
+    db.session.add(bobs_note)
+    # A file bob dropped into alice's folder outlives his account
+    File.query.first().uploaded_by_user_id = bob.id
+    db.session.commit()
+    paths = [f.filepath for f in File.query]
+
+    result = app.test_cli_runner().invoke(args=['delete-user', 'alice', '--yes'])
+    assert result.exit_code == 0, result.output
+    assert [u.username for u in User.query] == ['bob']
+    assert [n.title for n in Note.query] == ['Bob']
+    for model in (Folder, File, Group, GroupMembership, SharedNote, SharedFolder,
+                  NoteAccess, FolderAccess):
+        assert count(model) == 0, model.__name__
+    assert not any(os.path.exists(path) for path in paths)
+
+
+def test_delete_user_sets_uploader_to_null(app, client):
+    alice, bob, note, folder, group = shared_setup(client)
+    file = File.query.first()
+    file.uploaded_by_user_id = bob.id
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['delete-user', 'bob', '--yes'])
+    assert result.exit_code == 0, result.output
+    db.session.expire_all()
+    assert count(File) == 2
+    assert db.session.get(File, file.id).uploaded_by_user_id is None
+    assert count(NoteAccess) == count(FolderAccess) == 0
+
+
+def test_delete_user_command_reports_unknown_user(app):
+    result = app.test_cli_runner().invoke(args=['delete-user', 'nobody', '--yes'])
+    assert result.exit_code != 0
+    assert 'User not found' in result.output
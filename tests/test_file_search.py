@@ -0,0 +1,200 @@
+import os
+
+import pytest
+from flask_migrate import check, stamp
+
+import file_search
+from file_search import index_pending, reindex_changed, search_files
+from models import db, File, FileText
+from conftest import make_user, make_folder, login, upload
+
+
+@pytest.fixture
+def alice(client):
+    user = make_user('alice')
+    login(client, 'alice')
+    return user
+
+
+def upload_file(client, folder, name, data):
+    upload(client, folder.id, (name, data))
+    return File.query.filter_by(folder_id=folder.id, original_filename=name).one()
+
+
+def names(results):
+    return [file.original_filename for file, snippet in results]
+
+
+def write_upload(client, name, data):
+    path = os.path.join(client.application.config['UPLOAD_FOLDER'], name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def fts_ids(word):
+    """Row ids the FTS index itself returns for a word, bypassing the file_text join"""
+    return [row[0] for row in db.session.execute(
+        db.text('SELECT rowid FROM file_text_fts WHERE file_text_fts MATCH :q'), {'q': f'"{word}"'})]
+
+
+def check_fts():
+    # Raises if the FTS index and the file_text table disagree
+    db.session.execute(db.text("INSERT INTO file_text_fts(file_text_fts) VALUES ('integrity-check')"))
+
+
+def test_index_and_search_ranks_with_snippets(client, alice):
+    folder = make_folder(alice)
+    upload_file(client, folder, 'fruit.txt', b'apples and pears, more apples, apples everywhere')
+    upload_file(client, folder, 'veg.md', b'carrots with a single apples mention')
+    upload_file(client, folder, 'photo.png', b'\x89PNG apples')
+
+    stats = index_pending(batch_size=2)
+    assert stats == {'indexed': 3, 'errors': []}
+    # Binary files get an empty row so they aren't picked up again
+    assert db.session.get(FileText, File.query.filter_by(original_filename='photo.png').one().id).content == ''
+    assert index_pending()['indexed'] == 0
+
+    results = search_files('apples', alice.id)
+    assert names(results) == ['fruit.txt', 'veg.md']
+    assert '<mark>apples</mark>' in str(results[0][1])
+    check_fts()
+
+
+def test_snippets_are_escaped_and_queries_are_not_fts_syntax(client, alice):
+    folder = make_folder(alice)
+    upload_file(client, folder, 'page.html', b'<script>alert(1)</script> needle \x02 or near more')
+    index_pending()
+
+    results = search_files('needle', alice.id)
+    snippet = str(results[0][1])
+    assert '<script>' not in snippet and '&lt;script&gt;' in snippet
+    assert '<mark>needle</mark>' in snippet
+
+    # Operators and quotes are searched as plain words, never parsed
+    for q in ['needle OR', '"needle', 'needle*', 'NEAR(needle', 'more:needle', '-needle', 'needle)']:
+        assert names(search_files(q, alice.id)) == ['page.html'], q
+    assert search_files('***', alice.id) == []
+
+
+def test_search_only_covers_visible_folders(client, alice):
+    bob = make_user('bob')
+    mine = make_folder(alice, 'Mine')
+    bobs = make_folder(bob, 'Bobs')
+    shared = make_folder(bob, 'Shared')
+    upload_file(client, mine, 'a.txt', b'secret plans')
+    db.session.add_all([
+        File(filename='b.txt', original_filename='b.txt', filepath=write_upload(client, 'b.txt', b'secret bob'),
+             file_size=10, folder_id=bobs.id),
+        File(filename='c.txt', original_filename='c.txt', filepath=write_upload(client, 'c.txt', b'secret shared'),
+             file_size=13, folder_id=shared.id),
+    ])
+    db.session.commit()
+    index_pending()
+    assert names(search_files('secret', alice.id)) == ['a.txt']
+
+    client.get('/logout')
+    login(client, 'bob')
+    client.post(f'/share_folder/{shared.id}', data={'username': 'alice'})
+    assert sorted(names(search_files('secret', alice.id))) == ['a.txt', 'c.txt']
+    assert names(search_files('secret', alice.id, folder_id=shared.id)) == ['c.txt']
+
+
+def test_search_routes(client, alice):
+    bob = make_user('bob')
+    folder = make_folder(alice)
+    other = make_folder(bob)
+    upload_file(client, folder, 'notes.txt', b'the quick brown fox')
+    index_pending()
+
+    data = client.get('/api/search_files', query_string={'q': 'fox'}).get_json()
+    assert [r['name'] for r in data['results']] == ['notes.txt']
+    assert '<mark>fox</mark>' in data['results'][0]['snippet']
+    assert client.get('/api/search_files', query_string={'q': ' '}).status_code == 400
+    assert client.get('/api/search_files', query_string={'q': 'fox', 'folder': other.id}).status_code == 403
+    assert client.get('/api/search_files', query_string={'q': 'fox', 'folder': 9999}).status_code == 404
+
+    page = client.get('/search', query_string={'q': 'fox'}).data.decode()
+    assert 'notes.txt' in page and '<mark>fox</mark>' in page
+
+
+def test_rescan_reindexes_changed_files(client, alice):
+    folder = make_folder(alice)
+    file = upload_file(client, folder, 'todo.txt', b'buy milk')
+    index_pending()
+    assert reindex_changed() == {'indexed': 0, 'errors': []}
+
+    with open(file.filepath, 'wb') as f:
+        f.write(b'buy bread instead')
+    stats = reindex_changed()
+    assert stats['indexed'] == 1
+    assert names(search_files('bread', alice.id)) == ['todo.txt']
+    assert search_files('milk', alice.id) == []
+    check_fts()
+
+
+def test_unreadable_files_are_recorded_and_not_retried(client, alice):
+    folder = make_folder(alice)
+    file = upload_file(client, folder, 'gone.txt', b'data')
+    os.remove(file.filepath)
+
+    stats = index_pending()
+    assert stats['indexed'] == 0 and stats['errors'][0]['file_id'] == file.id
+    assert db.session.get(FileText, file.id).content == ''
+    assert index_pending() == {'indexed': 0, 'errors': []}
+
+
+def test_failed_reextraction_drops_stale_text(client, alice, monkeypatch):
+    folder = make_folder(alice)
+    file = upload_file(client, folder, 'todo.txt', b'buy milk')
+    index_pending()
+
+    def broken(file):
+        raise ValueError('cannot read')
+    monkeypatch.setattr(file_search, 'extract_text', broken)
+    with open(file.filepath, 'wb') as f:
+        f.write(b'something else entirely')
+    assert len(reindex_changed()['errors']) == 1
+    assert db.session.get(FileText, file.id).content == ''
+    assert search_files('milk', alice.id) == []
+    check_fts()
+
+
+def test_indexed_text_is_capped(client, alice, monkeypatch):
+    monkeypatch.setattr(file_search, 'MAX_INDEXED_CHARS', 10)
+    folder = make_folder(alice)
+    file = upload_file(client, folder, 'long.txt', b'early words then lateword')
+    index_pending()
+    assert db.session.get(FileText, file.id).content == 'early word'
+    assert search_files('lateword', alice.id) == []
+
+
+def test_deleting_files_and_folders_cleans_the_index(client, alice):
+    folder = make_folder(alice)
+    keep = make_folder(alice, 'Keep')
+    doomed = upload_file(client, folder, 'a.txt', b'zebra one')
+    upload_file(client, folder, 'b.txt', b'zebra two')
+    kept = upload_file(client, keep, 'c.txt', b'zebra three')
+    index_pending()
+    assert len(fts_ids('zebra')) == 3
+
+    client.post(f'/delete_file/{doomed.id}')
+    assert sorted(fts_ids('zebra')) == sorted(f.id for f in File.query)
+    check_fts()
+
+    client.post(f'/delete_folder/{folder.id}')
+    assert fts_ids('zebra') == [kept.id]
+    assert FileText.query.count() == 1
+    assert names(search_files('zebra', alice.id)) == ['c.txt']
+    check_fts()
+
+
+def test_autogenerate_ignores_the_fts_index(app):
+    # The tables come from the models, so autogenerate should find nothing to do
+    directory = os.path.join(app.root_path, 'migrations')
+    stamp(directory=directory)
+    try:
+        check(directory=directory)
+    finally:
+        db.session.execute(db.text('DROP TABLE alembic_version'))
+        db.session.commit()
@@ -0,0 +1,146 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+import importer
+from importer import import_archive, ArchiveError, MAX_REPORTED_ERRORS
+from models import db, User, Note, Folder, File
+from conftest import make_user, login
+
+
+def make_zip(entries):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def truncated_tar_gz():
+    # A note, then a member whose compressed data is cut off halfway
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, data in (('todo.md', b'# Todo'), ('big.bin', os.urandom(200_000)), ('late.md', b'late')):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return io.BytesIO(buffer.getvalue()[:100_000])
+
+
+def stored_files(app):
+    return os.listdir(app.config['UPLOAD_FOLDER'])
+
+
+def test_import_creates_notes_files_and_folders(app):
+    alice = make_user('alice')
+    archive = make_zip({
+        'notes/todo.md': '# Groceries\nmilk',
+        'docs/report.pdf': b'%PDF',
+        'docs/img/logo.png': b'png',
+        '__MACOSX/._todo.md': b'junk',
+    })
+
+    stats = import_archive(archive, 'backup.zip', alice, app.config['UPLOAD_FOLDER'], batch_size=1)
+    assert (stats['notes'], stats['files'], stats['folders'], stats['error_count']) == (1, 2, 2, 0)
+    assert Note.query.one().title == 'Groceries'
+    assert sorted(folder.name for folder in Folder.query) == ['backup/docs', 'backup/docs/img']
+    assert len(stored_files(app)) == 2
+    db.session.refresh(alice)
+    assert (alice.bytes_used, alice.file_count) == (7, 2)
+
+
+def test_reported_errors_are_capped(app):
+    alice = make_user('alice')
+    # Notes that aren't UTF-8 are rejected one by one
+    archive = make_zip({f'bad{i}.txt': b'\xff\xfe' for i in range(MAX_REPORTED_ERRORS + 5)})
+
+    stats = import_archive(archive, 'bad.zip', alice, app.config['UPLOAD_FOLDER'])
+    assert stats['error_count'] == MAX_REPORTED_ERRORS + 5
+    assert len(stats['errors']) == MAX_REPORTED_ERRORS
+
+
+def test_failed_copy_removes_partial_file(app, monkeypatch):
+    alice = make_user('alice')
+
+    def broken_copy(source, target, length=0):
+        target.write(b'partial')
+        raise OSError('disk full')
+    monkeypatch.setattr(importer.shutil, 'copyfileobj', broken_copy)
+
+    stats = import_archive(make_zip({'a.bin': b'data'}), 'a.zip', alice, app.config['UPLOAD_FOLDER'])
+    assert stats['error_count'] == 1 and stats['files'] == 0
+    assert stored_files(app) == []
+    db.session.refresh(alice)
+    assert (alice.bytes_used, alice.file_count) == (0, 0)
+
+
+def test_aborted_batch_removes_its_files(app, monkeypatch):
+    alice = make_user('alice')
+    copies = []
+
+    def copy_then_fail(source, target, length=0):
+        target.write(source.read())
+        copies.append(target.name)
+        if len(copies) == 2:
+            raise RuntimeError('corrupt stream')
+    monkeypatch.setattr(importer.shutil, 'copyfileobj', copy_then_fail)
+
+    with pytest.raises(RuntimeError):
+        import_archive(make_zip({'a.bin': b'a', 'b.bin': b'b'}), 'a.zip', alice, app.config['UPLOAD_FOLDER'])
+    assert stored_files(app) == []
+    assert File.query.count() == 0
+    assert db.session.get(User, alice.id).bytes_used == 0
+
+
+def test_damaged_zip_members_are_entry_errors(app):
+    alice = make_user('alice')
+    archive = make_zip({'good.txt': 'fine', 'bad.bin': b'hello world'}).getvalue()
+    # Stored members keep their data as is, so this breaks only the CRC of bad.bin
+    archive = io.BytesIO(archive.replace(b'hello world', b'jello world'))
+
+    stats = import_archive(archive, 'a.zip', alice, app.config['UPLOAD_FOLDER'])
+    assert (stats['notes'], stats['files'], stats['error_count']) == (1, 0, 1)
+    assert stats['errors'][0]['entry'] == 'bad.bin'
+    assert stored_files(app) == []
+    db.session.refresh(alice)
+    assert (alice.bytes_used, alice.file_count) == (0, 0)
+
+
+def test_truncated_tar_keeps_what_was_read(app):
+    alice = make_user('alice')
+
+    with pytest.raises(ArchiveError) as excinfo:
+        import_archive(truncated_tar_gz(), 'a.tar.gz', alice, app.config['UPLOAD_FOLDER'])
+    assert excinfo.value.stats['notes'] == 1
+    assert Note.query.one().title == 'Todo'
+    assert File.query.count() == 0 and stored_files(app) == []
+
+
+def test_import_route_reports_a_truncated_tar(client):
+    make_user('alice')
+    login(client, 'alice')
+    response = client.post('/import', data={'archive': (truncated_tar_gz(), 'a.tar.gz')},
+                           content_type='multipart/form-data', follow_redirects=True)
+    assert response.status_code == 200
+    assert b'damaged or truncated' in response.data
+    assert b'Imported 1 notes and 0 files before the error.' in response.data
+
+
+def test_import_command_names_folders_after_the_file(app, tmp_path):
+    make_user('alice')
+    path = tmp_path / 'backup.zip'
+    path.write_bytes(make_zip({'docs/report.pdf': b'%PDF'}).getvalue())
+
+    result = app.test_cli_runner().invoke(args=['import-archive', str(path), '--user', 'alice'])
+    assert result.exit_code == 0, result.output
+    assert [folder.name for folder in Folder.query] == ['backup/docs']
+
+    path = tmp_path / 'broken.tar.gz'
+    path.write_bytes(truncated_tar_gz().getvalue())
+    result = app.test_cli_runner().invoke(args=['import-archive', str(path), '--user', 'alice'])
+    assert result.exit_code == 1
+    assert 'imported 1 notes and 0 files before the error' in result.output
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+import listing
+from listing import FILE_SORT_COLUMNS, paginate_files, encode_cursor
+from models import db, File
+from conftest import make_user, make_folder
+
+
+def add_files(folder, names, **kwargs):
+    start = datetime(2026, 1, 1)
+    files = []
+    for i, name in enumerate(names):
+        values = {'file_size': i, 'uploaded_by': 'alice', 'uploaded_at': start + timedelta(minutes=i)}
+        values.update({key: value[i] if isinstance(value, list) else value for key, value in kwargs.items()})
+        files.append(File(filename=name, original_filename=name, filepath=f'/nonexistent/{name}',
+                          folder_id=folder.id, **values))
+    db.session.add_all(files)
+    db.session.commit()
+    return files
+
+
+def walk(folder_id, **kwargs):
+    """Collect every page of a listing by following next_cursor"""
+    names, cursor = [], None
+    while True:
+        files, cursor = paginate_files(folder_id, cursor=cursor, limit=2, **kwargs)
+        names.extend(file.original_filename for file in files)
+        if cursor is None:
+            return names
+
+
+def test_pages_follow_sort_order(app):
+    folder = make_folder(make_user('alice'))
+    add_files(folder, ['c.txt', 'a.txt', 'e.txt', 'b.txt', 'd.txt'])
+
+    assert walk(folder.id, sort='name', order='asc') == ['a.txt', 'b.txt', 'c.txt', 'd.txt', 'e.txt']
+    assert walk(folder.id, sort='date', order='desc') == ['d.txt', 'b.txt', 'e.txt', 'a.txt', 'c.txt']
+    assert walk(folder.id, sort='size', order='asc') == ['c.txt', 'a.txt', 'e.txt', 'b.txt', 'd.txt']
+
+
+def test_tampered_cursor_restarts_at_first_page(app):
+    folder = make_folder(make_user('alice'))
+    add_files(folder, ['a.txt', 'b.txt', 'c.txt'])
+    first, _ = paginate_files(folder.id, sort='date', order='desc', limit=2)
+
+    for value in ('garbage', 5, ['x'], None):
+        cursor = encode_cursor({'s': 'date', 'o': 'desc', 'v': value, 'id': 'x' if value is None else 1})
+        files, _ = paginate_files(folder.id, sort='date', order='desc', cursor=cursor, limit=2)
+        assert files == first
+    cursor = encode_cursor({'s': 'size', 'o': 'desc', 'v': 'big', 'id': 1})
+    assert paginate_files(folder.id, sort='size', order='desc', cursor=cursor, limit=2)[0]
+
+
+def test_tampered_cursor_over_http_is_not_an_error(client):
+    alice = make_user('alice')
+    folder = make_folder(alice, is_public=True)
+    add_files(folder, ['a.txt'])
+    cursor = encode_cursor({'s': 'date', 'o': 'desc', 'v': 'garbage', 'id': 1})
+
+    response = client.get(f'/api/folder/{folder.id}/files?cursor={cursor}')
+    assert response.status_code == 200
+    assert [file['name'] for file in response.get_json()['files']] == ['a.txt']
+
+
+def test_search_treats_like_wildcards_literally(app):
+    folder = make_folder(make_user('alice'))
+    add_files(folder, ['100%.txt', '100 percent.txt', 'a_b.txt', 'axb.txt'])
+
+    assert walk(folder.id, sort='name', order='asc', q='%') == ['100%.txt']
+    assert walk(folder.id, sort='name', order='asc', q='a_b') == ['a_b.txt']
+
+
+def test_null_uploader_pages_through_every_row(app):
+    folder = make_folder(make_user('alice'))
+    add_files(folder, ['a.txt', 'b.txt', 'c.txt', 'd.txt', 'e.txt'],
+              uploaded_by=['bob', None, 'alice', None, None])
+
+    ascending = walk(folder.id, sort='uploader', order='asc')
+    descending = walk(folder.id, sort='uploader', order='desc')
+    assert ascending == ['b.txt', 'd.txt', 'e.txt', 'c.txt', 'a.txt']
+    assert descending == list(reversed(ascending))
+
+
+@pytest.mark.parametrize('sort', sorted(FILE_SORT_COLUMNS))
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_postgres_order_by_matches_the_plain_indexes(sort, order):
+    # An explicit NULLS FIRST/LAST against PostgreSQL's default would rule out the index scan
+    sql = str(select(File.id).order_by(*listing._order_by(FILE_SORT_COLUMNS[sort], order))
+              .compile(dialect=postgresql.dialect()))
+    column = FILE_SORT_COLUMNS[sort].key
+    assert sql.endswith(f'ORDER BY file.{column} {order.upper()}, file.id {order.upper()}')
+    assert 'NULLS' not in sql
+
+
+def test_null_uploader_pages_with_nulls_sorting_high(app, monkeypatch):
+    # Emulate PostgreSQL's NULL placement on SQLite
+    monkeypatch.setattr(listing, '_nulls_sort_high', lambda: True)
+    monkeypatch.setattr(listing, '_order_by', lambda column, order: (
+        (column.asc().nulls_last(), File.id.asc()) if order == 'asc'
+        else (column.desc().nulls_first(), File.id.desc())))
+    folder = make_folder(make_user('alice'))
+    add_files(folder, ['a.txt', 'b.txt', 'c.txt', 'd.txt', 'e.txt'],
+              uploaded_by=['bob', None, 'alice', None, None])
+
+    ascending = walk(folder.id, sort='uploader', order='asc')
+    descending = walk(folder.id, sort='uploader', order='desc')
+    assert ascending == ['c.txt', 'a.txt', 'b.txt', 'd.txt', 'e.txt']
+    assert descending == list(reversed(ascending))
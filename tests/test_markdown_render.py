@@ -0,0 +1,92 @@
+import pytest
+
+import markdown_render
+from markdown_render import render_markdown, RenderCache, MAX_MARKDOWN_CHARS
+from models import db, Note
+from conftest import make_user, login
+
+
+@pytest.mark.parametrize('text, forbidden', [
+    ('<script>alert(1)</script>', '<script'),
+    ('[click](javascript:alert(1))', 'javascript:'),
+    ('<img src="x.png" onerror="alert(1)">', 'onerror'),
+    ('<a href="https://example.com" onclick="alert(1)">x</a>', 'onclick'),
+])
+def test_unsafe_markup_is_removed(text, forbidden):
+    assert forbidden not in render_markdown(text)
+
+
+def test_safe_markdown_is_kept():
+    html = render_markdown('# Title\n\n**bold** [link](https://example.com)')
+    assert '<h1>Title</h1>' in html
+    assert '<strong>bold</strong>' in html
+    assert '<a href="https://example.com">link</a>' in html
+
+
+def test_oversized_notes_are_escaped_plain_text():
+    text = '<b>' + 'x' * MAX_MARKDOWN_CHARS
+    html = render_markdown(text)
+    assert html.startswith('<pre class="plain-text">&lt;b&gt;xxx')
+    assert '<b>' not in html
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    """Record every text the cache actually renders"""
+    rendered = []
+
+    def counting_render(text):
+        rendered.append(text)
+        return f'<p>{text}</p>'
+    monkeypatch.setattr(markdown_render, 'render_markdown', counting_render)
+    return rendered
+
+
+def test_cache_renders_each_version_once(renders):
+    cache = RenderCache()
+    assert cache.get_or_render('one') == '<p>one</p>'
+    assert cache.get_or_render('one') == '<p>one</p>'
+    assert renders == ['one']
+
+    # An edit is a new key, rendered afresh
+    assert cache.get_or_render('one!') == '<p>one!</p>'
+    assert renders == ['one', 'one!']
+
+
+def test_cache_evicts_least_recently_used(renders):
+    cache = RenderCache(max_bytes=20)
+    cache.get_or_render('a')
+    cache.get_or_render('b')
+    cache.get_or_render('a')  # now the most recent
+    cache.get_or_render('c')  # 24 bytes in all: b goes
+    cache.get_or_render('a')
+    cache.get_or_render('b')
+    assert renders == ['a', 'b', 'c', 'b']
+
+
+def test_cache_size_is_counted_in_bytes(renders):
+    # '<p>é</p>' is 8 characters but 9 bytes, so two of them don't fit in 17
+    cache = RenderCache(max_bytes=17)
+    cache.get_or_render('é')
+    cache.get_or_render('ü')
+    cache.get_or_render('é')
+    assert renders == ['é', 'ü', 'é']
+
+
+def test_cache_does_not_keep_html_larger_than_its_budget(renders):
+    cache = RenderCache(max_bytes=5)
+    cache.get_or_render('long text')
+    cache.get_or_render('long text')
+    assert renders == ['long text', 'long text']
+
+
+def test_note_page_renders_sanitized_markdown(client):
+    user = make_user('alice')
+    note = Note(title='Plan', content='**bold** <script>alert(1)</script>', user_id=user.id)
+    db.session.add(note)
+    db.session.commit()
+    login(client, 'alice')
+
+    response = client.get(f'/note/{note.id}')
+    assert b'<strong>bold</strong>' in response.data
+    assert b'<script>alert(1)' not in response.data
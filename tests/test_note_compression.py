@@ -0,0 +1,88 @@
+import zlib
+
+from sqlalchemy import type_coerce
+
+import note_compression
+from models import db, Note, CompressedText
+from note_compression import compress_existing_notes
+from conftest import make_user
+
+LOG = ''.join(f'2026-10-19 INFO worker-{i % 8} request {i} finished in {i % 250} ms\n' for i in range(2000))
+
+
+def stored_bytes(note_id):
+    column = Note.__table__.c.content
+    return db.session.execute(db.select(type_coerce(column, db.LargeBinary)).where(Note.__table__.c.id == note_id)).scalar()
+
+
+def test_round_trip_compresses_only_above_threshold(app):
+    user = make_user('alice')
+    small = Note(title='small', content='short note', user_id=user.id)
+    large = Note(title='large', content=LOG, user_id=user.id)
+    db.session.add_all([small, large])
+    db.session.commit()
+
+    assert stored_bytes(small.id) == CompressedText.MARKER_PLAIN + b'short note'
+    raw = stored_bytes(large.id)
+    assert CompressedText.is_compressed(raw)
+    assert len(raw) < len(LOG) // 5
+
+    db.session.expire_all()
+    assert db.session.get(Note, small.id).content == 'short note'
+    assert db.session.get(Note, large.id).content == LOG
+
+
+def test_decompress_reads_legacy_and_zlib_values():
+    assert CompressedText.decompress('legacy text') == 'legacy text'
+    assert CompressedText.decompress(b'legacy bytes') == 'legacy bytes'
+    assert CompressedText.decompress(CompressedText.MARKER_ZLIB + zlib.compress(b'zlib body')) == 'zlib body'
+
+
+def test_compress_existing_notes_rewrites_legacy_rows(app):
+    user = make_user('alice')
+    note = Note(title='legacy', content='x', user_id=user.id)
+    db.session.add(note)
+    db.session.commit()
+    # Simulate a row written before the column was converted
+    db.session.execute(Note.__table__.update().values(content=type_coerce(LOG.encode(), db.LargeBinary)))
+    db.session.commit()
+    updated_at = db.session.get(Note, note.id).updated_at
+
+    stats = compress_existing_notes(batch_size=1)
+    assert stats['scanned'] == 1 and stats['compressed'] == 1
+    assert stats['bytes_after'] < stats['bytes_before']
+    assert CompressedText.is_compressed(stored_bytes(note.id))
+
+    db.session.expire_all()
+    note = db.session.get(Note, note.id)
+    assert note.content == LOG
+    assert note.updated_at == updated_at
+    assert compress_existing_notes()['compressed'] == 0
+
+
+def test_compress_existing_notes_skips_rows_edited_meanwhile(app, monkeypatch):
+    user = make_user('alice')
+    note = Note(title='legacy', content='x', user_id=user.id)
+    db.session.add(note)
+    db.session.commit()
+    db.session.execute(Note.__table__.update().values(content=type_coerce(LOG.encode(), db.LargeBinary)))
+    db.session.commit()
+
+    class EditedDuringBatch(CompressedText):
+        @staticmethod
+        def decompress(raw):
+            # The user saves between the batch SELECT and the compressing UPDATE
+            table = Note.__table__
+            db.session.execute(table.update().where(table.c.id == note.id).values(
+                content=type_coerce(CompressedText.MARKER_PLAIN + b'fresh edit', db.LargeBinary),
+                version=table.c.version + 1))
+            return CompressedText.decompress(raw)
+
+    monkeypatch.setattr(note_compression, 'CompressedText', EditedDuringBatch)
+    stats = compress_existing_notes()
+    assert stats['compressed'] == 0 and stats['skipped'] == 1
+
+    db.session.expire_all()
+    note = db.session.get(Note, note.id)
+    assert note.content == 'fresh edit'
+    assert note.version == 2
@@ -0,0 +1,135 @@
+import os
+
+import pytest
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import ratelimit
+from ratelimit import MemoryBackend, RedisBackend
+from conftest import make_user, make_folder, upload
+
+REDIS_URL = os.environ.get('RATELIMIT_TEST_REDIS_URL')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_bucket_refills_over_time(clock):
+    backend = MemoryBackend()
+    bucket = [('ip:1:requests', 1, 2.0, 1.0)]
+    assert backend.take(bucket) == 0
+    assert backend.take(bucket) == 0
+    assert backend.take(bucket) == pytest.approx(1.0)
+    clock[0] += 1
+    assert backend.take(bucket) == 0
+
+
+def test_rejection_charges_no_bucket(clock):
+    backend = MemoryBackend()
+    ip = ('ip:1:bytes', 50, 100.0, 1.0)
+    folder = ('folder:1:bytes', 50, 60.0, 1.0)
+    assert backend.take([ip, folder]) == 0
+    assert backend.take([ip, folder]) == pytest.approx(40.0)
+    # The IP bucket still holds the 50 tokens the rejected call would have taken
+    assert backend.take([ip]) == 0
+
+
+def test_prune_keeps_drained_buckets_of_other_limits(clock):
+    backend = MemoryBackend()
+    backend.MAX_KEYS = 5
+    # A slow byte bucket, drained
+    assert backend.take([('ip:1:bytes', 100, 100.0, 0.01)]) == 0
+    clock[0] += 60
+    # Fast request buckets push the table past MAX_KEYS and trigger a prune
+    for i in range(10):
+        backend.take([(f'ip:{i}:requests', 1, 30.0, 30.0)])
+    assert 'ip:1:bytes' in backend._buckets
+    assert backend.take([('ip:1:bytes', 100, 100.0, 0.01)]) > 0
+
+
+def test_prune_runs_at_most_once_per_interval(clock, monkeypatch):
+    backend = MemoryBackend()
+    backend.MAX_KEYS = 2
+    calls = []
+    original = backend._prune
+    monkeypatch.setattr(backend, '_prune', lambda now: calls.append(now) or original(now))
+
+    for i in range(20):
+        backend.take([(f'ip:{i}:requests', 1, 30.0, 0.5)])
+    assert len(calls) == 1
+    clock[0] += MemoryBackend.PRUNE_INTERVAL
+    backend.take([('ip:new:requests', 1, 30.0, 0.5)])
+    assert len(calls) == 2
+
+
+def test_slots_are_bounded():
+    backend = MemoryBackend()
+    assert backend.acquire('uploads:active', 1)
+    assert not backend.acquire('uploads:active', 1)
+    backend.release('uploads:active')
+    assert backend.acquire('uploads:active', 1)
+
+
+def test_anonymous_drop_is_rate_limited(app, client):
+    app.config['UPLOAD_RATE_IP_REQUESTS'] = 2
+    folder = make_folder(make_user('alice'), is_public=True, allow_file_drop=True)
+
+    assert upload(client, folder.id, ('a.txt', b'a')).status_code == 302
+    assert upload(client, folder.id, ('b.txt', b'b')).status_code == 302
+    response = upload(client, folder.id, ('c.txt', b'c'))
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+
+def test_clients_behind_a_trusted_proxy_get_their_own_bucket(app, client, monkeypatch):
+    # What app.py installs for TRUSTED_PROXY_HOPS=1
+    monkeypatch.setattr(app, 'wsgi_app', ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1))
+    app.config['UPLOAD_RATE_IP_REQUESTS'] = 1
+    folder = make_folder(make_user('alice'), is_public=True, allow_file_drop=True)
+
+    client.environ_base['HTTP_X_FORWARDED_FOR'] = '203.0.113.7'
+    assert upload(client, folder.id, ('a.txt', b'a')).status_code == 302
+    assert upload(client, folder.id, ('b.txt', b'b')).status_code == 429
+    client.environ_base['HTTP_X_FORWARDED_FOR'] = '198.51.100.2'
+    assert upload(client, folder.id, ('c.txt', b'c')).status_code == 302
+    # Only the hop nginx appended is trusted, not what the client claims before it
+    client.environ_base['HTTP_X_FORWARDED_FOR'] = '198.51.100.2, 203.0.113.7'
+    assert upload(client, folder.id, ('d.txt', b'd')).status_code == 429
+    assert 'ip:127.0.0.1:requests' not in ratelimit.limiter.backend._buckets
+
+
+def test_folder_byte_limit_does_not_charge_the_ip(app, client):
+    app.config['UPLOAD_RATE_IP_BYTES'] = 10 * 1024 * 1024
+    app.config['UPLOAD_RATE_FOLDER_BYTES'] = 1000
+    alice = make_user('alice')
+    full = make_folder(alice, 'full', is_public=True, allow_file_drop=True)
+    other = make_folder(alice, 'other', is_public=True, allow_file_drop=True)
+
+    assert upload(client, full.id, ('a.bin', b'x' * 900)).status_code == 302
+    assert upload(client, full.id, ('b.bin', b'x' * 900)).status_code == 429
+    ip_tokens = ratelimit.limiter.backend._buckets['ip:127.0.0.1:bytes'][0]
+    assert ip_tokens > 10 * 1024 * 1024 - 2000
+    assert upload(client, other.id, ('c.bin', b'x' * 900)).status_code == 302
+
+
+@pytest.mark.skipif(not REDIS_URL, reason='set RATELIMIT_TEST_REDIS_URL to run against Redis')
+def test_redis_backend():
+    backend = RedisBackend(REDIS_URL, prefix=f'ratelimit-test:{os.getpid()}:')
+    ip = ('ip:1:bytes', 50, 100.0, 1.0)
+    folder = ('folder:1:bytes', 50, 60.0, 1.0)
+    assert backend.take([ip, folder]) == 0
+    assert backend.take([ip, folder]) > 0
+    assert backend.take([ip]) == 0
+
+    key = 'uploads:active'
+    assert backend.acquire(key, 1)
+    ttl = backend._redis.ttl(backend._prefix + key)
+    assert 0 < ttl <= RedisBackend.SLOT_TTL
+    assert not backend.acquire(key, 1)
+    backend.release(key)
+    backend.release(key)
+    assert int(backend._redis.get(backend._prefix + key)) == 0
+    backend._redis.delete(*backend._redis.keys(backend._prefix + '*'))
@@ -0,0 +1,127 @@
+import shutil
+import sqlite3
+import time
+
+import pytest
+from flask import Flask, jsonify, request
+from flask_sqlalchemy import SQLAlchemy
+
+from replica import ReplicaRouter, RoutingSession, replica_safe, STICKY_KEY
+
+# A database of its own, so the replica bind stays out of the app's metadata
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+class Item(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)
+
+
+def add_item(name):
+    db.session.add(Item(name=name))
+
+
+def names():
+    return sorted(item.name for item in Item.query)
+
+
+def make_app(primary, replica):
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY='test',
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{primary}',
+        SQLALCHEMY_BINDS={},
+        SQLALCHEMY_REPLICA_URLS=[f'sqlite:///{replica}'],
+    )
+    ReplicaRouter(app)
+    db.init_app(app)
+
+    @app.route('/items', methods=['GET', 'POST'])
+    @replica_safe
+    def items():
+        if request.method == 'POST':
+            add_item(request.form['name'])
+            db.session.commit()
+        return jsonify(names())
+
+    @app.route('/items/preview')
+    @replica_safe
+    def preview_item():
+        # Reads after a flush must see the uncommitted row
+        add_item(request.args['name'])
+        db.session.flush()
+        result = names()
+        db.session.rollback()
+        return jsonify(result)
+
+    return app
+
+
+@pytest.fixture
+def databases(tmp_path):
+    """A primary with items a and b, whose replica only caught up with a"""
+    primary, replica = tmp_path / 'primary.db', tmp_path / 'replica.db'
+    app = make_app(primary, replica)
+    with app.app_context():
+        db.create_all(bind_key=None)
+        add_item('a')
+        db.session.commit()
+        shutil.copy(primary, replica)
+        add_item('b')
+        db.session.commit()
+    return primary, replica
+
+
+@pytest.fixture
+def client(databases):
+    app = make_app(*databases)
+    with app.app_context():
+        yield app.test_client()
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_replica_safe_get_reads_the_replica(client):
+    assert client.get('/items').get_json() == ['a']
+
+
+def test_writes_and_reads_after_them_use_the_primary(client):
+    assert client.post('/items', data={'name': 'c'}).get_json() == ['a', 'b', 'c']
+    # The flushed row is only visible on the primary connection
+    assert client.get('/items/preview?name=d').get_json() == ['a', 'b', 'c', 'd']
+
+
+def test_writers_stick_to_the_primary_for_a_while(client):
+    client.post('/items', data={'name': 'c'})
+    with client.session_transaction() as session:
+        assert session[STICKY_KEY] > time.time()
+    assert client.get('/items').get_json() == ['a', 'b', 'c']
+
+    with client.session_transaction() as session:
+        session[STICKY_KEY] = time.time() - 1
+    assert client.get('/items').get_json() == ['a']
+
+
+def test_unhealthy_replica_falls_back_to_the_primary(tmp_path, databases):
+    app = make_app(databases[0], tmp_path / 'missing' / 'replica.db')
+    with app.app_context():
+        assert app.test_client().get('/items').get_json() == ['a', 'b']
+        assert 'replica_0' in app.extensions['replica_router']._down_until
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_create_all_leaves_the_replica_alone(tmp_path):
+    replica = tmp_path / 'replica.db'
+    app = make_app(tmp_path / 'primary.db', replica)
+    with app.app_context():
+        db.create_all(bind_key=None)
+        db.engines['replica_0'].dispose()
+
+    with sqlite3.connect(replica) as connection:
+        assert connection.execute('SELECT count(*) FROM sqlite_master').fetchone() == (0,)
+    with sqlite3.connect(tmp_path / 'primary.db') as connection:
+        assert connection.execute("SELECT count(*) FROM sqlite_master WHERE name = 'item'").fetchone() == (1,)
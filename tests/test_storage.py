@@ -0,0 +1,77 @@
+import io
+import zipfile
+
+import pytest
+
+from importer import import_archive
+from models import db, User, Folder
+from storage import QuotaExceeded, record_upload, recompute_usage
+from conftest import make_user, make_folder, login, upload
+
+
+def usage(model, row_id):
+    row = db.session.get(model, row_id)
+    db.session.refresh(row)
+    return row.bytes_used, row.file_count
+
+
+def test_uploads_update_counters(client):
+    alice = make_user('alice')
+    folder = make_folder(alice)
+    login(client, 'alice')
+
+    upload(client, folder.id, ('a.txt', b'12345'), ('b.txt', b'123'))
+    assert usage(Folder, folder.id) == (8, 2)
+    assert usage(User, alice.id) == (8, 2)
+
+    recompute_usage()
+    assert usage(Folder, folder.id) == (8, 2)
+
+
+def test_upload_over_quota_is_skipped(app, client):
+    app.config['FOLDER_QUOTA_BYTES'] = 10
+    alice = make_user('alice')
+    folder = make_folder(alice)
+    login(client, 'alice')
+
+    upload(client, folder.id, ('a.txt', b'123456'), ('b.txt', b'123456'), ('c.txt', b'1234'))
+    assert usage(Folder, folder.id) == (10, 2)
+    assert sorted(file.original_filename for file in db.session.get(Folder, folder.id).files) == ['a.txt', 'c.txt']
+
+
+def test_failed_charge_leaves_counters_untouched(app):
+    app.config['USER_QUOTA_FILES'] = 1
+    alice = make_user('alice')
+    first, second = make_folder(alice, 'one'), make_folder(alice, 'two')
+
+    record_upload(first, 5)
+    with pytest.raises(QuotaExceeded, match='File limit of the folder owner'):
+        record_upload(second, 5)
+    assert usage(Folder, second.id) == (0, 0)
+    assert usage(User, alice.id) == (5, 1)
+
+
+def test_quota_is_part_of_the_update(app):
+    # A stale in-memory counter must not let a charge through
+    app.config['FOLDER_QUOTA_BYTES'] = 10
+    folder = make_folder(make_user('alice'))
+    assert folder.bytes_used == 0
+    db.session.execute(db.update(Folder).values(bytes_used=8).execution_options(synchronize_session=False))
+
+    with pytest.raises(QuotaExceeded, match='Folder storage quota'):
+        record_upload(folder, 5)
+
+
+def test_import_checks_owner_quota_across_folders(app):
+    app.config['USER_QUOTA_BYTES'] = 10
+    alice = make_user('alice')
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('one/a.bin', b'x' * 6)
+        archive.writestr('two/b.bin', b'x' * 6)
+    buffer.seek(0)
+
+    stats = import_archive(buffer, 'data.zip', alice, app.config['UPLOAD_FOLDER'])
+    assert stats['files'] == 1
+    assert [error['entry'] for error in stats['errors']] == ['two/b.bin']
+    assert usage(User, alice.id) == (6, 1)
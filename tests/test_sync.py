@@ -0,0 +1,169 @@
+import pytest
+from sqlalchemy import event
+
+import sync
+from listing import encode_cursor
+from models import db, Note
+from conftest import make_user, make_folder, login, upload
+
+
+def feed(client, cursor=None, limit=None):
+    params = {}
+    if cursor:
+        params['cursor'] = cursor
+    if limit:
+        params['limit'] = limit
+    response = client.get('/api/sync', query_string=params)
+    assert response.status_code == 200, response.data
+    return response.get_json()
+
+
+def kinds(data):
+    return [(change['type'], change['deleted']) for change in data['changes']]
+
+
+@pytest.fixture
+def alice(client):
+    user = make_user('alice')
+    login(client, 'alice')
+    return user
+
+
+def test_feed_lists_changes_and_resumes_from_cursor(client, alice):
+    client.post('/create_note', data={'title': 'One', 'content': 'first'})
+    first = feed(client)
+    assert kinds(first) == [('note', False)]
+    assert first['changes'][0]['data']['title'] == 'One'
+    assert not first['has_more']
+
+    # Nothing new: the cursor stays where it is
+    again = feed(client, first['cursor'])
+    assert again['changes'] == [] and again['cursor'] == first['cursor']
+
+    folder = make_folder(alice)
+    sync.folders_changed([folder.id])
+    db.session.commit()
+    upload(client, folder.id, ('a.txt', b'abc'))
+    later = feed(client, first['cursor'])
+    assert kinds(later) == [('folder', False), ('file', False)]
+    assert later['changes'][1]['data']['name'] == 'a.txt'
+
+
+def test_updates_replace_earlier_rows(client, alice):
+    client.post('/create_note', data={'title': 'One', 'content': 'first'})
+    note = Note.query.one()
+    client.post(f'/edit_note/{note.id}', data={'title': 'Two', 'content': 'second', 'version': note.version})
+
+    data = feed(client)
+    assert kinds(data) == [('note', False)]
+    assert data['changes'][0]['data']['title'] == 'Two'
+
+
+def test_deletes_leave_tombstones(client, alice):
+    client.post('/create_note', data={'title': 'One', 'content': ''})
+    cursor = feed(client)['cursor']
+    client.post(f'/delete_note/{Note.query.one().id}')
+
+    data = feed(client, cursor)
+    assert kinds(data) == [('note', True)]
+    assert 'data' not in data['changes'][0]
+
+
+def test_deleted_folder_stands_for_its_files(client, alice):
+    folder = make_folder(alice)
+    upload(client, folder.id, ('a.txt', b'abc'), ('b.txt', b'de'))
+    assert [c['type'] for c in feed(client)['changes']] == ['file', 'file']
+
+    client.post(f'/delete_folder/{folder.id}')
+    assert kinds(feed(client)) == [('folder', True)]
+
+
+def test_shared_folder_arrives_without_its_files(app, client, alice):
+    bob = make_user('bob')
+    folder = make_folder(alice)
+    upload(client, folder.id, *[(f'{i}.txt', b'x') for i in range(3)])
+    client.post(f'/share_folder/{folder.id}', data={'username': 'bob'})
+
+    # One folder row for bob; its files are paged from the folder listing
+    with app.test_request_context():
+        changes, _, _ = sync.changes_since(bob.id)
+    assert sorted(change['type'] for change in changes) == ['folder', 'folder_share']
+    folder_change = next(change for change in changes if change['type'] == 'folder')
+    client.get('/logout')
+    login(client, 'bob')
+    response = client.get(folder_change['data']['files_url'])
+    assert sorted(file['name'] for file in response.get_json()['files']) == ['0.txt', '1.txt', '2.txt']
+
+    # Files uploaded after the share are delivered through the feed
+    client.get('/logout')
+    login(client, 'alice')
+    upload(client, folder.id, ('late.txt', b'x'))
+    with app.test_request_context():
+        changes, _, _ = sync.changes_since(bob.id)
+    assert [change['data']['name'] for change in changes if change['type'] == 'file'] == ['late.txt']
+
+
+def test_pages_cover_every_change_once(client, alice):
+    for i in range(5):
+        client.post('/create_note', data={'title': f'Note {i}', 'content': ''})
+
+    seen, cursor = [], None
+    while True:
+        data = feed(client, cursor, limit=2)
+        seen += [change['data']['title'] for change in data['changes']]
+        cursor = data['cursor']
+        if not data['has_more']:
+            break
+    assert seen == [f'Note {i}' for i in range(5)]
+
+
+def test_shares_reach_the_recipient(client, alice):
+    bob = make_user('bob')
+    client.post('/create_note', data={'title': 'Plan', 'content': ''})
+    note = Note.query.one()
+    client.post(f'/share_note/{note.id}', data={'username': 'bob'})
+
+    changes, _, _ = sync.changes_since(bob.id)
+    assert sorted(change['type'] for change in changes) == ['note', 'note_share']
+
+
+def test_counters_are_locked_in_user_order(app, client, alice):
+    bob = make_user('bob')
+    note = Note(title='Plan', content='', user_id=alice.id)
+    db.session.add(note)
+    db.session.commit()
+    client.post(f'/share_note/{note.id}', data={'username': 'bob'})
+
+    statements = []
+    engine = db.session.get_bind()
+
+    def listener(conn, cursor, sql, *args):
+        statements.append(' '.join(sql.split()))
+
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        sync.notes_changed([note.id])
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    db.session.commit()
+
+    lock = next(i for i, sql in enumerate(statements) if sql.startswith('SELECT user.id FROM user'))
+    bump = next(i for i, sql in enumerate(statements) if sql.startswith('UPDATE user SET sync_seq'))
+    assert lock < bump
+    assert statements[lock].endswith('ORDER BY user.id')
+    assert [c['type'] for c in sync.changes_since(bob.id)[0]] == ['note_share', 'note']
+
+
+@pytest.mark.parametrize('cursor', [
+    'not a cursor',
+    encode_cursor([1, 2]),
+    encode_cursor({'u': 999, 's': 0, 'k': '', 'id': 0}),
+    encode_cursor({'u': 1, 's': '5', 'k': '', 'id': 0}),
+    encode_cursor({'u': 1, 's': 0, 'k': 3, 'id': 0}),
+    encode_cursor({'u': 1, 's': 0, 'k': '', 'id': True}),
+])
+def test_invalid_cursor_is_rejected(client, alice, cursor):
+    assert alice.id == 1
+    response = client.get('/api/sync', query_string={'cursor': cursor})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor.'}
@@ -0,0 +1,158 @@
+import pytest
+
+import text_preview
+from models import db, File
+from text_preview import text_page, build_line_index, parse_page_bytes
+from conftest import make_user, make_folder, login, upload
+
+LINES = b''.join(b'line %03d\n' % i for i in range(1, 201))  # 9 bytes per line
+
+
+@pytest.fixture
+def uploaded(client):
+    alice = make_user('alice')
+    folder = make_folder(alice)
+    login(client, 'alice')
+
+    def _upload(name, data):
+        upload(client, folder.id, (name, data))
+        return File.query.filter_by(original_filename=name).one()
+    return _upload
+
+
+@pytest.fixture
+def small_pages(monkeypatch):
+    monkeypatch.setattr(text_preview, 'MIN_PAGE_BYTES', 1)
+    monkeypatch.setattr(text_preview, 'INDEX_BLOCK', 64)
+
+
+def page(client, file, **params):
+    response = client.get(f'/api/file/{file.id}/text', query_string=params)
+    assert response.status_code == 200, response.data
+    return response.get_json()
+
+
+def test_small_file_fits_in_one_page(client, uploaded):
+    file = uploaded('notes.txt', b'hello\nworld\n')
+    data = page(client, file)
+    assert data['text'] == 'hello\nworld\n'
+    assert (data['start'], data['end'], data['size']) == (0, 12, 12)
+    assert data['next_offset'] is None and data['prev_before'] is None
+    assert data['line'] is None
+
+    assert 'hello' in client.get(f'/file/{file.id}/view').data.decode()
+
+
+def test_pages_end_on_line_boundaries(client, uploaded, small_pages):
+    file = uploaded('log.txt', LINES)
+    first = page(client, file, size=40)
+    assert first['text'] == 'line 001\nline 002\nline 003\nline 004\n'
+    assert first['next_offset'] == 36
+
+    second = page(client, file, offset=first['next_offset'], size=40)
+    assert second['text'].startswith('line 005\n')
+    assert second['prev_before'] == 36
+
+    # Paging backwards from the second page lands on whole lines again
+    back = page(client, file, before=second['prev_before'], size=40)
+    assert back['text'] == first['text']
+
+    back = page(client, file, before=second['prev_before'], size=20)
+    assert back['text'] == 'line 003\nline 004\n'
+    assert back['prev_before'] == 18
+
+
+def test_walking_forward_covers_the_whole_file(client, uploaded, small_pages):
+    file = uploaded('log.txt', LINES)
+    text, offset = '', 0
+    while offset is not None:
+        data = page(client, file, offset=offset, size=100)
+        text += data['text']
+        offset = data['next_offset']
+    assert text.encode() == LINES
+
+
+@pytest.mark.parametrize('line', [1, 2, 7, 8, 15, 123, 200])
+def test_jump_to_line(client, uploaded, small_pages, line):
+    file = uploaded('log.txt', LINES)
+    data = page(client, file, line=line, size=30)
+    assert data['text'].startswith('line %03d\n' % line)
+    assert data['line'] == line
+    assert data['lines'] == 200
+
+
+def test_line_jump_is_clamped_and_index_is_stored(client, uploaded, small_pages):
+    file = uploaded('log.txt', LINES)
+    assert page(client, file, line=5000, size=30)['text'] == 'line 200\n'
+    assert page(client, file, line=-3, size=30)['line'] == 1
+
+    db.session.refresh(file)
+    assert file.line_index is not None
+    # Plain paging reports line numbers once the index exists
+    assert page(client, file, offset=90, size=30)['line'] == 11
+
+
+def test_line_index_counts_a_missing_final_newline(tmp_path, small_pages):
+    path = tmp_path / 'x.txt'
+    path.write_bytes(b'a\n' * 40 + b'tail')
+    index = build_line_index(str(path))
+    assert index['lines'] == 41
+    assert index['block'] == 64 and len(index['counts']) == 2
+
+
+def test_windows_never_split_utf8_characters(client, uploaded, small_pages):
+    # No newlines, so windows can only be cut at character boundaries
+    text = 'aé€😀' * 20
+    file = uploaded('wide.txt', text.encode())
+    out, offset = '', 0
+    while offset is not None:
+        data = page(client, file, offset=offset, size=5)
+        assert '�' not in data['text']
+        out += data['text']
+        offset = data['next_offset']
+    assert out == text
+
+    # Offsets inside a character skip to the next one
+    data = page(client, file, offset=2, size=5)
+    assert data['start'] == 3 and data['text'].startswith('€')
+
+    # Backwards windows start on a character too
+    data = page(client, file, before=len(text.encode()), size=6)
+    assert '�' not in data['text'] and data['text']
+
+
+def test_offsets_are_clamped(client, uploaded):
+    file = uploaded('notes.txt', b'hello\n')
+    assert page(client, file, offset=999)['text'] == ''
+    assert page(client, file, offset=-5)['start'] == 0
+    assert page(client, file, before=999)['text'] == 'hello\n'
+
+
+def test_page_size_is_clamped():
+    assert parse_page_bytes(None) == text_preview.PAGE_BYTES
+    assert parse_page_bytes('nope') == text_preview.PAGE_BYTES
+    assert parse_page_bytes('1') == text_preview.MIN_PAGE_BYTES
+    assert parse_page_bytes(str(10 ** 9)) == text_preview.MAX_PAGE_BYTES
+
+
+def test_binary_files_and_other_users_are_refused(client, uploaded):
+    text = uploaded('notes.txt', b'hello\n')
+    image = uploaded('photo.png', b'\x89PNG')
+    assert client.get(f'/api/file/{image.id}/text').status_code == 404
+    assert client.get('/api/file/9999/text').status_code == 404
+
+    client.get('/logout')
+    make_user('bob')
+    login(client, 'bob')
+    assert client.get(f'/api/file/{text.id}/text').status_code == 403
+    assert client.get(f'/file/{text.id}/view').status_code == 403
+
+
+def test_text_page_reads_only_the_window(app, uploaded, monkeypatch):
+    file = uploaded('log.txt', LINES)
+    reads = []
+    real_read = text_preview._read
+    monkeypatch.setattr(text_preview, '_read',
+                        lambda path, offset, size: reads.append(size) or real_read(path, offset, size))
+    text_page(file, offset=100, size=50)
+    assert reads == [50]
@@ -0,0 +1,180 @@
+import json
+import mimetypes
+import os
+from bisect import bisect_left
+
+from models import db
+
+PAGE_BYTES = 64 * 1024
+MIN_PAGE_BYTES = 4 * 1024
+MAX_PAGE_BYTES = 1024 * 1024
+
+# The line index stores how many newlines precede each block of this many
+# bytes: about 32k integers for a 2 GB file, built by one sequential pass
+INDEX_BLOCK = 64 * 1024
+
+TEXT_EXTENSIONS = (
+    '.txt', '.log', '.md', '.markdown', '.rst', '.csv', '.tsv', '.json', '.jsonl', '.xml',
+    '.yaml', '.yml', '.toml', '.ini', '.cfg', '.conf', '.env', '.sql', '.html', '.htm',
+    '.css', '.js', '.ts', '.py', '.rb', '.go', '.rs', '.java', '.kt', '.c', '.h', '.cpp',
+    '.hpp', '.cs', '.php', '.sh', '.bat', '.ps1', '.r', '.swift', '.scala', '.lua', '.pl',
+)
+TEXT_MIMETYPES = ('application/json', 'application/xml', 'application/javascript', 'application/x-sh')
+
+
+def is_text_file(file):
+    """Whether a stored file looks like text worth previewing inline"""
+    if os.path.splitext(file.original_filename.lower())[1] in TEXT_EXTENSIONS:
+        return True
+    mimetype = file.file_type or mimetypes.guess_type(file.original_filename)[0] or ''
+    return mimetype.startswith('text/') or mimetype in TEXT_MIMETYPES
+
+
+def parse_page_bytes(value):
+    """Clamp a requested window size to [MIN_PAGE_BYTES, MAX_PAGE_BYTES]"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return PAGE_BYTES
+    return max(MIN_PAGE_BYTES, min(size, MAX_PAGE_BYTES))
+
+
+def _read(path, offset, size):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+def _skip_continuation(data):
+    """Number of leading UTF-8 continuation bytes, i.e. the tail of a character cut by the window"""
+    skip = 0
+    while skip < min(3, len(data)) and data[skip] & 0xC0 == 0x80:
+        skip += 1
+    return skip
+
+
+def _trim_partial_char(data):
+    """Drop a multi-byte UTF-8 character cut off at the end of the window"""
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte & 0xC0 == 0x80:
+            continue
+        if byte >= 0xC0:
+            length = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            if length > back:
+                return data[:-back]
+        break
+    return data
+
+
+def _after(path, offset, size, file_size):
+    """Window starting at offset, ending on a line (or at least character) boundary"""
+    data = _read(path, offset, size)
+    skip = _skip_continuation(data)
+    data, start = data[skip:], offset + skip
+    if start + len(data) < file_size:
+        newline = data.rfind(b'\n')
+        data = data[:newline + 1] if newline != -1 else _trim_partial_char(data)
+    return data, start
+
+
+def _before(path, end, size):
+    """Window ending at end, starting on a line (or at least character) boundary"""
+    start = max(0, end - size)
+    data = _trim_partial_char(_read(path, start, end - start))
+    if start > 0:
+        newline = data.find(b'\n')
+        if newline != -1 and newline + 1 < len(data):
+            cut = newline + 1
+        else:
+            cut = _skip_continuation(data)
+        data, start = data[cut:], start + cut
+    return data, start
+
+
+def build_line_index(path):
+    """Count newlines block by block in a single pass with constant memory"""
+    counts = []
+    newlines = 0
+    last = b''
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(INDEX_BLOCK)
+            if not block:
+                break
+            counts.append(newlines)
+            newlines += block.count(b'\n')
+            last = block[-1:]
+    return {
+        'block': INDEX_BLOCK,
+        'counts': counts,
+        'lines': newlines + (1 if last and last != b'\n' else 0),
+    }
+
+
+def line_index(file):
+    """Return the cached line index of a file, building and caching it on first use"""
+    if file.line_index is not None:
+        return json.loads(file.line_index)
+    index = build_line_index(file.filepath)
+    file.line_index = json.dumps(index, separators=(',', ':'))
+    db.session.commit()
+    return index
+
+
+def offset_of_line(path, index, line):
+    """Byte offset where a 1-based line starts"""
+    target = max(0, min(line, index['lines']) - 1)
+    if target == 0:
+        return 0
+    # The block holding the target-th newline, then a scan inside that one block
+    block = bisect_left(index['counts'], target) - 1
+    data = _read(path, block * index['block'], index['block'])
+    position = -1
+    for _ in range(target - index['counts'][block]):
+        position = data.find(b'\n', position + 1)
+    return block * index['block'] + position + 1
+
+
+def line_at(path, index, offset):
+    """1-based line number of the line containing offset"""
+    if not index['counts']:
+        return 1
+    block = min(offset // index['block'], len(index['counts']) - 1)
+    start = block * index['block']
+    return index['counts'][block] + _read(path, start, offset - start).count(b'\n') + 1
+
+
+def text_page(file, offset=None, before=None, line=None, size=PAGE_BYTES):
+    """
+    Return one window of a text file as a dict with the decoded text, its byte
+    range, the first line number (when the line index has been built) and the
+    offsets of the neighbouring pages. Only the window itself is read; jumping
+    to a line builds the line index on first use.
+    """
+    path = file.filepath
+    file_size = os.path.getsize(path)
+
+    index = None
+    if line is not None:
+        index = line_index(file)
+        data, start = _after(path, offset_of_line(path, index, line), size, file_size)
+    elif before is not None:
+        data, start = _before(path, max(0, min(before, file_size)), size)
+    else:
+        data, start = _after(path, max(0, min(offset or 0, file_size)), size, file_size)
+    end = start + len(data)
+
+    if index is None and file.line_index is not None:
+        index = json.loads(file.line_index)
+
+    return {
+        'text': data.decode('utf-8', errors='replace'),
+        'start': start,
+        'end': end,
+        'size': file_size,
+        'line': line_at(path, index, start) if index else None,
+        'lines': index['lines'] if index else None,
+        'next_offset': end if end < file_size else None,
+        'prev_before': start if start > 0 else None,
+    }